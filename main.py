@@ -2,25 +2,30 @@ import os
 
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE" 
 
-import subprocess
+from src.resources.threads import configure_thread_env, set_thread_budget
+
+# Must run before numpy/torch are imported.
+thread_budget = configure_thread_env()
+
 import argparse
-from src.config import DATA_DIR, PROCESSED_DIR
+from src.artifacts.build import build_stale_artifacts
 from src.hybrid_search.hybrid_search import run_search_interface
 from src.utils import set_global_seed 
+from src.config import QUERY_EXPANSION
 
 if __name__ == "__main__":
-    if not os.path.isdir(DATA_DIR):
-        subprocess.run(["python", "-m", "src.scripts.download_data"], check=True)
-    if not os.path.isdir(PROCESSED_DIR):
-        subprocess.run(["python", "-m", "src.preprocessing.preprocess"], check=True)
+    set_thread_budget(thread_budget)
+    build_stale_artifacts()
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--is_test", action="store_true", help="Run in test mode")
     parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducibility")
+    parser.add_argument("--expansion", choices=["paraphrase", "prf"], default=QUERY_EXPANSION,
+                        help="Semantic query expansion: BART paraphrases or pseudo-relevance feedback")
     args = parser.parse_args()
 
     if args.seed is not None:
         print(f"📌 Setting random seed to {args.seed}")
         set_global_seed(args.seed)
 
-    run_search_interface(args.is_test, seed=args.seed)
+    run_search_interface(args.is_test, seed=args.seed, expansion=args.expansion)
@@ -0,0 +1,169 @@
+"""
+Dependency-ordered build of the data artifacts the search engine needs.
+
+Run with `python -m src.artifacts.build` to rebuild whatever is stale.
+"""
+import os
+import sys
+import subprocess
+from typing import Callable, Dict, List, Any
+from src.artifacts.manifest import ArtifactManifest
+from src.config import (
+    RAW_DIR, INBOX_PATH, SENT_PATH, EMBEDDINGS_DIR, ALIAS_MAP_PATH, EMBEDDING_MODEL_NAME,
+    PARTITIONED_EMAILS_DIR, STREAMING_PREPROCESS, FAISS_NUM_SHARDS, FAISS_SHARD_BY, SEMANTIC_INDEX_TYPE,
+    CHUNK_TOKENS, DEDUP_NEAR_DUPLICATES, NEAR_DUPLICATES_PATH, NEAR_DUP_THRESHOLD, NEAR_DUP_NUM_PERM, UNIFIED_INDEX,
+    BUILD_KNN_GRAPH, KNN_GRAPH_K
+)
+
+RAW_FILES = [os.path.join(RAW_DIR, f) for f in ["Aliases.csv", "EmailReceivers.csv", "Emails.csv", "Persons.csv"]]
+ALIAS_INPUT_FILES = [os.path.join(RAW_DIR, "Aliases.csv"), os.path.join(RAW_DIR, "Persons.csv")]
+# In streaming mode, the partition summary stands for the partitions: it lists each one's content hash.
+PROCESSED_FILES = (
+    [os.path.join(PARTITIONED_EMAILS_DIR, "_partitions.json")] if STREAMING_PREPROCESS
+    else [INBOX_PATH, SENT_PATH]
+)
+# What gets embedded and indexed: the processed emails, minus collapsed near-duplicates.
+CORPUS_FILES = PROCESSED_FILES + ([NEAR_DUPLICATES_PATH] if DEDUP_NEAR_DUPLICATES else [])
+FAISS_FILES = (
+    [os.path.join(EMBEDDINGS_DIR, name) for name in ["all_embeddings.index", "all_folder_mask.npy"]]
+    if UNIFIED_INDEX else
+    [
+        os.path.join(EMBEDDINGS_DIR, name)
+        for folder in ["inbox", "sent"]
+        for name in [f"{folder}_chunks.index", f"{folder}_chunk_map.npy"]
+    ]
+    if SEMANTIC_INDEX_TYPE == "chunked" else
+    [
+        os.path.join(EMBEDDINGS_DIR, f"{folder}_shards", name)
+        for folder in ["inbox", "sent"]
+        for name in ["shards.json"] + [f"shard_{i}.index" for i in range(FAISS_NUM_SHARDS)]
+    ]
+    if FAISS_NUM_SHARDS > 1 else
+    [os.path.join(EMBEDDINGS_DIR, f"{folder}_embeddings.index") for folder in ["inbox", "sent"]]
+)
+# Only non-default layouts add parameters, so existing records of the plain index stay valid.
+FAISS_PARAMS = {"model": EMBEDDING_MODEL_NAME}
+if UNIFIED_INDEX:
+    FAISS_PARAMS.update({"unified": True})
+elif SEMANTIC_INDEX_TYPE == "chunked":
+    FAISS_PARAMS.update({"index_type": "chunked", "chunk_tokens": CHUNK_TOKENS})
+elif FAISS_NUM_SHARDS > 1:
+    FAISS_PARAMS.update({"num_shards": FAISS_NUM_SHARDS, "shard_by": FAISS_SHARD_BY})
+VECTOR_FILES = [
+    os.path.join(EMBEDDINGS_DIR, name)
+    for folder in ["inbox", "sent"]
+    for name in [f"{folder}_vectors.npy", f"{folder}_ids.npy", f"{folder}_embeddings.binary.index"]
+]
+KNN_GRAPH_FILES = [
+    os.path.join(EMBEDDINGS_DIR, f"{name}_knn_{part}")
+    for name in (["all"] if UNIFIED_INDEX else ["inbox", "sent"])
+    for part in ["indptr.npy", "indices.npy", "scores.npy", "source.json"]
+]
+
+# Bump when the output format of a build step changes.
+PREPROCESS_VERSION = 2
+ALIAS_MAP_VERSION = 1
+NEAR_DUPLICATES_VERSION = 1
+
+
+def run_module(module: str, *args: str) -> Callable[[], None]:
+    def build():
+        subprocess.run([sys.executable, "-m", module, *args], check=True)
+    return build
+
+
+class Artifact:
+    def __init__(self, name: str, deps: List[str], inputs: List[str], outputs: List[str],
+                 build: Callable[[], None], params: Dict[str, Any] = None):
+        """
+        Args:
+            name: Artifact name used as its manifest key.
+            deps: Names of the artifacts it is built from.
+            inputs: Files it is built from.
+            outputs: Files it consists of.
+            build: Function (re)building the outputs.
+            params: JSON-serializable build parameters.
+        """
+        self.name = name
+        self.deps = deps
+        self.inputs = inputs
+        self.outputs = outputs
+        self.build = build
+        self.params = params or {}
+
+
+def build_alias_map():
+    from src.preprocessing.aliases import build_persons_to_aliases_dict, save_persons_to_aliases_dict
+    save_persons_to_aliases_dict(build_persons_to_aliases_dict())
+
+
+# In dependency order.
+ARTIFACTS = [
+    Artifact("raw", [], [], RAW_FILES, run_module("src.scripts.download_data")),
+    Artifact("processed", ["raw"], RAW_FILES, PROCESSED_FILES,
+             run_module("src.preprocessing.preprocess", *(["--streaming"] if STREAMING_PREPROCESS else [])),
+             {"version": PREPROCESS_VERSION, "streaming": STREAMING_PREPROCESS}),
+    Artifact("alias_map", ["raw"], ALIAS_INPUT_FILES, [ALIAS_MAP_PATH], build_alias_map,
+             {"version": ALIAS_MAP_VERSION}),
+]
+if DEDUP_NEAR_DUPLICATES:
+    ARTIFACTS.append(
+        Artifact("near_duplicates", ["processed"], PROCESSED_FILES, [NEAR_DUPLICATES_PATH],
+                 run_module("src.preprocessing.near_duplicates",
+                            "--threshold", str(NEAR_DUP_THRESHOLD), "--num_perm", str(NEAR_DUP_NUM_PERM)),
+                 {"version": NEAR_DUPLICATES_VERSION, "threshold": NEAR_DUP_THRESHOLD, "num_perm": NEAR_DUP_NUM_PERM})
+    )
+ARTIFACTS += [
+    Artifact("faiss", ["processed", "near_duplicates"] if DEDUP_NEAR_DUPLICATES else ["processed"],
+             CORPUS_FILES, FAISS_FILES,
+             run_module("src.embeddings.store_in_faiss",
+                        *(["--unified"] if UNIFIED_INDEX else
+                          ["--chunk_tokens", str(CHUNK_TOKENS)] if SEMANTIC_INDEX_TYPE == "chunked" else [])),
+             FAISS_PARAMS),
+]
+if SEMANTIC_INDEX_TYPE == "two_stage":
+    ARTIFACTS.append(
+        Artifact("vectors", ["faiss"], FAISS_FILES, VECTOR_FILES, run_module("src.embeddings.vector_store"))
+    )
+# The graph is built from the email-level index, which a chunk index does not have.
+if BUILD_KNN_GRAPH and (UNIFIED_INDEX or SEMANTIC_INDEX_TYPE != "chunked"):
+    ARTIFACTS.append(
+        Artifact("knn_graph", ["faiss"], FAISS_FILES, KNN_GRAPH_FILES,
+                 run_module("src.embeddings.knn_graph", "--k", str(KNN_GRAPH_K)), {"k": KNN_GRAPH_K})
+    )
+
+
+def build_stale_artifacts(manifest: ArtifactManifest = None, artifacts: List[Artifact] = ARTIFACTS) -> List[str]:
+    """
+    Rebuild the artifacts whose inputs, parameters or outputs changed since they were recorded.
+
+    Source artifacts (the raw CSVs) are only built when missing. Artifacts that exist
+    on disk but were never recorded (e.g. the pre-generated embeddings) are adopted
+    as they are, unless something upstream was rebuilt.
+
+    Returns:
+        Names of the rebuilt artifacts.
+    """
+    manifest = manifest or ArtifactManifest()
+    rebuilt = []
+    for artifact in artifacts:
+        upstream_rebuilt = any(dep in rebuilt for dep in artifact.deps)
+        outputs_exist = all(os.path.exists(p) for p in artifact.outputs)
+
+        if outputs_exist and not upstream_rebuilt and (not artifact.deps or not manifest.has_record(artifact.name)):
+            # Source files and untracked pre-built artifacts are taken as they are.
+            manifest.record(artifact.name, artifact.inputs, artifact.outputs, artifact.params)
+            continue
+        if manifest.is_stale(artifact.name, artifact.inputs, artifact.outputs, artifact.params):
+            print(f"🛠️ Building {artifact.name} artifacts...")
+            artifact.build()
+            manifest.record(artifact.name, artifact.inputs, artifact.outputs, artifact.params)
+            rebuilt.append(artifact.name)
+
+    if not rebuilt:
+        print("✅ All artifacts up to date.")
+    return rebuilt
+
+
+if __name__ == "__main__":
+    build_stale_artifacts()
@@ -0,0 +1,108 @@
+"""
+Manifest recording which inputs and parameters each build artifact was produced from.
+"""
+import os
+import json
+import hashlib
+from typing import Any, Dict, Iterable, Optional
+from src.config import ARTIFACT_MANIFEST_PATH
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def compute_file_hash(path: str) -> str:
+    """Compute the SHA-256 hex digest of a file, reading it in chunks."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ArtifactManifest:
+    """
+    JSON manifest of build artifacts.
+
+    Each artifact entry stores the content hashes of its input files, its build
+    parameters and the hashes of its output files. File hashes are cached by
+    (size, mtime), so checking an unchanged tree does not re-read any file.
+    """
+
+    def __init__(self, path: str = ARTIFACT_MANIFEST_PATH):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.artifacts: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.artifacts = data.get("artifacts", {})
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files, "artifacts": self.artifacts}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def file_hash(self, path: str) -> Optional[str]:
+        """
+        Content hash of a file, or None if it does not exist.
+        Only re-hashes when the file's size or mtime changed since the last call.
+        """
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        cached = self.files.get(key)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        digest = compute_file_hash(path)
+        self.files[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def hash_files(self, paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        return {os.path.abspath(p): self.file_hash(p) for p in paths}
+
+    def has_record(self, name: str) -> bool:
+        return name in self.artifacts
+
+    def is_stale(self, name: str, inputs: Iterable[str] = (), outputs: Iterable[str] = (),
+                 params: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Whether an artifact must be rebuilt.
+
+        Args:
+            name: Artifact name.
+            inputs: Files the artifact is built from.
+            outputs: Files the artifact consists of.
+            params: Build parameters (model names, format versions, ...).
+
+        Returns:
+            True if an output is missing, the artifact was never recorded, or its
+            inputs, parameters or outputs differ from the recorded ones.
+        """
+        outputs = list(outputs)
+        if any(not os.path.exists(p) for p in outputs):
+            return True
+        record = self.artifacts.get(name)
+        if record is None:
+            return True
+        return (
+            record["inputs"] != self.hash_files(inputs)
+            or record["params"] != (params or {})
+            or record["outputs"] != self.hash_files(outputs)
+        )
+
+    def record(self, name: str, inputs: Iterable[str] = (), outputs: Iterable[str] = (),
+               params: Optional[Dict[str, Any]] = None):
+        """Record an artifact as built from the current state of its inputs."""
+        self.artifacts[name] = {
+            "inputs": self.hash_files(inputs),
+            "params": params or {},
+            "outputs": self.hash_files(outputs),
+        }
+        self.save()
+
+    def forget(self, name: str):
+        if self.artifacts.pop(name, None) is not None:
+            self.save()
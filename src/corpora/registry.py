@@ -0,0 +1,236 @@
+"""
+Registry of the mailboxes (corpora) served by one search process.
+
+Each corpus has its own processed emails, FAISS indexes and ES indexes, while
+the embedder and expander loaded by init_semantic_components are shared by all
+of them. Corpora are loaded on first use; when the loaded ones exceed the memory
+budget, the least recently used are evicted (and reloaded on their next use).
+
+The default corpus uses the paths of src.config. A corpus named <name> lives in:
+
+    CORPORA_DIR/<name>/processed/Inbox.parquet, Sent.parquet
+    CORPORA_DIR/<name>/embeddings/<folder>_embeddings.index
+
+(built with `python -m src.embeddings.store_in_faiss --corpus <name>`), and its
+ES indexes are named <name>-inbox and <name>-sent.
+"""
+import os
+import re
+import time
+import threading
+import numpy as np
+from collections import Counter, OrderedDict, deque
+from typing import Callable, Dict, List
+from src.ingestion.live_ingest import EmailStore
+from src.artifacts.manifest import ArtifactManifest
+from src.artifacts.build import CORPUS_FILES
+from src.keyword_search.es_search import create_emails_index_if_stale
+from src.hybrid_search.result_cache import compute_index_version
+from src.utils import load_processed_emails, load_faiss_index
+from src.config import PROCESSED_DIR, EMBEDDINGS_DIR, INBOX_PATH, SENT_PATH, CORPORA_DIR, CORPUS_MEMORY_BUDGET
+
+DEFAULT_CORPUS = "default"
+FOLDERS = ["inbox", "sent"]
+# Corpus names become part of ES index names, which must be lowercase.
+CORPUS_NAME_REGEX = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+
+
+class Corpus:
+    """Where a corpus's emails and indexes are stored."""
+
+    def __init__(self, name: str, processed_dir: str, embeddings_dir: str):
+        self.name = name
+        self.processed_dir = processed_dir
+        self.embeddings_dir = embeddings_dir
+
+    @property
+    def is_default(self) -> bool:
+        return self.name == DEFAULT_CORPUS
+
+    @property
+    def input_files(self) -> List[str]:
+        if self.is_default:
+            return CORPUS_FILES
+        return [os.path.join(self.processed_dir, os.path.basename(path)) for path in [INBOX_PATH, SENT_PATH]]
+
+    def es_index(self, folder: str) -> str:
+        """ES index (or, for the default corpus, folder) searched for a folder of this corpus."""
+        return folder if self.is_default else f"{self.name}-{folder}"
+
+
+def get_corpus(name: str) -> Corpus:
+    if name == DEFAULT_CORPUS:
+        return Corpus(name, PROCESSED_DIR, EMBEDDINGS_DIR)
+    if not CORPUS_NAME_REGEX.match(name):
+        raise ValueError(f"Invalid corpus name: {name!r} (lowercase letters, digits, '-' and '_' only)")
+    root = os.path.join(CORPORA_DIR, name)
+    return Corpus(name, os.path.join(root, "processed"), os.path.join(root, "embeddings"))
+
+
+def list_corpora(corpora_dir: str = CORPORA_DIR) -> List[str]:
+    """The default corpus plus every corpus directory with processed emails."""
+    names = []
+    if os.path.isdir(corpora_dir):
+        names = sorted(
+            name for name in os.listdir(corpora_dir)
+            if CORPUS_NAME_REGEX.match(name) and os.path.isdir(os.path.join(corpora_dir, name, "processed"))
+        )
+    return [DEFAULT_CORPUS] + [name for name in names if name != DEFAULT_CORPUS]
+
+
+class LoadedCorpus:
+    def __init__(self, corpus: Corpus, store: EmailStore, nbytes: int):
+        """
+        Args:
+            corpus: Paths of the corpus.
+            store: Its emails, indexes and index versions per folder.
+            nbytes: Approximate memory held by the emails and indexes.
+        """
+        self.corpus = corpus
+        self.store = store
+        self.nbytes = nbytes
+
+
+def estimate_nbytes(dfs: Dict[str, object], indexes: Dict[str, object]) -> int:
+    """Approximate memory of a corpus: its DataFrames plus float32 vectors of its indexes."""
+    # Folders may share one DataFrame (unified index).
+    unique_dfs = {id(df): df for df in dfs.values()}.values()
+    df_bytes = sum(int(df.memory_usage(deep=True).sum()) for df in unique_dfs)
+    index_bytes = sum(int(index.ntotal) * int(index.d) * 4 for index in indexes.values())
+    return df_bytes + index_bytes
+
+
+def load_corpus(corpus: Corpus, es_client, manifest: ArtifactManifest) -> LoadedCorpus:
+    """Load a corpus's emails and FAISS indexes, (re)building its ES indexes if stale."""
+    # Imported here: hybrid_search itself imports the registry.
+    from src.hybrid_search.hybrid_search import split_folders
+
+    df = load_processed_emails(canonical_only=False, processed_dir=corpus.processed_dir)
+    inbox_df, sent_df = split_folders(df)
+    dfs = {"inbox": inbox_df, "sent": sent_df}
+    indexes = {
+        # Corpora are built with flat per-folder indexes (store_in_faiss --corpus).
+        folder: load_faiss_index(folder, index_type="flat", num_emails=len(dfs[folder]), index_dir=corpus.embeddings_dir)
+        for folder in FOLDERS
+    }
+    for folder in FOLDERS:
+        create_emails_index_if_stale(es_client, dfs[folder], corpus.es_index(folder), manifest, inputs=corpus.input_files)
+    versions = {folder: compute_index_version(manifest, corpus.es_index(folder)) for folder in FOLDERS}
+    return LoadedCorpus(corpus, EmailStore(dfs, indexes, versions), estimate_nbytes(dfs, indexes))
+
+
+class CorpusMetrics:
+    """Load, eviction, search and query plan counters of one corpus (kept across its evictions)."""
+
+    def __init__(self, window: int = 1000):
+        self.loads = 0
+        self.evictions = 0
+        self.load_ms = 0.0
+        self.searches = 0
+        # Latencies of the most recent searches, for percentiles.
+        self.search_ms = deque(maxlen=window)
+        # Searches per query plan label (see src.hybrid_search.query_planner).
+        self.plans = Counter()
+
+    def record_search(self, elapsed_ms: float, plan: str = None):
+        self.searches += 1
+        self.search_ms.append(elapsed_ms)
+        if plan is not None:
+            self.plans[plan] += 1
+
+    def to_dict(self) -> Dict[str, float]:
+        latencies = np.asarray(self.search_ms) if self.search_ms else np.zeros(1)
+        return {
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "load_ms": self.load_ms,
+            "searches": self.searches,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "plans": dict(self.plans),
+        }
+
+
+class CorpusRegistry:
+    """
+    Loaded corpora, LRU-evicted beyond memory_budget bytes.
+
+    Pinned corpora (e.g. the default corpus the interface loaded itself, with live
+    ingestion) are never evicted, and the corpus being returned is never evicted by
+    its own load, so a single corpus larger than the budget still loads.
+    """
+
+    def __init__(self, es_client, manifest: ArtifactManifest = None, memory_budget: int = CORPUS_MEMORY_BUDGET,
+                 loader: Callable[[Corpus, object, ArtifactManifest], LoadedCorpus] = load_corpus):
+        self.es_client = es_client
+        self.manifest = manifest or ArtifactManifest()
+        self.memory_budget = memory_budget
+        self.loader = loader
+        self.loaded: "OrderedDict[str, LoadedCorpus]" = OrderedDict()
+        self.pinned = set()
+        self.metrics: Dict[str, CorpusMetrics] = {}
+        self.lock = threading.Lock()
+
+    def names(self) -> List[str]:
+        available = list_corpora()
+        return available + [name for name in self.loaded if name not in available]
+
+    def total_bytes(self) -> int:
+        return sum(loaded.nbytes for loaded in self.loaded.values())
+
+    def get_metrics(self, name: str) -> CorpusMetrics:
+        if name not in self.metrics:
+            self.metrics[name] = CorpusMetrics()
+        return self.metrics[name]
+
+    def add(self, name: str, store: EmailStore, pinned: bool = True) -> LoadedCorpus:
+        """Register a corpus that is already loaded."""
+        loaded = LoadedCorpus(get_corpus(name), store, estimate_nbytes(store.dfs, store.indexes))
+        with self.lock:
+            self.loaded[name] = loaded
+            if pinned:
+                self.pinned.add(name)
+            self._evict(keep=name)
+        return loaded
+
+    def get(self, name: str) -> LoadedCorpus:
+        """A loaded corpus, loading it (and evicting others) if needed."""
+        with self.lock:
+            loaded = self.loaded.get(name)
+            if loaded is not None:
+                self.loaded.move_to_end(name)
+                return loaded
+
+            print(f"📂 Loading corpus {name}...")
+            start = time.perf_counter()
+            loaded = self.loader(get_corpus(name), self.es_client, self.manifest)
+            metrics = self.get_metrics(name)
+            metrics.loads += 1
+            metrics.load_ms = (time.perf_counter() - start) * 1000
+            self.loaded[name] = loaded
+            self._evict(keep=name)
+            return loaded
+
+    def _evict(self, keep: str):
+        while self.total_bytes() > self.memory_budget:
+            victim = next((name for name in self.loaded if name != keep and name not in self.pinned), None)
+            if victim is None:
+                return
+            del self.loaded[victim]
+            self.get_metrics(victim).evictions += 1
+            print(f"🗑️ Evicted corpus {victim} from memory.")
+
+    def record_search(self, name: str, elapsed_ms: float, plan: str = None):
+        with self.lock:
+            self.get_metrics(name).record_search(elapsed_ms, plan)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {
+                name: {
+                    **metrics.to_dict(),
+                    "loaded": name in self.loaded,
+                    "bytes": self.loaded[name].nbytes if name in self.loaded else 0,
+                }
+                for name, metrics in self.metrics.items()
+            }
@@ -2,30 +2,37 @@
 Email embedding module to generate embeddings for emails
 """
 import os
-from typing import List
+from typing import List, Tuple
 import torch
 from torch import Tensor
 from transformers import AutoTokenizer, AutoModel
 import torch.nn.functional as F
 from src.utils import set_global_seed
+from src.config import EMBEDDING_MODEL_NAME
+from src.resources.model_snapshots import find_snapshot, load_snapshot
 
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "max_split_size_mb:32,expandable_segments:True"
 
 class EmailEmbedder:
     def __init__(self, seed: int = None):
         """Initialize email embedder.
-        
+
+        Loads the model's local snapshot (memory-mapped) when there is one.
         """
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-        model_name = "infly/inf-retriever-v1-1.5b"
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+        model_name = EMBEDDING_MODEL_NAME
+        snapshot_path = find_snapshot(model_name)
+        if snapshot_path is not None:
+            self.model, self.tokenizer = load_snapshot(snapshot_path, AutoModel, self.device)
+        else:
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
 
-        self.model = AutoModel.from_pretrained(
-            model_name,
-            device_map={"": self.device},
-            trust_remote_code=True
-        )
+            self.model = AutoModel.from_pretrained(
+                model_name,
+                device_map={"": self.device},
+                trust_remote_code=True
+            )
         if seed is not None:
             set_global_seed(seed)
 
@@ -61,6 +68,59 @@ class EmailEmbedder:
 
         return torch.cat(all_embeddings, dim=0)
 
+    def split_into_chunks(self, text: str, chunk_tokens: int) -> List[str]:
+        """
+        Split a text into consecutive windows of at most chunk_tokens tokens,
+        cut at token boundaries using the fast tokenizer's character offsets.
+        """
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        if not offsets:
+            return [text]
+        chunks = []
+        for start in range(0, len(offsets), chunk_tokens):
+            window = offsets[start:start + chunk_tokens]
+            chunks.append(text[window[0][0]:window[-1][1]])
+        return chunks
+
+    @torch.inference_mode()
+    def embed_chunks(self, emails: List[str], chunk_tokens: int, batch_size: int) -> Tuple[torch.Tensor, List[int]]:
+        """
+        Embed emails as bounded token windows, all padded to the same length so
+        every forward pass has the same shape and cost.
+
+        Args:
+            emails: Email texts.
+            chunk_tokens: Tokens per chunk.
+            batch_size: Chunks per forward pass.
+
+        Returns:
+            (chunk embeddings, index of the email each chunk belongs to)
+        """
+        chunks, chunk_to_email = [], []
+        for email_index, email in enumerate(emails):
+            for chunk in self.split_into_chunks(email, chunk_tokens):
+                chunks.append(chunk)
+                chunk_to_email.append(email_index)
+
+        all_embeddings = []
+        for i in range(0, len(chunks), batch_size):
+            batch = chunks[i:i + batch_size]
+            # A few extra positions for the special tokens the tokenizer adds.
+            encoded_input = self.tokenizer(batch, padding="max_length", truncation=True,
+                                           max_length=chunk_tokens + 8, return_tensors="pt")
+            encoded_input = {k: v.to(self.device) for k, v in encoded_input.items()}
+
+            model_output = self.model(**encoded_input)
+
+            embeddings = self.last_token_pool(model_output.last_hidden_state, encoded_input["attention_mask"])
+            embeddings = F.normalize(embeddings, p=2, dim=1)
+            all_embeddings.append(embeddings.cpu())
+
+            del model_output, encoded_input, embeddings
+            torch.cuda.empty_cache()
+
+        return torch.cat(all_embeddings, dim=0), chunk_to_email
+
     @torch.inference_mode()
     def embed_query(self, queries: List[str]) -> torch.Tensor:
         task = "Given an email search query, retrieve the most relevant emails"
@@ -0,0 +1,198 @@
+"""
+Precomputed email-to-email nearest neighbor graph, for "more like this" searches.
+
+For each FAISS index <name>_embeddings.index (a folder, or 'all' for the unified
+index) this keeps a CSR graph of every row's top-k neighbors by inner product:
+    <name>_knn_indptr.npy   int64 (N + 1) offsets: row i's neighbors are entries indptr[i]:indptr[i + 1]
+    <name>_knn_indices.npy  int32 row positions of the neighbors, best first
+    <name>_knn_scores.npy   float16 inner products of the neighbors
+    <name>_knn_source.json  size and mtime of the index files the graph was built from
+
+Run `python -m src.embeddings.knn_graph` to build them from the existing FAISS
+indexes without re-embedding.
+"""
+import os
+import json
+import glob
+import argparse
+import numpy as np
+import faiss
+from tqdm import tqdm
+from typing import Dict, List, Optional, Tuple
+from src.embeddings.vector_store import reconstruct_all
+from src.semantic_search.sharded_index import get_shard_dir
+from src.semantic_search.unified_index import get_unified_paths
+from src.config import EMBEDDINGS_DIR, UNIFIED_INDEX, KNN_GRAPH_K, FAISS_NUM_SHARDS
+
+
+def get_knn_graph_paths(name: str, embeddings_dir: str = EMBEDDINGS_DIR) -> Tuple[str, str, str, str]:
+    return (
+        os.path.join(embeddings_dir, f"{name}_knn_indptr.npy"),
+        os.path.join(embeddings_dir, f"{name}_knn_indices.npy"),
+        os.path.join(embeddings_dir, f"{name}_knn_scores.npy"),
+        os.path.join(embeddings_dir, f"{name}_knn_source.json"),
+    )
+
+
+def get_source_index_files(name: str, embeddings_dir: str = EMBEDDINGS_DIR) -> List[str]:
+    """Files of the FAISS index a graph is built from (see load_source_index)."""
+    if name == "all":
+        return [get_unified_paths(embeddings_dir)[0]]
+    if FAISS_NUM_SHARDS > 1:
+        return sorted(glob.glob(os.path.join(get_shard_dir(embeddings_dir, name), "*")))
+    return [os.path.join(embeddings_dir, f"{name}_embeddings.index")]
+
+
+def stamp_files(paths: List[str]) -> Dict[str, Dict[str, int]]:
+    """Size and mtime of each existing file, which change whenever the index is rewritten."""
+    stamps = {}
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stamps[os.path.basename(path)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return stamps
+
+
+def get_graph_names() -> List[str]:
+    """Indexes a graph is built for: the unified index, or each folder's."""
+    return ["all"] if UNIFIED_INDEX else ["inbox", "sent"]
+
+
+class KnnGraph:
+    """Top-k neighbors of every row of a FAISS index, in CSR form."""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray):
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.num_rows = len(indptr) - 1
+        # Rows have fewer neighbors than k only when the index has fewer other rows.
+        self.k = int(np.diff(indptr).max()) if self.num_rows > 0 else 0
+
+    def neighbors(self, position: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(row positions, scores) of a row's neighbors, best first."""
+        start, end = self.indptr[position], self.indptr[position + 1]
+        return np.asarray(self.indices[start:end], dtype="int64"), np.asarray(self.scores[start:end], dtype="float32")
+
+    def save(self, name: str, source: Dict[str, Dict[str, int]], embeddings_dir: str = EMBEDDINGS_DIR):
+        """
+        Args:
+            name: Index the graph was built from.
+            source: stamp_files of the index's files, taken before the graph was built.
+            embeddings_dir: Directory holding the index.
+        """
+        indptr_path, indices_path, scores_path, source_path = get_knn_graph_paths(name, embeddings_dir)
+        os.makedirs(embeddings_dir, exist_ok=True)
+        np.save(indptr_path, self.indptr)
+        np.save(indices_path, self.indices)
+        np.save(scores_path, self.scores)
+        with open(source_path, "w") as f:
+            json.dump(source, f, indent=2, sort_keys=True)
+        print(f"Saved kNN graph at: {indptr_path}")
+
+    @classmethod
+    def load(cls, name: str, embeddings_dir: str = EMBEDDINGS_DIR) -> "KnnGraph":
+        """Load a graph with its arrays memory-mapped read-only."""
+        indptr_path, indices_path, scores_path, _ = get_knn_graph_paths(name, embeddings_dir)
+        if not os.path.exists(indptr_path):
+            raise FileNotFoundError(f"kNN graph not found at: {indptr_path}")
+        return cls(np.load(indptr_path, mmap_mode="r"), np.load(indices_path, mmap_mode="r"),
+                   np.load(scores_path, mmap_mode="r"))
+
+
+def is_graph_current(name: str, embeddings_dir: str = EMBEDDINGS_DIR) -> bool:
+    """Whether the index files are still the ones the graph was built from."""
+    source_path = get_knn_graph_paths(name, embeddings_dir)[3]
+    if not os.path.exists(source_path):
+        return False
+    with open(source_path, "r") as f:
+        source = json.load(f)
+    return bool(source) and source == stamp_files(get_source_index_files(name, embeddings_dir))
+
+
+def load_knn_graph(name: str, embeddings_dir: str = EMBEDDINGS_DIR, num_rows: int = None) -> Optional[KnnGraph]:
+    """
+    The graph of an index, or None if it was not built, or was built from other
+    index files or from more rows than the index (num_rows) now has. A graph with
+    fewer rows is still used: the rows past it were ingested after it was built.
+    """
+    try:
+        graph = KnnGraph.load(name, embeddings_dir)
+    except FileNotFoundError:
+        return None
+    if not is_graph_current(name, embeddings_dir):
+        print(f"⚠️ The {name} kNN graph was built from another {name} index; ignoring it.")
+        return None
+    if num_rows is not None and graph.num_rows > num_rows:
+        print(f"⚠️ The {name} kNN graph has {graph.num_rows} rows but its index has {num_rows}; ignoring it.")
+        return None
+    return graph
+
+
+def build_knn_graph(index, k: int = KNN_GRAPH_K, block_size: int = 4096, num_threads: int = None) -> KnnGraph:
+    """
+    Search every stored vector against the index, a block of rows at a time.
+
+    Each block is one batched FAISS search, which runs its queries on num_threads
+    OpenMP threads (all cores by default).
+
+    Args:
+        index: Flat or sharded FAISS index searched with (and whose vectors are the queries).
+        k: Neighbors kept per row, not counting the row itself.
+        block_size: Rows searched per batch.
+        num_threads: FAISS threads.
+    """
+    faiss.omp_set_num_threads(num_threads or os.cpu_count() or 1)
+    vectors = reconstruct_all(index)
+    num_rows = len(vectors)
+    depth = min(k + 1, num_rows)
+
+    counts = np.zeros(num_rows + 1, dtype="int64")
+    indices, scores = [], []
+    for start in tqdm(range(0, num_rows, block_size), desc="Searching neighbors"):
+        block_scores, block_positions = index.search(np.ascontiguousarray(vectors[start:start + block_size]), depth)
+        rows = np.arange(start, start + len(block_positions))[:, None]
+        # A row tied with identical vectors is not necessarily its own first hit, so it is dropped wherever it is.
+        keep = (block_positions >= 0) & (block_positions != rows)
+        keep &= np.cumsum(keep, axis=1) <= k
+        counts[start + 1:start + 1 + len(block_positions)] = keep.sum(axis=1)
+        indices.append(block_positions[keep].astype("int32"))
+        scores.append(block_scores[keep].astype("float16"))
+
+    return KnnGraph(
+        np.cumsum(counts),
+        np.concatenate(indices) if indices else np.empty(0, dtype="int32"),
+        np.concatenate(scores) if scores else np.empty(0, dtype="float16"),
+    )
+
+
+def load_source_index(name: str, embeddings_dir: str = EMBEDDINGS_DIR):
+    """The flat (or sharded) FAISS index a graph is built from."""
+    from src.utils import load_faiss_index
+    from src.semantic_search.unified_index import UnifiedIndex
+
+    if name == "all":
+        return UnifiedIndex.load(embeddings_dir).index
+    return load_faiss_index(name, index_type="flat", index_dir=embeddings_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the kNN graphs of the FAISS indexes.")
+    parser.add_argument("--names", nargs="+", default=None,
+                        help="Indexes to build graphs for (default: 'all' with UNIFIED_INDEX, else inbox and sent).")
+    parser.add_argument("--k", type=int, default=KNN_GRAPH_K, help="Neighbors per email.")
+    parser.add_argument("--block_size", type=int, default=4096, help="Emails searched per batch.")
+    parser.add_argument("--num_threads", type=int, default=None, help="FAISS threads (default: all cores).")
+    parser.add_argument("--corpus", type=str, default=None, help="Build the graphs of this corpus under CORPORA_DIR.")
+    args = parser.parse_args()
+
+    embeddings_dir = EMBEDDINGS_DIR
+    names = args.names or get_graph_names()
+    if args.corpus:
+        from src.corpora.registry import get_corpus
+        embeddings_dir = get_corpus(args.corpus).embeddings_dir
+        names = args.names or ["inbox", "sent"]
+    for name in names:
+        source = stamp_files(get_source_index_files(name, embeddings_dir))
+        graph = build_knn_graph(load_source_index(name, embeddings_dir), args.k, args.block_size, args.num_threads)
+        graph.save(name, source, embeddings_dir)
@@ -5,14 +5,20 @@ Script to store email embeddings into FAISS index.
 # TODO: Modify to store Inbox and Sent email embeddings separately.
 
 import os
+import json
 import argparse
 import torch
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 import faiss
 from src.embeddings.embeddings import EmailEmbedder
-from src.utils import load_processed_emails
-from src.config import PROCESSED_DIR, EMBEDDINGS_DIR, INBOX_PATH, SENT_PATH
+from src.utils import load_processed_emails, load_unified_emails
+from src.embeddings.vector_store import save_vectors
+from src.semantic_search.chunk_index import get_chunk_paths
+from src.semantic_search.unified_index import get_unified_paths, folder_mask
+from src.semantic_search.sharded_index import SHARD_MANIFEST_NAME, get_shard_dir, assign_shards, describe_shard
+from src.config import PROCESSED_DIR, EMBEDDINGS_DIR, INBOX_PATH, SENT_PATH, FAISS_NUM_SHARDS, FAISS_SHARD_BY
 
 tqdm.pandas()
 
@@ -58,10 +64,125 @@ def build_faiss_index(embeddings: torch.Tensor) -> faiss.IndexFlatIP:
     index.add(embeddings.numpy().astype("float32"))
     return index
 
+def build_sharded_faiss_indexes(embedder: EmailEmbedder, df: pd.DataFrame, label: str, num_shards: int,
+                                shard_by: str, batch_size: int, rebuild_shards: list = None) -> np.ndarray:
+    """
+    Embed a folder into num_shards IndexIDMap shards keyed by row position in the folder.
+
+    Args:
+        embedder: EmailEmbedder instance
+        df: Folder DataFrame, in the order load_processed_emails returns it
+        label: Folder name
+        num_shards: Number of shards
+        shard_by: 'hash' or 'date'
+        batch_size: Size of batches for embedding
+        rebuild_shards: Only re-embed these shards and keep the other shard files
+            (the folder's rows must not have changed since they were built)
+    Returns:
+        (N, d) embeddings in row order, with kept shards' rows reconstructed from their files
+    """
+    shard_dir = get_shard_dir(EMBEDDINGS_DIR, label)
+    os.makedirs(shard_dir, exist_ok=True)
+
+    dates = pd.to_datetime(df["ExtractedDateSent"], errors="coerce").to_numpy(dtype="datetime64[ns]")
+    assignment = assign_shards(len(df), num_shards, shard_by, email_ids=df["Id"].to_numpy(), dates=dates)
+    texts = prepare_email_for_embedding(df)
+
+    dimension = embedder.model.config.hidden_size
+    all_embeddings = np.zeros((len(df), dimension), dtype="float32")
+    shard_info = []
+    for shard in range(num_shards):
+        rows = np.flatnonzero(assignment == shard)
+        shard_file = f"shard_{shard}.index"
+        shard_path = os.path.join(shard_dir, shard_file)
+        info = describe_shard(rows, dates if shard_by == "date" else None)
+        info["file"] = shard_file
+        shard_info.append(info)
+
+        if rebuild_shards is not None and shard not in rebuild_shards and os.path.exists(shard_path):
+            print(f"Keeping existing shard {shard}.")
+            kept = faiss.read_index(shard_path)
+            if kept.ntotal > 0:
+                all_embeddings[faiss.vector_to_array(kept.id_map)] = faiss.downcast_index(kept.index).reconstruct_n(0, kept.ntotal)
+            continue
+
+        print(f"Embedding shard {shard} ({len(rows)} emails)...")
+        index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+        if len(rows) > 0:
+            embeddings = batch_embed(embedder, [texts[i] for i in rows], batch_size).numpy().astype("float32")
+            index.add_with_ids(embeddings, rows.astype("int64"))
+            all_embeddings[rows] = embeddings
+        faiss.write_index(index, shard_path)
+
+    with open(os.path.join(shard_dir, SHARD_MANIFEST_NAME), "w") as f:
+        json.dump({"num_shards": num_shards, "shard_by": shard_by, "shards": shard_info}, f, indent=2)
+    print(f"Sharded FAISS index saved at: {shard_dir}")
+    return all_embeddings
+
+def build_chunk_index(embedder: EmailEmbedder, df: pd.DataFrame, label: str, chunk_tokens: int, batch_size: int) -> None:
+    """
+    Embed a folder as fixed-length passage chunks and save the chunk index with
+    its chunk -> email row position map.
+    Args:
+        embedder: EmailEmbedder instance
+        df: Folder DataFrame, in the order load_processed_emails returns it
+        label: Folder name
+        chunk_tokens: Tokens per chunk
+        batch_size: Chunks per forward pass
+    """
+    texts = prepare_email_for_embedding(df)
+    embeddings, chunk_to_email = [], []
+    for i in tqdm(range(0, len(texts), batch_size), desc="Embedding email chunks"):
+        batch_embeddings, batch_map = embedder.embed_chunks(texts[i: i + batch_size], chunk_tokens, batch_size)
+        embeddings.append(batch_embeddings)
+        chunk_to_email.extend(i + j for j in batch_map)
+    embeddings = torch.cat(embeddings, dim=0)
+    print(f"Generated {embeddings.shape[0]} chunk embeddings for {len(texts)} {label} emails.")
+
+    index = build_faiss_index(embeddings)
+    index_path, map_path = get_chunk_paths(label, EMBEDDINGS_DIR)
+    faiss.write_index(index, index_path)
+    np.save(map_path, np.asarray(chunk_to_email, dtype="int64"))
+    print(f"Chunk index saved at: {index_path}")
+
+def build_unified_index(embedder: EmailEmbedder, batch_size: int) -> None:
+    """
+    Embed every distinct email once into a single flat index over both folders, and
+    save the folder mask of each row next to it.
+    Args:
+        embedder: EmailEmbedder instance
+        batch_size: Size of batches for embedding
+    """
+    df = load_unified_emails()
+    masks = folder_mask(df["folder"])
+    print(f"Unified corpus: {len(df)} distinct emails ({int((masks == 3).sum())} in both folders)")
+
+    embeddings = batch_embed(embedder, prepare_email_for_embedding(df), batch_size)
+    index = build_faiss_index(embeddings)
+    index_path, mask_path = get_unified_paths(EMBEDDINGS_DIR)
+    faiss.write_index(index, index_path)
+    np.save(mask_path, masks)
+    print(f"Unified FAISS index saved at: {index_path}")
+
 def main(args):
+    if args.unified:
+        print("Initializing email embedder...")
+        build_unified_index(EmailEmbedder(seed=args.seed), args.batch_size)
+        print("\nDone!")
+        return
+
     print("📥 Loading processed emails...")
 
-    df = load_processed_emails()
+    embeddings_dir = EMBEDDINGS_DIR
+    if args.corpus:
+        # Imported here: the registry imports live ingestion, which imports this module.
+        from src.corpora.registry import get_corpus
+        corpus = get_corpus(args.corpus)
+        embeddings_dir = corpus.embeddings_dir
+        os.makedirs(embeddings_dir, exist_ok=True)
+        df = load_processed_emails(canonical_only=False, processed_dir=corpus.processed_dir)
+    else:
+        df = load_processed_emails()
     inbox_df = df[df["folder"] == "inbox"]
     sent_df = df[df["folder"] == "sent"]
 
@@ -77,6 +198,15 @@ def main(args):
             continue
 
         print(f"\n📤 Processing {label.capitalize()} emails...")
+        if args.chunk_tokens:
+            build_chunk_index(embedder, df, label, args.chunk_tokens, batch_size)
+            continue
+
+        if args.num_shards > 1:
+            embeddings = build_sharded_faiss_indexes(embedder, df, label, args.num_shards, args.shard_by, batch_size, args.rebuild_shards)
+            save_vectors(label, embeddings, df["Id"].to_numpy())
+            continue
+
         texts = prepare_email_for_embedding(df)
 
         print("Generating embeddings...")
@@ -89,15 +219,26 @@ def main(args):
 
         print("💾 Saving FAISS index to disk...")
         os.makedirs(PROCESSED_DIR, exist_ok=True)
-        index_path = os.path.join(EMBEDDINGS_DIR, f"{label}_embeddings.index")
+        index_path = os.path.join(embeddings_dir, f"{label}_embeddings.index")
         faiss.write_index(index, index_path)
         print(f"FAISS index saved at: {index_path}")
 
+        save_vectors(label, embeddings.numpy(), df["Id"].to_numpy(), embeddings_dir=embeddings_dir)
+
     print("\nDone!")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Store email embeddings in FAISS index.")
     parser.add_argument("--batch_size", type=int, default=1, help="Batch size for embedding emails.")
     parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducibility")
+    parser.add_argument("--num_shards", type=int, default=FAISS_NUM_SHARDS, help="Number of FAISS shards per folder.")
+    parser.add_argument("--shard_by", choices=["hash", "date"], default=FAISS_SHARD_BY, help="How emails are assigned to shards.")
+    parser.add_argument("--chunk_tokens", type=int, default=None, help="Build a passage chunk index with chunks of this many tokens.")
+    parser.add_argument("--rebuild_shards", type=int, nargs="+", default=None, help="Only rebuild these shard numbers.")
+    parser.add_argument("--unified", action="store_true", help="Build one flat index over both folders with a folder mask.")
+    parser.add_argument("--corpus", type=str, default=None,
+                        help="Build the flat indexes of this corpus under CORPORA_DIR instead of the default one.")
     args = parser.parse_args()
+    if args.corpus and (args.unified or args.chunk_tokens or args.num_shards > 1):
+        parser.error("--corpus only builds flat per-folder indexes.")
     main(args)
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+Raw email embeddings persisted next to the FAISS indexes.
+
+For each folder this keeps:
+    <folder>_vectors.npy              float16 (N, d) matrix, memory-mapped when loaded
+    <folder>_ids.npy                  int64 email Id of each row
+    <folder>_embeddings.binary.index  FAISS IndexBinaryFlat of the vectors' sign bits
+
+Run `python -m src.embeddings.vector_store` to export them from existing FAISS
+indexes without re-embedding.
+"""
+import os
+import argparse
+import numpy as np
+import faiss
+from typing import Tuple
+from src.config import EMBEDDINGS_DIR
+
+
+def get_vector_paths(folder: str, embeddings_dir: str = EMBEDDINGS_DIR) -> Tuple[str, str, str]:
+    return (
+        os.path.join(embeddings_dir, f"{folder}_vectors.npy"),
+        os.path.join(embeddings_dir, f"{folder}_ids.npy"),
+        os.path.join(embeddings_dir, f"{folder}_embeddings.binary.index"),
+    )
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """Pack the sign bit of each dimension into uint8 codes (d/8 bytes per vector)."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def build_binary_index(vectors: np.ndarray, block_size: int = 65536) -> faiss.IndexBinaryFlat:
+    index = faiss.IndexBinaryFlat(vectors.shape[1])
+    for start in range(0, vectors.shape[0], block_size):
+        index.add(binarize(np.asarray(vectors[start:start + block_size], dtype="float32")))
+    return index
+
+
+def save_vectors(folder: str, vectors: np.ndarray, email_ids: np.ndarray, embeddings_dir: str = EMBEDDINGS_DIR) -> None:
+    """
+    Persist a folder's embeddings as float16, with their email Ids and binary codes.
+
+    Args:
+        folder: Folder name
+        vectors: (N, d) embeddings, in FAISS row order
+        email_ids: Email Id of each row
+        embeddings_dir: Directory holding the FAISS indexes
+    """
+    vectors_path, ids_path, binary_path = get_vector_paths(folder, embeddings_dir)
+    os.makedirs(embeddings_dir, exist_ok=True)
+    np.save(vectors_path, np.asarray(vectors, dtype="float16"))
+    np.save(ids_path, np.asarray(email_ids, dtype="int64"))
+    faiss.write_index_binary(build_binary_index(vectors), binary_path)
+    print(f"Saved raw vectors at: {vectors_path}")
+
+
+def load_vectors(folder: str, embeddings_dir: str = EMBEDDINGS_DIR) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        (vectors, email_ids), with vectors memory-mapped read-only.
+    """
+    vectors_path, ids_path, _ = get_vector_paths(folder, embeddings_dir)
+    if not os.path.exists(vectors_path):
+        raise FileNotFoundError(f"Raw vectors not found at: {vectors_path}")
+    return np.load(vectors_path, mmap_mode="r"), np.load(ids_path)
+
+
+def reconstruct_all(index) -> np.ndarray:
+    """All stored vectors of a flat or sharded FAISS index, in row-position order."""
+    if hasattr(index, "shards"):
+        vectors = np.empty((index.ntotal, index.d), dtype="float32")
+        for shard in index.shards:
+            positions = faiss.vector_to_array(shard.id_map)
+            if len(positions):
+                vectors[positions] = faiss.downcast_index(shard.index).reconstruct_n(0, shard.ntotal)
+        return vectors
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def export_vectors_from_faiss(folder: str) -> None:
+    from src.utils import load_processed_emails, load_faiss_index
+
+    df = load_processed_emails()
+    email_ids = df[df["folder"] == folder]["Id"].to_numpy()
+    index = load_faiss_index(folder, index_type="flat")
+    if index.ntotal != len(email_ids):
+        raise ValueError(f"{folder} index has {index.ntotal} vectors but there are {len(email_ids)} emails")
+    save_vectors(folder, reconstruct_all(index), email_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export raw vectors and binary codes from the FAISS indexes.")
+    parser.add_argument("--folders", nargs="+", default=["inbox", "sent"], help="Folders to export.")
+    args = parser.parse_args()
+    for folder in args.folders:
+        export_vectors_from_faiss(folder)
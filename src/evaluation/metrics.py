@@ -1,19 +1,45 @@
 """
 Evaluation metrics for search results.
 """
-from typing import List, Dict
+from typing import List, Dict, Tuple, Union
 import numpy as np
-import math
-from collections import Counter
 
-def weighted_kendalls_w(score_lists: List[List[Dict[str, float]]], decay_rate: float = 20.0) -> float:
+Ranking = Union[Tuple[np.ndarray, np.ndarray], List[Dict[str, float]]]
+
+
+def as_arrays(ranking: Ranking) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (ids, scores) arrays of a ranking given either as arrays in rank order
+    or as a list of {Id, score} dicts.
+    """
+    if isinstance(ranking, tuple):
+        ids, scores = ranking
+        return np.asarray(ids, dtype="int64"), np.asarray(scores, dtype="float64")
+    ids = np.fromiter((item["Id"] for item in ranking), dtype="int64", count=len(ranking))
+    scores = np.fromiter((item["score"] for item in ranking), dtype="float64", count=len(ranking))
+    return ids, scores
+
+
+def get_ranks(ids: np.ndarray, size: int) -> np.ndarray:
+    """Rank of each email Id in a ranking (its first occurrence), -1 where it is absent."""
+    ranks = np.full(size, -1, dtype="int64")
+    # Reversed, so the first occurrence of a repeated Id is written last and wins.
+    ranks[ids[::-1]] = np.arange(len(ids) - 1, -1, -1)
+    return ranks
+
+
+def weighted_kendalls_w(score_lists: List[Ranking], decay_rate: float = 20.0, missing_rank: int = None) -> float:
     """
     Computes weighted Kendall's W coefficient measuring ranking agreement.
     Emphasizes agreement on top-ranked items through exponential decay weighting.
     
     Args:
-        score_lists: List of K lists of {Id, score}, each representing a ranking
+        score_lists: List of K rankings, each (ids, scores) arrays in rank order
+            or a list of {Id, score}
         decay_rate: Controls how quickly weights decrease with rank (higher = slower decay)
+        missing_rank: Rank of an email absent from a list (e.g. the depth of top-k lists),
+            with the emails of every list compared. By default only the first list's
+            emails are compared, each by the lists it appears in.
         
     Returns:
         Weighted Kendall's W between 0 (no agreement) and 1 (perfect agreement)
@@ -22,63 +48,56 @@ def weighted_kendalls_w(score_lists: List[List[Dict[str, float]]], decay_rate: f
     if K < 2:
         return 1.0  # Perfect agreement with only one list
 
-    # Get all email IDs from the first list
-    email_ids = [item["Id"] for item in score_lists[0]]
-    N = len(email_ids)
+    id_lists = [as_arrays(lst)[0] for lst in score_lists]
+    # Email IDs come from the first list, or from every list when missing ones are ranked
+    email_ids = np.unique(id_lists[0] if missing_rank is None else np.concatenate(id_lists))
+    N = len(id_lists[0])
     if N == 0:
         return 1.0  # No items to rank
 
-    # Build dictionary mapping email ID to its ranks across all systems
-    ranks_by_id = {}
-    for email_id in email_ids:
-        ranks_by_id[email_id] = []
-        for lst in score_lists:
-            for rank, item in enumerate(lst):
-                if item["Id"] == email_id:
-                    ranks_by_id[email_id].append(rank)
-                    break
-    
-    # Calculate variance for each item's ranks across systems
+    # (K, number of emails) matrix of each email's rank in each list, -1 where missing
+    size = int(max(ids.max() for ids in id_lists if len(ids))) + 1
+    ranks = np.stack([get_ranks(ids, size)[email_ids] for ids in id_lists]).astype("float64")
+    if missing_rank is not None:
+        ranks[ranks < 0] = missing_rank
+    present = ranks >= 0
+    counts = present.sum(axis=0)
+
+    # Variance of each item's ranks across the systems that ranked it
     # Higher variance means more disagreement about the item's rank
-    variances = {}
-    for email_id, ranks in ranks_by_id.items():
-        if len(ranks) <= 1:
-            variances[email_id] = 0
-        else:
-            mean_rank = sum(ranks) / len(ranks)
-            variances[email_id] = sum((r - mean_rank)**2 for r in ranks) / len(ranks)
-    
+    mean_rank = np.where(present, ranks, 0).sum(axis=0) / counts
+    variances = np.where(present, (ranks - mean_rank) ** 2, 0).sum(axis=0) / counts
+    variances[counts <= 1] = 0
+
     # Apply exponential weights based on best (lowest) rank
-    weights = {}
-    for email_id, ranks in ranks_by_id.items():
-        best_rank = min(ranks)
-        weights[email_id] = math.exp(-best_rank / decay_rate)
-    
+    best_rank = np.where(present, ranks, np.inf).min(axis=0)
+    weights = np.exp(-best_rank / decay_rate)
+
     # Calculate weighted average variance
-    total_weight = sum(weights.values())
+    total_weight = weights.sum()
     if total_weight == 0:
         return 1.0  # Edge case - no weights
-        
-    weighted_avg_variance = sum(weights[email_id] * variances[email_id] 
-                               for email_id in email_ids) / total_weight
-    
+
+    weighted_avg_variance = float((weights * variances).sum() / total_weight)
+
     # Normalize to [0,1] where 1 is perfect agreement
     # Maximum variance for N ranks is (N²-1)/12
     max_variance = (N**2 - 1) / 12 if N > 1 else 1
-    
+
     # Convert to agreement score (1 = perfect agreement, 0 = no agreement)
     agreement = 1.0 - (weighted_avg_variance / max_variance if max_variance > 0 else 0)
-    
+
     return min(1.0, max(0.0, agreement))
 
 
-def weighted_pairwise_mse(score_lists: List[List[Dict[str, float]]], decay_rate: float = 20.0) -> float:
+def weighted_pairwise_mse(score_lists: List[Ranking], decay_rate: float = 20.0) -> float:
     """
-    Pairwise weighted MSE across K score lists of {Id, score},
+    Pairwise weighted MSE across K score lists,
     weighting higher-ranked emails more using exponential decay.
     
     Args:
-        score_lists: List of K lists of {Id, score}, each representing a query variant.
+        score_lists: List of K rankings, each (ids, scores) arrays in rank order
+            or a list of {Id, score}, each representing a query variant.
         decay_rate: Controls how quickly weights drop off for lower-ranked emails.
 
     Returns:
@@ -88,37 +107,31 @@ def weighted_pairwise_mse(score_lists: List[List[Dict[str, float]]], decay_rate:
     K = len(score_lists)
     if K < 2:
         return 0.0
-    
-    ref_ids = set(item["Id"] for item in score_lists[0])
-    for idx, lst in enumerate(score_lists[1:], start=1):
-        assert ref_ids == set(item["Id"] for item in lst), f"ID mismatch in list {idx}"
-
-    email_ids = sorted(ref_ids)
-
-    # Build: email_id → list of (score, rank) for each query
-    score_rank_by_id = {email_id: [] for email_id in email_ids}
-    for lst in score_lists:
-        id_to_score = {item["Id"]: item["score"] for item in lst}
-        id_to_rank = {item["Id"]: rank for rank, item in enumerate(lst)}
-        for email_id in email_ids:
-            score = id_to_score[email_id]
-            rank = id_to_rank[email_id]
-            score_rank_by_id[email_id].append((score, rank))
+
+    # Scores and ranks of each list, aligned by email ID
+    scores_by_id, ranks_by_id = [], []
+    ref_ids = None
+    for idx, lst in enumerate(score_lists):
+        ids, scores = as_arrays(lst)
+        order = np.argsort(ids, kind="stable")
+        if ref_ids is None:
+            ref_ids = ids[order]
+        else:
+            assert np.array_equal(ref_ids, ids[order]), f"ID mismatch in list {idx}"
+        scores_by_id.append(scores[order])
+        ranks_by_id.append(order)
 
     total_weighted_error = 0.0
     total_weight = 0.0
 
     # For every email, compute pairwise MSE of scores across queries
-    for email_id, values in score_rank_by_id.items():
-        for i in range(K):
-            for j in range(i + 1, K):
-                score_i, rank_i = values[i]
-                score_j, rank_j = values[j]
-                weight = math.exp(-min(rank_i, rank_j) / decay_rate)
-                error = (score_i - score_j) ** 2
-                total_weighted_error += weight * error
-                total_weight += weight
+    for i in range(K):
+        for j in range(i + 1, K):
+            weights = np.exp(-np.minimum(ranks_by_id[i], ranks_by_id[j]) / decay_rate)
+            errors = (scores_by_id[i] - scores_by_id[j]) ** 2
+            total_weighted_error += float((weights * errors).sum())
+            total_weight += float(weights.sum())
 
     mse = total_weighted_error / total_weight if total_weight > 0 else 0.0
 
-    return min(1.0, mse ) 
+    return min(1.0, mse )
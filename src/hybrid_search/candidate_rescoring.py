@@ -0,0 +1,127 @@
+"""
+Hybrid search fused over a candidate set instead of the whole folder.
+
+The candidates are the union of the keyword leg's hits and a shallow FAISS top-k
+per query variant. Their stored vectors are scored against every query variant
+in one matrix product, and the per-variant rankings and the fusion only involve
+the candidates. Past the FAISS scan itself, a hybrid search then costs in
+proportion to the number of candidates instead of the folder size.
+"""
+import faiss
+import numpy as np
+from typing import List, Optional, Tuple
+from src.semantic_search.semantic_search import get_query_embeddings, get_query_date_range, select_date_shards
+from src.hybrid_search.hybrid_rankings import min_max_normalize, get_semantic_weight
+from src.resources.search_settings import get_search_settings
+import src.semantic_search.semantic_search as semantic_components
+from src.config import RESCORE_FAISS_DEPTH
+
+
+def reconstruct_rows(index, positions: np.ndarray) -> np.ndarray:
+    """(len(positions), d) stored vectors of the given row positions."""
+    if isinstance(index, faiss.Index):
+        return index.reconstruct_batch(np.asarray(positions, dtype="int64"))
+    # Wrappers (sharded, two-stage, chunked, live, folder views) reconstruct one row at a time.
+    return np.vstack([index.reconstruct(int(p)) for p in positions]).astype("float32")
+
+
+def get_semantic_candidates(query: str, index, df, num_variants: int = None, depth: int = RESCORE_FAISS_DEPTH,
+                            query_embeddings: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Embed the query variants and retrieve each one's shallow FAISS top-k.
+
+    Args:
+        num_variants: Paraphrases to search with (see get_query_embeddings).
+        depth: Nearest neighbors retrieved per query variant.
+        query_embeddings: Query embeddings computed ahead of the search (see get_query_embeddings).
+
+    Returns:
+        (query embeddings of shape (num_variants, d), distinct candidate row positions)
+    """
+    print("🔍 Conducting semantic candidate search...")
+    query_embeddings = get_query_embeddings(
+        query, index, semantic_components.expansion_mode, num_variants, query_embeddings
+    )
+    shard_ids = select_date_shards(index, get_query_date_range(query))
+    if shard_ids is not None:
+        _, positions = index.search(query_embeddings, min(depth, index.ntotal), shard_ids=shard_ids)
+    else:
+        _, positions = index.search(query_embeddings, min(depth, index.ntotal))
+    positions = np.unique(positions)
+    # -1 pads missing results; rows past the DataFrame were ingested after it was taken.
+    return query_embeddings, positions[(positions >= 0) & (positions < len(df))]
+
+
+def rescore_candidates(query_embeddings: np.ndarray, index, positions: np.ndarray, rrf_k: int) -> np.ndarray:
+    """
+    Semantic score of each candidate: the reciprocal rank fusion, over the query
+    variants, of its rank among the candidates by exact inner product.
+    """
+    similarities = query_embeddings @ reconstruct_rows(index, positions).T
+    order = np.argsort(-similarities, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(len(positions))[None, :], axis=1)
+    return (1.0 / (rrf_k + ranks + 1)).sum(axis=0)
+
+
+def fuse_candidates(
+    query_embeddings: np.ndarray,
+    semantic_positions: np.ndarray,
+    keyword_rankings: List[Tuple[int, float]],
+    index,
+    query_len: int,
+    num_emails: int,
+    excluded: Optional[np.ndarray] = None,
+) -> Optional[np.ndarray]:
+    """
+    Fuse the semantic and keyword scores of the candidates like combine_scores does
+    for every email.
+
+    Args:
+        query_embeddings: Embedded query variants.
+        semantic_positions: Row positions of the FAISS candidates.
+        keyword_rankings: Keyword search results [(email_id, score)].
+        index: FAISS index (or wrapper) the candidates' vectors are read from.
+        query_len: Number of words in the query.
+        num_emails: Total number of emails.
+        excluded: Boolean mask of emails outside the searched folder (unified index).
+
+    Returns:
+        Dense array of combined scores indexed by email ID - 1, where emails outside
+        the candidate set score -inf (so they are never ranked), or None if there
+        are no candidates.
+    """
+    keyword_positions = np.empty(0, dtype="int64")
+    keyword_scores = np.empty(0, dtype="float64")
+    if len(keyword_rankings):
+        ids, scores = zip(*keyword_rankings)
+        keyword_positions = np.asarray(ids, dtype="int64") - 1
+        keyword_scores = np.asarray(scores, dtype="float64")
+        # Emails ingested after the caller took its DataFrame are not part of this search.
+        visible = keyword_positions < num_emails
+        keyword_positions, keyword_scores = keyword_positions[visible], keyword_scores[visible]
+
+    candidates = np.union1d(semantic_positions, keyword_positions).astype("int64")
+    if excluded is not None:
+        candidates = candidates[~excluded[candidates]]
+    if len(candidates) == 0:
+        return None
+
+    semantic_scores = min_max_normalize(
+        rescore_candidates(query_embeddings, index, candidates, get_search_settings().rrf_k)
+    )
+    candidate_keyword_scores = np.zeros(len(candidates), dtype="float64")
+    kept = np.isin(keyword_positions, candidates)
+    candidate_keyword_scores[np.searchsorted(candidates, keyword_positions[kept])] = keyword_scores[kept]
+
+    if len(keyword_positions):
+        print(f"➕ Combining rankings of {len(candidates)} candidates...")
+        semantic_weight = get_semantic_weight(query_len)
+        # As in combine_scores, keyword scores are scaled from the no-match score 0.
+        candidate_keyword_scores = min_max_normalize(candidate_keyword_scores, min_score=0.0)
+    else:
+        semantic_weight = 1.0
+
+    combined = np.full(num_emails, -np.inf)
+    combined[candidates] = semantic_weight * semantic_scores + (1.0 - semantic_weight) * candidate_keyword_scores
+    return combined
@@ -1,28 +1,32 @@
 ﻿import torch
 from transformers import GPT2LMHeadModel, GPT2Tokenizer
-from typing import List, Tuple
-import heapq
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
 import math
 import statistics
+from src.resources.search_settings import get_search_settings
 
 
-def min_max_normalize(scores: List[float]) -> List[float]:
+def min_max_normalize(scores: Sequence[float], min_score: float = None) -> np.ndarray:
     """
     Normalize a list of scores using min-max scaling to [0, 1].
 
     Args:
         scores: Raw float scores.
+        min_score: Fixed lower bound instead of the smallest score.
 
     Returns:
-        List of normalized scores.
+        Array of normalized scores.
     """
-    min_score = min(scores)
-    max_score = max(scores)
+    scores = np.asarray(scores, dtype="float64")
+    if min_score is None:
+        min_score = scores.min()
+    max_score = scores.max()
     if max_score == min_score:
-        return [0.0 for _ in scores]
-    return [(s - min_score) / (max_score - min_score) for s in scores]
+        return np.zeros_like(scores)
+    return (scores - min_score) / (max_score - min_score)
 
-def fill_missing_scores(rankings: List[Tuple[int, float]], num_emails: int) -> List[float]:
+def fill_missing_scores(rankings: List[Tuple[int, float]], num_emails: int) -> np.ndarray:
     """
     Fills a list of scores with 0.0 where email IDs are missing.
 
@@ -31,59 +35,67 @@ def fill_missing_scores(rankings: List[Tuple[int, float]], num_emails: int) -> L
         num_emails: Total number of emails.
 
     Returns:
-        A dense list of scores indexed by email ID - 1.
+        A dense array of scores indexed by email ID - 1.
     """
-    filled = [0.0] * num_emails
-    for email_id, score in rankings:
-        filled[email_id - 1] = score
+    filled = np.zeros(num_emails, dtype="float64")
+    if len(rankings):
+        ids, scores = zip(*rankings)
+        ids = np.asarray(ids, dtype="int64")
+        # Emails ingested after the caller took its DataFrame are not part of this search.
+        visible = ids <= num_emails
+        filled[ids[visible] - 1] = np.asarray(scores)[visible]
     return filled
 
 def get_semantic_weight(query_len: int) -> float:
     """
-    Logistic-based curve:
+    Logistic-based curve (with the default search settings):
     - Exactly 0.25 at query_len = 1
     - Exactly 0.50 at query_len = 4
     - Plateaus at 0.75
     """
+    settings = get_search_settings()
+    low, high = settings.semantic_weight_min, settings.semantic_weight_max
+    midpoint, steepness = settings.semantic_weight_midpoint, settings.semantic_weight_steepness
 
-    growth = 1 / (1 + math.exp(-0.9 * (query_len - 4)))
-    semantic_weight = 0.25 + 0.5 * (growth - 1 / (1 + math.exp(0.9 * 3)))
-    return min(semantic_weight, 0.75)
+    growth = 1 / (1 + math.exp(-steepness * (query_len - midpoint)))
+    semantic_weight = low + (high - low) * (growth - 1 / (1 + math.exp(steepness * (midpoint - 1))))
+    return min(semantic_weight, high)
 
 
-def combine_rankings(
+def combine_scores(
     semantic_rankings: List[Tuple[int, float]],
     keyword_rankings: List[Tuple[int, float]],
     query_len: int,
     num_emails: int,
-    num_results_wanted: int,
-    top_n: int = 10,
-    is_test=False,
-) -> List[Tuple[int, float]]:
-    has_semantic = len(semantic_rankings) > 0
-    has_keyword = len(keyword_rankings) > 0
+    excluded: Optional[np.ndarray] = None,
+) -> Optional[np.ndarray]:
     """
-    Combines semantic and keyword rankings using normalized weighted sum.
+    Fuse semantic and keyword rankings into one score per email using a normalized weighted sum.
 
     Args:
         semantic_rankings: Semantic search results [(email_id, score)].
         keyword_rankings: Keyword search results [(email_id, score)].
         query_len: Number of words in the query.
         num_emails: Total number of emails.
-        num_results_wanted: Number of results to return.
-        is_test: If True, return all results sorted by score. If False, return top N results.
+        excluded: Boolean mask of emails outside the searched folder (unified index),
+            which get a score of -inf so they are never ranked.
 
     Returns:
-        Top N results as list of (email_id, combined_score).
+        Dense array of combined scores indexed by email ID - 1, or None if both rankings are empty.
     """
-    
-    semantic_scores = fill_missing_scores(semantic_rankings, num_emails) if has_semantic else [0.0] * num_emails
-    keyword_scores = fill_missing_scores(keyword_rankings, num_emails) if has_keyword else [0.0] * num_emails
+    has_semantic = len(semantic_rankings) > 0
+    has_keyword = len(keyword_rankings) > 0
+
+    semantic_scores = fill_missing_scores(semantic_rankings, num_emails) if has_semantic else np.zeros(num_emails)
+    keyword_scores = fill_missing_scores(keyword_rankings, num_emails) if has_keyword else np.zeros(num_emails)
 
     if has_semantic:
         semantic_scores = min_max_normalize(semantic_scores)
     if has_keyword:
-        keyword_scores = min_max_normalize(keyword_scores)
+        # Keyword candidates are cut off at the retrieval depth. Emails that were not
+        # retrieved keep the no-match score 0, and scaling from 0 rather than from the
+        # lowest retrieved score keeps the fused scores independent of that depth.
+        keyword_scores = min_max_normalize(keyword_scores, min_score=0.0)
 
     if has_semantic and has_keyword:
         print(f"➕ Combining rankings...")
@@ -93,19 +105,65 @@ def combine_rankings(
     elif has_keyword:
         semantic_weight = 0.0
     else:
-        return []
+        return None
 
     keyword_weight = 1.0 - semantic_weight
-    combined_scores = [
-        (i + 1, semantic_weight * s + keyword_weight * k)
-        for i, (s, k) in enumerate(zip(semantic_scores, keyword_scores))
-    ]
-
-    return (
-        sorted(combined_scores, key=lambda x: x[1], reverse=True)
-        if is_test else
-        heapq.nlargest(num_results_wanted, combined_scores, key=lambda x: x[1])
-    )
+    combined = semantic_weight * semantic_scores + keyword_weight * keyword_scores
+    if excluded is not None:
+        combined[excluded[:num_emails]] = -np.inf
+    return combined
+
+def rank_scores(scores: np.ndarray, num_results: int = -1) -> np.ndarray:
+    """
+    Positions of the highest scores, best first, ties broken by position.
+
+    Only the top num_results are selected (argpartition) and sorted; -1 sorts all.
+    Positions scored -inf (excluded from the search) are never returned.
+    """
+    num_ranked = int(np.count_nonzero(scores > -np.inf))
+    if num_results < 0 or num_results >= num_ranked:
+        return np.argsort(-scores, kind="stable")[:num_ranked]
+    if num_results == 0:
+        return np.empty(0, dtype="int64")
+    threshold = -np.partition(-scores, num_results - 1)[num_results - 1]
+    # Every email tied with the k-th score is a candidate, so ties resolve by Id as a full sort would.
+    candidates = np.flatnonzero(scores >= threshold)
+    order = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return order[:num_results]
+
+def to_rankings(scores: np.ndarray, positions: np.ndarray) -> List[Tuple[int, float]]:
+    """(email_id, score) pairs of the given row positions."""
+    return [(int(p) + 1, float(scores[p])) for p in positions]
+
+def combine_rankings(
+    semantic_rankings: List[Tuple[int, float]],
+    keyword_rankings: List[Tuple[int, float]],
+    query_len: int,
+    num_emails: int,
+    num_results_wanted: int,
+    top_n: int = 10,
+    is_test=False,
+    excluded: Optional[np.ndarray] = None,
+) -> List[Tuple[int, float]]:
+    """
+    Combines semantic and keyword rankings using normalized weighted sum.
+
+    Args:
+        semantic_rankings: Semantic search results [(email_id, score)].
+        keyword_rankings: Keyword search results [(email_id, score)].
+        query_len: Number of words in the query.
+        num_emails: Total number of emails.
+        num_results_wanted: Number of results to return.
+        is_test: If True, return all results sorted by score. If False, return top N results.
+        excluded: Boolean mask of emails outside the searched folder (see combine_scores).
+
+    Returns:
+        Top N results as list of (email_id, combined_score).
+    """
+    scores = combine_scores(semantic_rankings, keyword_rankings, query_len, num_emails, excluded)
+    if scores is None:
+        return []
+    return to_rankings(scores, rank_scores(scores, -1 if is_test else num_results_wanted))
 
 def get_top_emails_by_id(top_results: List[Tuple[int, float]], df) -> List[dict]:
     """
@@ -1,14 +1,38 @@
-﻿from src.utils import load_processed_emails, load_faiss_index
+﻿from src.utils import load_processed_emails, load_unified_emails, load_faiss_index
 from typing import List, Dict
 from elasticsearch import Elasticsearch
-from src.semantic_search.semantic_search import semantic_search
-from src.hybrid_search.hybrid_rankings import combine_rankings, get_top_emails_by_id
+from src.semantic_search.semantic_search import semantic_search, get_query_date_range
+from src.hybrid_search.hybrid_rankings import combine_rankings, combine_scores, rank_scores, to_rankings, get_top_emails_by_id
 from src.keyword_search.build_es_query import get_persons_to_aliases_dict
-from src.keyword_search.es_search import create_emails_index, clean_date_formatting_for_matching, get_keyword_rankings
+from src.keyword_search.es_search import create_emails_index_if_stale, clean_date_formatting_for_matching, get_keyword_rankings
+from src.artifacts.manifest import ArtifactManifest
+from src.hybrid_search.result_cache import ResultCache, make_cache_key, compute_index_version
+from src.hybrid_search.result_cursors import CursorStore
 from src.query_expansion.rrf_fusion import reciprocal_rank_fusion
 from src.evaluation.metrics import weighted_kendalls_w, weighted_pairwise_mse
 from src.semantic_search.semantic_search import init_semantic_components 
-import heapq
+from src.preprocessing.near_duplicates import load_near_duplicate_map, get_duplicate_rows, expand_duplicates
+from src.semantic_search.unified_index import UnifiedIndex
+from src.config import (
+    QUERY_EXPANSION, DEDUP_NEAR_DUPLICATES, EXPAND_NEAR_DUPLICATES, UNIFIED_INDEX, UNIFIED_ES_INDEX, ADAPTIVE_QUERY_PLANNING,
+    HYBRID_CANDIDATE_RESCORING, SPECULATIVE_QUERY_PROCESSING
+)
+from src.resources.threads import get_thread_budget, make_worker_initializer
+from src.resources.search_settings import get_search_settings
+from src.ingestion.live_ingest import EmailStore, LiveIndex, LiveIngestor
+from src.corpora.registry import CorpusRegistry, DEFAULT_CORPUS
+from src.hybrid_search.query_planner import QueryPlanner
+from src.hybrid_search.candidate_rescoring import get_semantic_candidates, fuse_candidates
+from src.hybrid_search.speculation import QuerySpeculator, SpeculativeQuery
+from src.embeddings.knn_graph import load_knn_graph
+from src.semantic_search.similar_emails import find_similar_emails
+import src.semantic_search.semantic_search as semantic_components
+import os
+import time
+import pandas as pd
+import numpy as np
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 def safe_input(prompt: str) -> str:
     val = input(prompt)
@@ -17,49 +41,223 @@ def safe_input(prompt: str) -> str:
         exit(0)
     return val
 
-def hybrid_search(query: str, index, df, es_client, persons_to_aliases_dict, folder: str, search_mode: str):
-    num_results_each_search = len(df)
+def get_excluded_rows(index):
+    """Mask of the rows a unified-index folder view filters out (None for a folder's own index)."""
+    return getattr(index, "excluded_rows", None)
+
+def run_semantic_leg(query: str, index, df, num_variants: int = None, query_embeddings: np.ndarray = None):
+    semantic_variants = semantic_search(query, index, df, date_range=get_query_date_range(query),
+                                        num_variants=num_variants, query_embeddings=query_embeddings)
+    semantic_search_results = reciprocal_rank_fusion(semantic_variants, k=get_search_settings().rrf_k)
+    return sorted(semantic_search_results, key=lambda x: x[0])
+
+def run_keyword_leg(query: str, df, es_client, persons_to_aliases_dict, folder: str, num_results_wanted: int = -1):
+    return get_keyword_rankings(
+        es_client, query, folder, num_results_wanted, persons_to_aliases_dict
+    )
+
+def hybrid_search(query: str, index, df, es_client, persons_to_aliases_dict, folder: str, search_mode: str,
+                  num_results_wanted: int = -1):
     semantic_search_results = []
     keyword_search_results = []
 
     if search_mode in {"hybrid", "semantic"}:
-        semantic_variants = semantic_search(query, index, df)
-        semantic_search_results = reciprocal_rank_fusion(semantic_variants) 
-        semantic_search_results = sorted(semantic_search_results, key=lambda x: x[0])
+        semantic_search_results = run_semantic_leg(query, index, df)
 
     if search_mode in {"hybrid", "keyword"}:
-        keyword_search_results = get_keyword_rankings(
-            es_client, query, folder, num_results_each_search, persons_to_aliases_dict
-        )
+        keyword_search_results = run_keyword_leg(query, df, es_client, persons_to_aliases_dict, folder, num_results_wanted)
 
     return semantic_search_results, keyword_search_results
 
-def get_top_emails(rankings, df, query, query_len, num_emails, num_results_wanted, is_test=False):
-    semantic_rankings, keyword_rankings = rankings
-    combined_rankings = combine_rankings(semantic_rankings, keyword_rankings, query_len, num_emails, num_results_wanted, is_test=is_test)
-    top_emails = get_top_emails_by_id(combined_rankings, df)
-    return top_emails
+def uses_candidate_rescoring(search_mode: str) -> bool:
+    return search_mode == "hybrid" and HYBRID_CANDIDATE_RESCORING
+
+def get_fused_scores(query: str, index, df, es_client, persons_to_aliases_dict, folder: str, search_mode: str,
+                     num_results_wanted: int = -1):
+    """
+    Fused score of every email (see combine_scores), or None if no leg returned anything.
+
+    Always fused over the full legs, even with HYBRID_CANDIDATE_RESCORING: candidate
+    rescoring leaves emails outside the candidates unranked, and the evaluation
+    rankings built from these scores must all cover the same emails.
+    """
+    query_len = len(query.strip().split())
+    semantic_rankings, keyword_rankings = hybrid_search(
+        query, index, df, es_client, persons_to_aliases_dict, folder, search_mode, num_results_wanted
+    )
+    return combine_scores(semantic_rankings, keyword_rankings, query_len, len(df), get_excluded_rows(index))
+
+def get_ranking_arrays(query, index, df, es_client, persons_to_aliases_dict, folder, search_mode,
+                       result_cache: ResultCache = None, cache_version: str = None, seed: int = None):
+    """
+    Full ranking of a folder for evaluation, kept as arrays instead of per-email tuples or rows.
+
+    Returns:
+        (ids, scores): every email Id in descending fused-score order, and its score.
+    """
+    key = make_cache_key(query, folder, search_mode, -1, seed)
+    if result_cache is not None:
+        cached = result_cache.get(key, cache_version)
+        if cached is not None:
+            print(f"⚡ Served from result cache (hit rate {result_cache.stats()['hit_rate']:.0%})")
+            return cached
+
+    scores = get_fused_scores(query, index, df, es_client, persons_to_aliases_dict, folder, search_mode)
+    if scores is None:
+        ranking = (np.empty(0, dtype="int64"), np.empty(0, dtype="float64"))
+    else:
+        order = rank_scores(scores)
+        ranking = (order + 1, scores[order])
+    if result_cache is not None:
+        result_cache.put(key, cache_version, ranking)
+    return ranking
+
+def progressive_search(query, index, df, es_client, persons_to_aliases_dict, folder, search_mode, num_results_wanted,
+                       result_cache: ResultCache = None, cache_version: str = None, seed: int = None,
+                       planner: QueryPlanner = None, speculation: SpeculativeQuery = None):
+    """
+    Yield result sets as they become available instead of waiting for the slowest leg.
+
+    In hybrid mode the semantic leg runs on a background thread while the keyword
+    leg runs, so a provisional keyword-only top-k is yielded at Elasticsearch speed,
+    followed by the fused ranking once the semantic leg finishes.
+
+    With a planner, the stages actually run (mode and paraphrase count) follow its
+    plan for the query. Results of a plan degraded by load or the latency budget
+    are not cached; those of a plan shaped by the query alone are.
+
+    With HYBRID_CANDIDATE_RESCORING, the background leg of a hybrid search only
+    retrieves the shallow FAISS candidates, and the final stage scores and fuses
+    them together with the keyword candidates (see fuse_candidates).
+
+    With a speculation (see src.hybrid_search.speculation), the query's parse and
+    embeddings computed while the prompts were answered are used when they match.
+
+    Yields:
+        Dicts with "stage" ('cache', 'keyword' or 'final'), "is_final" and
+        "rankings" (list of (email_id, score)). The 'final' stage also has "scores",
+        the fused score of every email (None if no leg returned anything). Final
+        result sets have "plan", the QueryPlan followed (None without a planner).
+    """
+    key = make_cache_key(query, folder, search_mode, num_results_wanted, seed)
+    if result_cache is not None:
+        cached = result_cache.get(key, cache_version)
+        if cached is not None:
+            plan = planner.plan(query, search_mode, is_cached=True) if planner is not None else None
+            if speculation is not None:
+                speculation.cancel_embeddings()
+            yield {"stage": "cache", "is_final": True, "rankings": cached, "plan": plan}
+            return
+
+    plan, num_variants = None, None
+    if planner is not None:
+        plan = planner.plan(query, search_mode)
+        search_mode, num_variants = plan.search_mode, plan.num_variants
+        if plan.explanation:
+            print(f"🧭 Query plan {plan.label}: {plan.explanation}")
+        planner.begin()
+    if speculation is not None and search_mode == "keyword":
+        speculation.cancel_embeddings()
 
-def get_best_emails_across_queries(ranked_emails):
-    inverted = [
-        [(-float(email["score"]), str(email["Id"]), email) for email in lst]
-        for lst in ranked_emails
-    ]
+    def run_timed(leg, *args):
+        start = time.perf_counter()
+        result = leg(*args)
+        return result, (time.perf_counter() - start) * 1000
 
-    merged = heapq.merge(*inverted)
+    def run_semantic_timed(leg, *args):
+        query_embeddings = speculation.get_query_embeddings(num_variants) if speculation is not None else None
+        result, elapsed_ms = run_timed(lambda *leg_args: leg(*leg_args, query_embeddings=query_embeddings), *args)
+        # Without the model work, the leg's latency says nothing about the semantic leg's cost.
+        return result, None if query_embeddings is not None else elapsed_ms
+
+    query_len = len(query.strip().split())
+    budget = get_thread_budget()
+    initializer = make_worker_initializer(budget.faiss_threads)
+    semantic_ms = keyword_ms = None
+    try:
+        with ThreadPoolExecutor(max_workers=1, initializer=initializer) as pool:
+            semantic_future = None
+            rescoring = uses_candidate_rescoring(search_mode)
+            if rescoring:
+                semantic_future = pool.submit(run_semantic_timed, get_semantic_candidates, query, index, df, num_variants)
+            elif search_mode in {"hybrid", "semantic"}:
+                semantic_future = pool.submit(run_semantic_timed, run_semantic_leg, query, index, df, num_variants)
+
+            keyword_rankings = []
+            if search_mode in {"hybrid", "keyword"}:
+                if speculation is not None:
+                    speculation.wait_for_parse()
+                keyword_rankings, keyword_ms = run_timed(
+                    run_keyword_leg, query, df, es_client, persons_to_aliases_dict, folder, num_results_wanted
+                )
+                if semantic_future is not None:
+                    provisional = combine_rankings([], keyword_rankings, query_len, len(df), num_results_wanted,
+                                                   excluded=get_excluded_rows(index))
+                    yield {"stage": "keyword", "is_final": False, "rankings": provisional}
+
+            semantic_rankings = []
+            if semantic_future is not None:
+                semantic_rankings, semantic_ms = semantic_future.result()
+    finally:
+        if planner is not None:
+            planner.end(plan, semantic_ms, keyword_ms)
+
+    if rescoring:
+        query_embeddings, semantic_positions = semantic_rankings
+        scores = fuse_candidates(query_embeddings, semantic_positions, keyword_rankings, index, query_len, len(df),
+                                 get_excluded_rows(index))
+    else:
+        scores = combine_scores(semantic_rankings, keyword_rankings, query_len, len(df), get_excluded_rows(index))
+    combined_rankings = [] if scores is None else to_rankings(scores, rank_scores(scores, num_results_wanted))
+    if result_cache is not None and not (plan is not None and plan.is_degraded):
+        result_cache.put(key, cache_version, combined_rankings)
+    yield {"stage": "final", "is_final": True, "rankings": combined_rankings, "scores": scores, "plan": plan}
+
+async def progressive_search_async(*args, **kwargs):
+    """Async iterator over progressive_search's result sets, for async servers."""
+    loop = asyncio.get_running_loop()
+    stages = progressive_search(*args, **kwargs)
+    while True:
+        result = await loop.run_in_executor(None, next, stages, None)
+        if result is None:
+            return
+        yield result
+
+def print_provisional_results(top_emails):
+    print("⏳ Provisional keyword results (refining with semantic search):")
+    for i, email in enumerate(top_emails):
+        subject = email.get("ExtractedSubject") or "No Subject"
+        print(f"  {i+1}. [{email['Id']}] {subject[:80]}")
+
+def get_best_emails_across_queries(rankings, k: int = 4):
+    """
+    The k best distinct emails over several rankings, by score (ties by Id as a string).
+
+    Args:
+        rankings: (ids, scores) arrays of each query, in rank order.
+
+    Returns:
+        (ids, scores) arrays of the selected emails.
+    """
+    # A ranking's emails are distinct, so the k best distinct emails overall are
+    # among the first k of some ranking.
+    candidates = sorted(
+        (-float(score), str(email_id), int(email_id))
+        for ids, scores in rankings
+        for email_id, score in zip(ids[:k], scores[:k])
+    )
 
     seen_emails = set()
-    best_emails = []
-
-    k = 4
-    for _, id_str, item in merged:
-        if id_str not in seen_emails:
-            seen_emails.add(id_str)
-            best_emails.append(item)
-            if len(best_emails) == k:
+    best_ids, best_scores = [], []
+    for neg_score, _, email_id in candidates:
+        if email_id not in seen_emails:
+            seen_emails.add(email_id)
+            best_ids.append(email_id)
+            best_scores.append(-neg_score)
+            if len(best_ids) == k:
                 break
 
-    return best_emails
+    return np.asarray(best_ids, dtype="int64"), np.asarray(best_scores, dtype="float64")
 
 def send_top_emails_across_queries_to_file(top_emails, queries, fname, folder, query_set_count):
     with open(fname, "a") as outfile:
@@ -75,9 +273,9 @@ def send_top_emails_across_queries_to_file(top_emails, queries, fname, folder, q
             outfile.write("Result {}\n".format(i+1))
             outfile.write("______________________\n")
             outfile.write("Email ID: {}\n".format(email["Id"]))
-            if folder == "inbox":
+            if folder in {"inbox", "all"}:
                 outfile.write("From: {}\n".format(email["ExtractedFrom"]))
-            else:
+            if folder in {"sent", "all"}:
                 outfile.write("To: {}\n".format(email["ExtractedTo"]))
             outfile.write("CC'd: {}\n".format(email["ExtractedCc"]))
             outfile.write("Date: {}\n".format(email["ExtractedDateSent"]))
@@ -96,9 +294,11 @@ def send_top_emails_to_file(top_emails, query, fname, folder, query_count):
             outfile.write("Result {}\n".format(i+1, score))
             outfile.write("______________________\n")
             outfile.write("Email ID: {}\n".format(email["Id"]))
-            if folder == "inbox":
+            if "duplicate_of" in email:
+                outfile.write("Near-duplicate of Email ID {} (processed Id {})\n".format(email["duplicate_of"], email["SourceId"]))
+            if folder in {"inbox", "all"}:
                 outfile.write("From: {}\n".format(email["ExtractedFrom"]))
-            else:
+            if folder in {"sent", "all"}:
                 outfile.write("To: {}\n".format(email["ExtractedTo"]))
             outfile.write("CC'd: {}\n".format(email["ExtractedCc"]))
             outfile.write("Date: {}\n".format(email["ExtractedDateSent"]))
@@ -106,19 +306,43 @@ def send_top_emails_to_file(top_emails, query, fname, folder, query_count):
             outfile.write("Body Preview: {}\n\n".format(body[:1000]))
     print(f"✅ Added output to {fname}")
 
-def run_search_interface(is_test=False, seed: int=None):
-    print("🛠️ Initializing semantic components...")
-    init_semantic_components(seed=seed)
-    print("🔄 Loading emails and FAISS index...")
-    df = load_processed_emails()
-    inbox_index = load_faiss_index("inbox")
-    sent_index = load_faiss_index("sent")
-
+def split_folders(df):
+    """
+    Split the processed emails into inbox and sent DataFrames whose Ids are their
+    1-based row positions, matching the row order of the FAISS indexes.
+    The processed Id is kept as 'SourceId'.
+    """
     df = clean_date_formatting_for_matching(df)
+    df["SourceId"] = df["Id"]
     inbox_df = df[df["folder"] == "inbox"].reset_index(drop=True)
     sent_df = df[df["folder"] == "sent"].reset_index(drop=True)
     inbox_df["Id"] = inbox_df.index + 1
     sent_df["Id"] = sent_df.index + 1
+    return inbox_df, sent_df
+
+def prepare_unified_emails(df):
+    """
+    Give the unified corpus Ids that are its 1-based row positions, matching the
+    unified FAISS index. The processed Id is kept as 'SourceId'.
+    """
+    df = clean_date_formatting_for_matching(df)
+    df["SourceId"] = df["Id"]
+    df["Id"] = df.index + 1
+    return df
+
+def run_search_interface(is_test=False, seed: int=None, expansion: str = QUERY_EXPANSION):
+    print("🛠️ Initializing semantic components...")
+    init_semantic_components(seed=seed, expansion=expansion)
+    print("🔄 Loading emails and FAISS index...")
+    if UNIFIED_INDEX:
+        # Every folder (and "all") shares the unified corpus; views filter it by folder.
+        unified_df = prepare_unified_emails(load_unified_emails())
+        indexes = UnifiedIndex.load().views()
+        dfs = {folder: unified_df for folder in indexes}
+    else:
+        inbox_df, sent_df = split_folders(load_processed_emails())
+        dfs = {"inbox": inbox_df, "sent": sent_df}
+        indexes = {folder: load_faiss_index(folder, num_emails=len(dfs[folder])) for folder in dfs}
 
     persons_to_aliases_dict = get_persons_to_aliases_dict()
     es_client = Elasticsearch("http://localhost:9200")
@@ -127,8 +351,35 @@ def run_search_interface(is_test=False, seed: int=None):
         print("❌ Failed to connect to Elasticsearch.")
         return
 
-    create_emails_index(es_client, inbox_df, "inbox")
-    create_emails_index(es_client, sent_df, "sent")
+    manifest = ArtifactManifest()
+    if UNIFIED_INDEX:
+        create_emails_index_if_stale(es_client, unified_df, UNIFIED_ES_INDEX, manifest)
+        cache_versions = {folder: compute_index_version(manifest, UNIFIED_ES_INDEX) for folder in dfs}
+    else:
+        for folder, folder_df in dfs.items():
+            create_emails_index_if_stale(es_client, folder_df, folder, manifest)
+        cache_versions = {folder: compute_index_version(manifest, folder) for folder in dfs}
+
+    result_cache = ResultCache()
+
+    ingestor = None
+    if not is_test:
+        try:
+            indexes = {folder: LiveIndex(index) for folder, index in indexes.items()}
+        except ValueError as e:
+            print(f"⚠️ {e}; live ingestion is disabled.")
+    store = EmailStore(dfs, indexes, cache_versions)
+    if all(isinstance(index, LiveIndex) for index in indexes.values()):
+        ingestor = LiveIngestor(store, es_client, semantic_components.embedder)
+
+    duplicate_rows = {}
+    if DEDUP_NEAR_DUPLICATES and EXPAND_NEAR_DUPLICATES and not UNIFIED_INDEX:
+        full_df = clean_date_formatting_for_matching(load_processed_emails(canonical_only=False))
+        near_duplicate_map = load_near_duplicate_map()
+        duplicate_rows = {
+            folder: get_duplicate_rows(near_duplicate_map, full_df[full_df["folder"] == folder], folder)
+            for folder in ["inbox", "sent"]
+        }
 
     fname = "top_emails.txt"
     fname_test = "top_across_queries.txt"
@@ -136,10 +387,67 @@ def run_search_interface(is_test=False, seed: int=None):
         open(fname_test, "w").close()
     else:
         open(fname, "w").close()
-    query_count = 1
+
+    cursor_store = CursorStore()
+    planner = QueryPlanner() if ADAPTIVE_QUERY_PLANNING else None
 
     print("Now, you can try some queries.")
     print("Enter '*quit' at any prompt to exit.")
+    if not is_test:
+        print("Enter '*more' as the query for the next page of the last search.")
+        print("Enter '*similar <email Id>' as the query for the emails most similar to one in the last search's folder.")
+        if ingestor is not None:
+            print("Enter '*ingest <emails.csv|emails.parquet>' as the query to add emails (with a 'folder' column) while searching.")
+
+    # The default corpus is pinned, so live ingestion always has its store; other
+    # corpora are loaded on demand and share the semantic components loaded above.
+    registry = CorpusRegistry(es_client, manifest)
+    registry.add(DEFAULT_CORPUS, store)
+    if len(registry.names()) > 1 or planner is not None:
+        print("Enter '*corpora' as the query to show per-corpus metrics and query plans.")
+
+    speculator = None
+    if SPECULATIVE_QUERY_PROCESSING and not is_test:
+        speculator = QuerySpeculator(persons_to_aliases_dict, planner)
+
+    try:
+        search_loop(is_test, seed, registry, es_client, persons_to_aliases_dict, result_cache, cursor_store, ingestor,
+                    duplicate_rows, fname, fname_test, planner, speculator)
+    finally:
+        # Quitting at a prompt must not wait for speculative work on the last query.
+        if speculator is not None:
+            speculator.close()
+        if ingestor is not None:
+            ingestor.close()
+
+def choose_corpus_and_folder(registry: CorpusRegistry):
+    """
+    Prompt for a corpus (when there are several) and one of its folders.
+
+    Returns:
+        (loaded corpus, folder)
+    """
+    corpus_name = DEFAULT_CORPUS
+    names = registry.names()
+    if len(names) > 1:
+        corpus_name = safe_input(f"Corpus ({'/'.join(names)}): ").lower()
+        while corpus_name not in names:
+            corpus_name = safe_input(f"Please enter valid corpus ({'/'.join(names)}): ").lower()
+    loaded = registry.get(corpus_name)
+
+    folders = list(loaded.store.dfs)
+    folder = safe_input(f"Folder ({'/'.join(folders)}): ").lower()
+    while folder not in folders:
+        folder = safe_input(f"Please enter valid folder ({'/'.join(folders)}): ").lower()
+    return loaded, folder
+
+def search_loop(is_test, seed, registry: CorpusRegistry, es_client, persons_to_aliases_dict, result_cache, cursor_store,
+                ingestor, duplicate_rows, fname, fname_test, planner: QueryPlanner = None,
+                speculator: QuerySpeculator = None):
+    query_count = 1
+    last_search = None
+    # kNN graph per (corpus, folder), None where none was built.
+    knn_graphs = {}
 
     while True:
         if is_test:
@@ -147,61 +455,148 @@ def run_search_interface(is_test=False, seed: int=None):
             query2 = safe_input("Query 2: ")
             query3 = safe_input("Query 3: ")
             query4 = safe_input("Query 4: ")
-            folder = safe_input("Folder (inbox/sent): ").lower()
+            loaded, folder = choose_corpus_and_folder(registry)
             search_mode = safe_input("Search mode (hybrid / semantic / keyword): ").lower()
             while search_mode not in {"hybrid", "semantic", "keyword"}:
                 search_mode = safe_input("Please enter valid mode (hybrid / semantic / keyword): ").lower()
-            df_used = inbox_df if folder == "inbox" else sent_df
-            index = inbox_index if folder == "inbox" else sent_index
-            num_emails = len(df_used)
-
-            rankings1 = hybrid_search(query1, index, df_used, es_client, persons_to_aliases_dict, folder, search_mode)
-            rankings2 = hybrid_search(query2, index, df_used, es_client, persons_to_aliases_dict, folder, search_mode)
-            rankings3 = hybrid_search(query3, index, df_used, es_client, persons_to_aliases_dict, folder, search_mode)
-            rankings4 = hybrid_search(query4, index, df_used, es_client, persons_to_aliases_dict, folder, search_mode)
-            
-            top_emails1 = get_top_emails(rankings1, df_used, query1, len(query1.strip().split()), num_emails, -1, is_test)
-            top_emails1_info  = [{"Id": int(email["Id"]), "score": email["score"]} for email in top_emails1]
-
-            top_emails2 = get_top_emails(rankings2, df_used, query2, len(query2.strip().split()), num_emails, -1, is_test)
-            top_emails2_info  = [{"Id": int(email["Id"]), "score": email["score"]} for email in top_emails2]
-
-            top_emails3 = get_top_emails(rankings3, df_used, query3, len(query3.strip().split()), num_emails, -1, is_test)
-            top_emails3_info  = [{"Id": int(email["Id"]), "score": email["score"]} for email in top_emails3]
-
-            top_emails4 = get_top_emails(rankings4, df_used, query4, len(query4.strip().split()), num_emails, -1, is_test)
-            top_emails4_info  = [{"Id": int(email["Id"]), "score": email["score"]} for email in top_emails4]
+            store = loaded.store
+            df_used, index = store.get(folder)
 
-            emails = [top_emails1_info, top_emails2_info, top_emails3_info, top_emails4_info]
-            
             queries = [query1, query2, query3, query4]
-            best_emails_across = get_best_emails_across_queries([top_emails1, top_emails2, top_emails3, top_emails4])
+            start = time.perf_counter()
+            rankings = [
+                get_ranking_arrays(
+                    query, index, df_used, es_client, persons_to_aliases_dict, loaded.corpus.es_index(folder), search_mode,
+                    result_cache, store.version(folder), seed
+                )
+                for query in queries
+            ]
+            registry.record_search(loaded.corpus.name, (time.perf_counter() - start) * 1000 / len(queries))
+
+            # Only the emails written to the file are materialized as rows.
+            best_ids, best_scores = get_best_emails_across_queries(rankings)
+            best_emails_across = get_top_emails_by_id(list(zip(best_ids.tolist(), best_scores.tolist())), df_used)
             send_top_emails_across_queries_to_file(best_emails_across, queries, fname_test, folder, query_count)
-            wkw = weighted_kendalls_w(emails)
-            wmse = weighted_pairwise_mse(emails)
+            wkw = weighted_kendalls_w(rankings)
+            wmse = weighted_pairwise_mse(rankings)
             print(f"Weighted Pairwise MSE (0 = high agreement): {wmse:.3f}")
             print(f"Weighted Kendall's W (1 = high agreement): {wkw:.3f}")
         else: 
             query = safe_input("Query: ")
 
+            if query.strip() == "*more":
+                cursor = None
+                if last_search is not None:
+                    cursor = cursor_store.get(last_search["cursor_key"], last_search["store"].version(last_search["folder"]))
+                if cursor is None:
+                    print("⌛ No recent search to page through; please run the query again.")
+                    continue
+                if not cursor.has_more():
+                    print("No more results.")
+                    continue
+                df_used, _ = last_search["store"].get(last_search["folder"])
+                top_emails = get_top_emails_by_id(cursor.next_page(last_search["page_size"]), df_used)
+                if duplicate_rows and last_search["corpus"] == DEFAULT_CORPUS:
+                    top_emails = expand_duplicates(top_emails, duplicate_rows[last_search["folder"]])
+                send_top_emails_to_file(top_emails, last_search["query"] + " (more)", fname, last_search["folder"], query_count)
+                query_count += 1
+                continue
+
+            if query.strip().startswith("*similar"):
+                email_id = query.strip()[len("*similar"):].strip()
+                if not email_id.isdigit():
+                    print("Usage: *similar <email Id>")
+                    continue
+                if last_search is not None:
+                    loaded, folder = registry.get(last_search["corpus"]), last_search["folder"]
+                    num_results_wanted = last_search["page_size"]
+                else:
+                    num_results_wanted = safe_input("# of results: ")
+                    while not num_results_wanted.isdigit():
+                        num_results_wanted = safe_input("Please enter a positive integer for # of results: ")
+                    num_results_wanted = int(num_results_wanted)
+                    loaded, folder = choose_corpus_and_folder(registry)
+                df_used, index = loaded.store.get(folder)
+                graph_key = (loaded.corpus.name, folder)
+                if graph_key not in knn_graphs:
+                    # The unified index has a single graph, shared by its folder views.
+                    graph_name = "all" if UNIFIED_INDEX and loaded.corpus.is_default else folder
+                    knn_graphs[graph_key] = load_knn_graph(graph_name, loaded.corpus.embeddings_dir, index.ntotal)
+
+                start = time.perf_counter()
+                try:
+                    similar = find_similar_emails(int(email_id), index, df_used, num_results_wanted, knn_graphs[graph_key])
+                except ValueError as e:
+                    print(f"❌ {e}")
+                    continue
+                registry.record_search(loaded.corpus.name, (time.perf_counter() - start) * 1000, "similar")
+                top_emails = get_top_emails_by_id(similar, df_used)
+                if duplicate_rows and loaded.corpus.is_default:
+                    top_emails = expand_duplicates(top_emails, duplicate_rows[folder])
+                send_top_emails_to_file(top_emails, f"similar to email {email_id}", fname, folder, query_count)
+                query_count += 1
+                continue
+
+            if query.strip().startswith("*ingest"):
+                path = query.strip()[len("*ingest"):].strip()
+                if ingestor is None or not os.path.exists(path):
+                    print("Live ingestion is disabled." if ingestor is None else f"File not found: {path}")
+                    continue
+                new_emails = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+                ingestor.submit(new_emails)
+                print(f"📨 Queued {len(new_emails)} emails for ingestion into the {DEFAULT_CORPUS} corpus.")
+                continue
+
+            if query.strip() == "*corpora":
+                for name, stats in registry.stats().items():
+                    print(f"{name}: " + ", ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                                                   for key, value in stats.items()))
+                continue
+
+            # Parse and embed the query while the remaining prompts are answered.
+            speculation = speculator.start(query) if speculator is not None else None
+
             num_results_wanted = safe_input("# of results: ")
             while not num_results_wanted.isdigit():
                 num_results_wanted = safe_input("Please enter a positive integer for # of results: ")
             num_results_wanted = int(num_results_wanted)
 
-            folder = safe_input("Folder (inbox/sent): ").lower()
-            while folder not in {"inbox", "sent"}:
-                folder = safe_input("Please enter valid folder (inbox/sent): ").lower()
+            loaded, folder = choose_corpus_and_folder(registry)
 
             search_mode = safe_input("Search mode (hybrid / semantic / keyword): ").lower()
             while search_mode not in {"hybrid", "semantic", "keyword"}:
                 search_mode = safe_input("Please enter valid mode (hybrid / semantic / keyword): ").lower()
 
-            df_used = inbox_df if folder == "inbox" else sent_df
-            index = inbox_index if folder == "inbox" else sent_index
-            num_emails = len(df_used)
+            store = loaded.store
+            df_used, index = store.get(folder)
+            # The default corpus's ES target is the folder itself, so its cache keys are unchanged.
+            search_folder = loaded.corpus.es_index(folder)
 
-            rankings = hybrid_search(query, index, df_used, es_client, persons_to_aliases_dict, folder, search_mode)
-            top_emails = get_top_emails(rankings, df_used, query, len(query.strip().split()), num_emails, num_results_wanted, is_test)
-            send_top_emails_to_file(top_emails, query, fname, folder, query_count)
+            start = time.perf_counter()
+            for result_set in progressive_search(
+                query, index, df_used, es_client, persons_to_aliases_dict, search_folder, search_mode, num_results_wanted,
+                result_cache, store.version(folder), seed, planner, speculation
+            ):
+                top_emails = get_top_emails_by_id(result_set["rankings"], df_used)
+                if not result_set["is_final"]:
+                    print_provisional_results(top_emails)
+                    continue
+                plan = result_set["plan"]
+                registry.record_search(loaded.corpus.name, (time.perf_counter() - start) * 1000,
+                                       plan.label if plan is not None else None)
+                cursor_key = make_cache_key(query, search_folder, search_mode, -1, seed)
+                if result_set["stage"] == "cache":
+                    print("⚡ Served from result cache")
+                    cursor = cursor_store.get(cursor_key, store.version(folder))
+                    if cursor is not None:
+                        cursor.offset = num_results_wanted
+                elif result_set["scores"] is not None:
+                    cursor_store.open(cursor_key, result_set["scores"], store.version(folder), num_results_wanted)
+                last_search = {
+                    "cursor_key": cursor_key, "corpus": loaded.corpus.name, "store": store, "folder": folder,
+                    "query": query, "page_size": max(num_results_wanted, 1),
+                }
+                if duplicate_rows and loaded.corpus.is_default:
+                    top_emails = expand_duplicates(top_emails, duplicate_rows[folder])
+                send_top_emails_to_file(top_emails, query, fname, folder, query_count)
         query_count += 1
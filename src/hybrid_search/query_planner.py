@@ -0,0 +1,195 @@
+"""
+Per-query plans deciding which search stages run within a latency budget.
+
+The planner looks at the query (its length, whether it has sender or date cues,
+how much text is left for paraphrasing), whether its results are cached, how
+many searches are in flight, and the stage latencies measured so far. From
+these it picks the search mode and number of paraphrases, so that peak load
+degrades result quality gradually instead of queueing searches.
+"""
+import threading
+from typing import Dict, List
+from src.keyword_search.build_es_query import analyze_query, normalize_query
+from src.resources.search_settings import get_search_settings
+import src.semantic_search.semantic_search as semantic_components
+from src.config import QUERY_LATENCY_BUDGET_MS, PLANNER_MAX_IN_FLIGHT, PLANNER_SHORT_QUERY_WORDS
+
+
+class QueryFeatures:
+    def __init__(self, num_words: int, num_text_words: int, has_sender: bool, has_date: bool, is_cached: bool):
+        """
+        Args:
+            num_words: Words in the query (the length used by get_semantic_weight).
+            num_text_words: Words left once parse_query removed stop words and cues.
+            has_sender: The query names a sender ("from ...").
+            has_date: The query has a date cue.
+            is_cached: Its results are in the result cache.
+        """
+        self.num_words = num_words
+        self.num_text_words = num_text_words
+        self.has_sender = has_sender
+        self.has_date = has_date
+        self.is_cached = is_cached
+
+    @property
+    def is_keyword_like(self) -> bool:
+        """Too little text for paraphrases to add anything beyond the query itself."""
+        return self.num_text_words <= PLANNER_SHORT_QUERY_WORDS
+
+
+def get_query_features(query: str, is_cached: bool = False) -> QueryFeatures:
+    # analyze_query is cached, so the keyword leg reuses this parse.
+    sender_name, dates, relevant_text = analyze_query(normalize_query(query))
+    return QueryFeatures(
+        num_words=len(query.strip().split()),
+        num_text_words=len(relevant_text.split()),
+        has_sender=sender_name is not None,
+        has_date=dates is not None,
+        is_cached=is_cached,
+    )
+
+
+class QueryPlan:
+    """
+    Attributes:
+        search_mode: 'hybrid', 'semantic', 'keyword', or 'cache' when the results are cached.
+        num_variants: Paraphrases for the semantic leg (0: the query alone).
+        requested_mode: Mode the user asked for.
+        reasons: Why load or the latency budget cut the plan short of the full pipeline.
+        notes: Decisions that follow from the query alone (e.g. no paraphrases for a
+            keyword-like query), so they are the same for every search of it.
+    """
+
+    def __init__(self, search_mode: str, num_variants: int, requested_mode: str, reasons: List[str] = None,
+                 notes: List[str] = None):
+        self.search_mode = search_mode
+        self.num_variants = num_variants
+        self.requested_mode = requested_mode
+        self.reasons = reasons or []
+        self.notes = notes or []
+
+    @property
+    def is_degraded(self) -> bool:
+        """
+        Results depend on the load or budget at search time (so they are not cached).
+        Notes alone do not degrade a plan: the query always gets the same results.
+        """
+        return bool(self.reasons)
+
+    @property
+    def explanation(self) -> str:
+        return "; ".join(self.notes + self.reasons)
+
+    @property
+    def label(self) -> str:
+        if self.search_mode in {"cache", "keyword"}:
+            return self.search_mode
+        return f"{self.search_mode}:v{self.num_variants}"
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"mode": self.search_mode, "num_variants": self.num_variants, "reasons": self.reasons,
+                "notes": self.notes}
+
+
+class QueryPlanner:
+    """
+    Plans queries from their features, the load and exponentially weighted averages
+    of the measured leg latencies.
+
+    The semantic leg's cost is modeled as proportional to the number of texts it
+    embeds (the query plus its paraphrases, each also generated and searched). The
+    legs of a hybrid search run concurrently, so its latency is the slower leg's.
+    """
+
+    def __init__(self, budget_ms: float = QUERY_LATENCY_BUDGET_MS, max_in_flight: int = PLANNER_MAX_IN_FLIGHT,
+                 smoothing: float = 0.2):
+        """
+        Args:
+            budget_ms: Latency budget of a search.
+            max_in_flight: Concurrent searches above which paraphrases are cut.
+            smoothing: Weight of the newest measurement in the latency averages.
+        """
+        self.budget_ms = budget_ms
+        self.max_in_flight = max_in_flight
+        self.smoothing = smoothing
+        self.semantic_ms_per_text = None
+        self.keyword_ms = None
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def predict_semantic_ms(self, num_variants: int) -> float:
+        if self.semantic_ms_per_text is None:
+            return 0.0
+        return self.semantic_ms_per_text * (1 + num_variants)
+
+    def plan(self, query: str, search_mode: str, is_cached: bool = False, budget_ms: float = None) -> QueryPlan:
+        """
+        Args:
+            query: The query.
+            search_mode: Requested mode.
+            is_cached: Its results are in the result cache.
+            budget_ms: Latency budget of this query (defaults to the planner's).
+        """
+        features = get_query_features(query, is_cached)
+        num_variants = get_search_settings().num_variants
+        if features.is_cached:
+            return QueryPlan("cache", num_variants, search_mode, notes=["cached"])
+        if search_mode == "keyword":
+            return QueryPlan(search_mode, 0, search_mode)
+
+        mode, reasons, notes = search_mode, [], []
+        paraphrasing = semantic_components.expansion_mode == "paraphrase"
+        if not paraphrasing:
+            num_variants = 0
+
+        if paraphrasing and features.is_keyword_like and num_variants > 0:
+            num_variants = 0
+            notes.append("keyword-like query: no paraphrases")
+
+        with self.lock:
+            in_flight = self.in_flight
+        if in_flight >= self.max_in_flight and num_variants > 1:
+            # Fewer paraphrases the further the load is past the limit.
+            num_variants = max(1, num_variants * self.max_in_flight // (in_flight + 1))
+            reasons.append(f"{in_flight} searches in flight: {num_variants} paraphrases")
+
+        budget_ms = budget_ms or self.budget_ms
+        if budget_ms and self.predict_semantic_ms(num_variants) > budget_ms:
+            planned_variants = num_variants
+            while num_variants > 0 and self.predict_semantic_ms(num_variants) > budget_ms:
+                num_variants //= 2
+            if num_variants < planned_variants:
+                reasons.append(f"{budget_ms:.0f} ms budget: {num_variants} paraphrases")
+            if mode == "hybrid" and self.predict_semantic_ms(num_variants) > budget_ms:
+                # Sender and date cues are filters of the keyword leg, so it alone still honors them.
+                mode = "keyword"
+                reasons.append("semantic leg over budget: keyword leg only")
+
+        return QueryPlan(mode, num_variants, search_mode, reasons, notes)
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def end(self, plan: QueryPlan, semantic_ms: float = None, keyword_ms: float = None):
+        """Finish a search, folding its leg latencies (None for legs it skipped) into the averages."""
+        with self.lock:
+            self.in_flight -= 1
+            if semantic_ms is not None:
+                self.semantic_ms_per_text = self._smooth(self.semantic_ms_per_text, semantic_ms / (1 + plan.num_variants))
+            elif plan.search_mode == "keyword" and plan.requested_mode != "keyword" and self.semantic_ms_per_text:
+                # Without new measurements, let the estimate decay so the semantic leg is tried again.
+                self.semantic_ms_per_text *= 1 - self.smoothing
+            if keyword_ms is not None:
+                self.keyword_ms = self._smooth(self.keyword_ms, keyword_ms)
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            return {
+                "in_flight": self.in_flight,
+                "semantic_ms_per_text": self.semantic_ms_per_text,
+                "keyword_ms": self.keyword_ms,
+            }
+
+    def _smooth(self, average: float, value: float) -> float:
+        return value if average is None else (1 - self.smoothing) * average + self.smoothing * value
@@ -0,0 +1,137 @@
+"""
+LRU cache of final search rankings, invalidated when the indexes or corpus change.
+"""
+import json
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+from src.artifacts.manifest import ArtifactManifest
+from src.keyword_search.build_es_query import normalize_query
+from src.config import RESULT_CACHE_MAX_BYTES
+
+RESULT_CACHE_SIZE = 256
+# Approximate size of one cached (Id, score) pair: the tuple, its int and float, and its slot.
+RANKING_PAIR_BYTES = 120
+
+CacheKey = Tuple[str, str, str, int, Optional[int]]
+# A list of (Id, score) or, for full evaluation rankings, an (ids, scores) pair of arrays.
+Rankings = Union[List[Tuple[int, float]], Tuple[np.ndarray, np.ndarray]]
+
+
+def make_cache_key(query: str, folder: str, search_mode: str, num_results_wanted: int, seed: int = None) -> CacheKey:
+    return (normalize_query(query), folder, search_mode, num_results_wanted, seed)
+
+
+def freeze_rankings(rankings: Rankings):
+    """Immutable copy of rankings for the cache."""
+    if isinstance(rankings, tuple):
+        arrays = tuple(np.array(a) for a in rankings)
+        for a in arrays:
+            a.flags.writeable = False
+        return arrays
+    return tuple(rankings)
+
+
+def estimate_nbytes(frozen) -> int:
+    """Approximate memory held by frozen rankings."""
+    if len(frozen) == 2 and isinstance(frozen[0], np.ndarray):
+        return sum(a.nbytes for a in frozen)
+    return len(frozen) * RANKING_PAIR_BYTES
+
+
+def thaw_rankings(frozen) -> Rankings:
+    # Read-only arrays can be shared as they are.
+    if len(frozen) == 2 and isinstance(frozen[0], np.ndarray):
+        return frozen
+    return list(frozen)
+
+
+def compute_index_version(manifest: ArtifactManifest, folder: str) -> str:
+    """
+    Version of everything a folder's results depend on: the processed corpus,
+    the FAISS index and the folder's ES index, as recorded in the artifact manifest.
+
+    Args:
+        folder: Name of the ES index searched for the folder (UNIFIED_ES_INDEX with a unified index).
+    """
+    records = {name: manifest.artifacts.get(name) for name in ["processed", "faiss", f"es_index:{folder}"]}
+    return hashlib.sha256(json.dumps(records, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Size-bounded LRU map from (query, folder, mode, k, seed) to the ranked (Id, score)
+    list, or to (ids, scores) arrays for evaluation rankings.
+
+    Beyond max_entries entries or max_bytes of estimated rankings size, the least
+    recently used entries are evicted. Rankings larger than max_bytes are not cached.
+
+    Each entry remembers the index version it was computed against; looking it up
+    with a different version drops it.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE, max_bytes: int = RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # key -> (index version, frozen rankings, estimated bytes)
+        self.entries: "OrderedDict[CacheKey, Tuple[str, tuple, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: CacheKey, version: str) -> Optional[Rankings]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry_version, rankings, _ = entry
+            if entry_version != version:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return thaw_rankings(rankings)
+
+    def put(self, key: CacheKey, version: str, rankings: Rankings):
+        frozen = freeze_rankings(rankings)
+        nbytes = estimate_nbytes(frozen)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if nbytes > self.max_bytes:
+                return
+            self.entries[key] = (version, frozen, nbytes)
+            self.total_bytes += nbytes
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key: CacheKey):
+        _, _, nbytes = self.entries.pop(key)
+        self.total_bytes -= nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
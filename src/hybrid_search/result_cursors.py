@@ -0,0 +1,125 @@
+"""
+Search-session cursors: the fused scores of a finished search kept for a short
+time, so further pages are cut from them instead of re-running the search.
+"""
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+from src.hybrid_search.hybrid_rankings import rank_scores, to_rankings
+from src.config import CURSOR_TTL_SECONDS, CURSOR_MAX_SESSIONS, CURSOR_MAX_BYTES
+
+
+class ResultCursor:
+    """
+    Fused score array of one search plus the ranked prefix served so far.
+
+    The prefix is extended with rank_scores (argpartition over the scores, then a
+    sort of only the selected candidates), at least doubling it each time, so a
+    page usually is a slice of an already ranked prefix.
+    """
+
+    def __init__(self, scores: np.ndarray, version: str = None, served: int = 0):
+        """
+        Args:
+            scores: Fused score per email, indexed by email ID - 1.
+            version: Index version the scores were computed against.
+            served: Number of results already returned by the search itself.
+        """
+        self.scores = np.asarray(scores)
+        self.version = version
+        self.ranked = np.empty(0, dtype="int64")
+        # Emails scored -inf are outside the searched folder and never served.
+        self.num_ranked = int(np.count_nonzero(self.scores > -np.inf))
+        self.offset = served
+        self.last_access = time.monotonic()
+
+    @property
+    def nbytes(self) -> int:
+        return self.scores.nbytes + self.ranked.nbytes
+
+    def has_more(self) -> bool:
+        return self.offset < self.num_ranked
+
+    def page(self, offset: int, size: int) -> List[Tuple[int, float]]:
+        """(email_id, score) pairs ranked offset .. offset + size - 1."""
+        end = min(offset + size, self.num_ranked)
+        if end > len(self.ranked):
+            self.ranked = rank_scores(self.scores, max(end, 2 * len(self.ranked)))
+        return to_rankings(self.scores, self.ranked[offset:end])
+
+    def next_page(self, size: int) -> List[Tuple[int, float]]:
+        rankings = self.page(self.offset, size)
+        self.offset += len(rankings)
+        return rankings
+
+
+class CursorStore:
+    """
+    Cursors of recent searches, keyed like the result cache.
+
+    Cursors expire CURSOR_TTL_SECONDS after their last use. Beyond max_sessions
+    cursors or max_bytes of score arrays, the least recently used ones are evicted.
+    """
+
+    def __init__(self, ttl_seconds: float = CURSOR_TTL_SECONDS, max_sessions: int = CURSOR_MAX_SESSIONS,
+                 max_bytes: int = CURSOR_MAX_BYTES):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.cursors: "OrderedDict[Hashable, ResultCursor]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.expirations = 0
+        self.evictions = 0
+
+    def total_bytes(self) -> int:
+        return sum(cursor.nbytes for cursor in self.cursors.values())
+
+    def _expire(self, now: float):
+        expired = [key for key, cursor in self.cursors.items() if now - cursor.last_access > self.ttl_seconds]
+        for key in expired:
+            del self.cursors[key]
+        self.expirations += len(expired)
+
+    def _evict(self):
+        while self.cursors and (len(self.cursors) > self.max_sessions or self.total_bytes() > self.max_bytes):
+            self.cursors.popitem(last=False)
+            self.evictions += 1
+
+    def open(self, key: Hashable, scores: np.ndarray, version: str = None, served: int = 0) -> ResultCursor:
+        cursor = ResultCursor(scores, version, served)
+        with self.lock:
+            self._expire(cursor.last_access)
+            self.cursors[key] = cursor
+            self.cursors.move_to_end(key)
+            self._evict()
+        return cursor
+
+    def get(self, key: Hashable, version: str = None) -> Optional[ResultCursor]:
+        """Live cursor of the key, or None if it expired, was evicted or is of another index version."""
+        with self.lock:
+            now = time.monotonic()
+            self._expire(now)
+            cursor = self.cursors.get(key)
+            if cursor is None:
+                return None
+            if cursor.version != version:
+                del self.cursors[key]
+                return None
+            cursor.last_access = now
+            self.cursors.move_to_end(key)
+            return cursor
+
+    def close(self, key: Hashable):
+        with self.lock:
+            self.cursors.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "sessions": len(self.cursors),
+                "bytes": self.total_bytes(),
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
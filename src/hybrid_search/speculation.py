@@ -0,0 +1,141 @@
+"""
+Speculative query processing for the interactive search loop.
+
+As soon as a query is entered, its parse (sender, dates, relevant text) and its
+embedded paraphrases are computed on a background thread while the remaining
+prompts (result count, corpus, folder, search mode) are answered. Neither
+depends on those answers. The search then picks up the finished work: the parse
+from the query caches of build_es_query, the embeddings from the future.
+"""
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError
+from typing import Dict, List, Optional
+from src.keyword_search.build_es_query import build_es_query
+from src.semantic_search.semantic_search import get_query_variants, embed_queries
+from src.hybrid_search.query_planner import QueryPlanner
+from src.resources.search_settings import get_search_settings
+from src.resources.threads import get_thread_budget, make_worker_initializer
+import src.semantic_search.semantic_search as semantic_components
+
+
+class SpeculativeQuery:
+    """
+    Background work on one query.
+
+    Cancelling stops it at the next step boundary: a paraphrase or embedding call
+    already running finishes, but nothing after it starts.
+    """
+
+    def __init__(self, query: str, expansion: str, planner: QueryPlanner = None):
+        """
+        Args:
+            query: The entered query.
+            expansion: Expansion mode the embeddings are computed for.
+            planner: Query planner, whose paraphrase count is speculated on.
+        """
+        self.query = query
+        self.expansion = expansion
+        self.planner = planner
+        # Resolved on the worker, once the query is parsed.
+        self.num_variants = None
+        self.cancelled = threading.Event()
+        self.parse_future: Optional[Future] = None
+        self.embeddings_future: Optional[Future] = None
+
+    def parse(self, persons_to_aliases_dict: Dict[str, List[str]]):
+        if not self.cancelled.is_set():
+            build_es_query(self.query, persons_to_aliases_dict)
+
+    def embed(self) -> Optional[np.ndarray]:
+        """Embedded variants, or for 'prf' the embedded query (refined against the folder's index later)."""
+        if self.expansion == "prf":
+            queries = [self.query]
+        else:
+            if self.planner is not None:
+                plan = self.planner.plan(self.query, "hybrid")
+                if plan.search_mode == "keyword":
+                    return None
+                self.num_variants = plan.num_variants
+            else:
+                self.num_variants = get_search_settings().num_variants
+            if self.cancelled.is_set():
+                return None
+            queries = get_query_variants(self.query, self.num_variants, verbose=False)
+        if self.cancelled.is_set():
+            return None
+        return embed_queries(queries, verbose=False)
+
+    def wait_for_parse(self):
+        """Wait for a parse already under way instead of repeating it."""
+        if self.parse_future is None:
+            return
+        try:
+            self.parse_future.result()
+        except Exception:
+            # Cancelled or failed: the keyword leg parses the query itself.
+            pass
+
+    def get_query_embeddings(self, num_variants: int = None) -> Optional[np.ndarray]:
+        """
+        The speculated embeddings, waiting for them if still being computed, or None
+        if they were not computed for this expansion mode and paraphrase count.
+        """
+        if self.embeddings_future is None or self.expansion != semantic_components.expansion_mode:
+            return None
+        try:
+            query_embeddings = self.embeddings_future.result()
+        except CancelledError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Speculative query embedding failed ({e}); embedding again.")
+            return None
+        if self.expansion == "paraphrase":
+            num_variants = get_search_settings().num_variants if num_variants is None else num_variants
+            if num_variants != self.num_variants:
+                return None
+        return query_embeddings
+
+    def cancel_embeddings(self):
+        """Give up on the embeddings (e.g. for a keyword search); the parse is still used."""
+        if self.embeddings_future is not None and not self.embeddings_future.cancel():
+            self.cancelled.set()
+
+    def cancel(self):
+        self.cancelled.set()
+        for future in (self.parse_future, self.embeddings_future):
+            if future is not None:
+                future.cancel()
+
+
+class QuerySpeculator:
+    """
+    One background worker speculating on the latest entered query. Starting on a
+    query cancels what is left of the previous one.
+    """
+
+    def __init__(self, persons_to_aliases_dict: Dict[str, List[str]], planner: QueryPlanner = None):
+        budget = get_thread_budget()
+        self.pool = ThreadPoolExecutor(
+            max_workers=1, initializer=make_worker_initializer(budget.faiss_threads),
+            thread_name_prefix="speculation",
+        )
+        self.persons_to_aliases_dict = persons_to_aliases_dict
+        self.planner = planner
+        self.current: Optional[SpeculativeQuery] = None
+
+    def start(self, query: str) -> SpeculativeQuery:
+        if self.current is not None:
+            self.current.cancel()
+        speculation = SpeculativeQuery(query, semantic_components.expansion_mode, self.planner)
+        # The parse goes first: it is quick, and the keyword leg needs it as soon as the search starts.
+        speculation.parse_future = self.pool.submit(speculation.parse, self.persons_to_aliases_dict)
+        speculation.embeddings_future = self.pool.submit(speculation.embed)
+        self.current = speculation
+        return speculation
+
+    def close(self):
+        """Cancel the pending work without waiting for a model call under way."""
+        if self.current is not None:
+            self.current.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
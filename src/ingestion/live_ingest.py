@@ -0,0 +1,256 @@
+"""
+Live ingestion of new emails into a running search engine.
+
+New emails are cleaned, embedded and appended to the folder's FAISS index, ES
+index and in-memory email store while searches keep running. Ids stay stable:
+an email's Id is its row position + 1 in the folder, and ingestion only appends
+rows, so existing Ids, FAISS ids (row positions) and ES document ids never move.
+
+Ingested emails live in memory and in ES; the next release run through
+preprocessing and the artifact build makes them permanent.
+"""
+import time
+import queue
+import threading
+import numpy as np
+import pandas as pd
+import faiss
+from typing import Dict, List, Tuple
+from src.embeddings.store_in_faiss import prepare_email_for_embedding
+from src.keyword_search.es_search import clean_date_formatting_for_matching, index_emails
+from src.semantic_search.sharded_index import ShardedIndex
+from src.config import INGEST_BATCH_SIZE, INGEST_FLUSH_SECONDS
+
+EMAIL_COLUMNS = [
+    "Id",
+    "ExtractedSubject",
+    "ExtractedBodyText",
+    "ExtractedFrom",
+    "ExtractedTo",
+    "ExtractedCc",
+    "ExtractedDateSent",
+    "folder",
+]
+
+
+class ReadWriteLock:
+    """Many concurrent readers (searches) or one writer (an append)."""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing = False
+
+    def acquire_read(self):
+        with self.condition:
+            while self.writing:
+                self.condition.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            while self.writing or self.readers:
+                self.condition.wait()
+            self.writing = True
+
+    def release_write(self):
+        with self.condition:
+            self.writing = False
+            self.condition.notify_all()
+
+
+class LiveIndex:
+    """
+    Search-compatible wrapper of a folder index that can be appended to during searches.
+
+    A flat index is copied into an IndexIDMap2 keyed by row position; a ShardedIndex
+    (whose shards are already IndexIDMaps) is appended to shard by shard. Other
+    attributes (e.g. select_shards) are passed through to the wrapped index.
+    """
+
+    def __init__(self, index):
+        if isinstance(index, ShardedIndex):
+            self.index = index
+        elif isinstance(index, faiss.Index) and not hasattr(index, "id_map"):
+            id_map = faiss.IndexIDMap2(faiss.IndexFlatIP(index.d))
+            if index.ntotal > 0:
+                id_map.add_with_ids(index.reconstruct_n(0, index.ntotal), np.arange(index.ntotal, dtype="int64"))
+            self.index = id_map
+        else:
+            raise ValueError(f"Live ingestion needs a flat or sharded index, not {type(index).__name__}")
+        self.lock = ReadWriteLock()
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def d(self) -> int:
+        return self.index.d
+
+    def __getattr__(self, name):
+        if name == "index":
+            raise AttributeError(name)
+        return getattr(self.index, name)
+
+    def search(self, queries: np.ndarray, k: int, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
+        self.lock.acquire_read()
+        try:
+            return self.index.search(queries, k, **kwargs)
+        finally:
+            self.lock.release_read()
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        self.lock.acquire_read()
+        try:
+            return self.index.reconstruct(int(position))
+        finally:
+            self.lock.release_read()
+
+    def add(self, embeddings: np.ndarray, positions: np.ndarray, email_ids: np.ndarray, dates: np.ndarray):
+        self.lock.acquire_write()
+        try:
+            if isinstance(self.index, ShardedIndex):
+                self.index.add(embeddings, positions, email_ids, dates)
+            else:
+                self.index.add_with_ids(embeddings, positions.astype("int64"))
+        finally:
+            self.lock.release_write()
+
+
+class EmailStore:
+    """
+    In-memory emails and indexes of each folder, plus the version searches are cached under.
+
+    Readers take a folder's (df, index) pair with get(); ingestion replaces the
+    DataFrame with an appended copy before adding to the index, so a reader's
+    DataFrame always covers every row its index can return.
+    """
+
+    def __init__(self, dfs: Dict[str, pd.DataFrame], indexes: Dict[str, object], versions: Dict[str, str]):
+        self.dfs = dict(dfs)
+        self.indexes = dict(indexes)
+        self.versions = dict(versions)
+        self.ingested = {folder: 0 for folder in dfs}
+
+    def get(self, folder: str):
+        return self.dfs[folder], self.indexes[folder]
+
+    def version(self, folder: str) -> str:
+        return self.versions.get(folder)
+
+
+def clean_new_emails(emails: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bring new emails into the processed format: the processed columns plus 'folder',
+    no missing bodies, one row per (folder, Id), and ES-compatible dates.
+    """
+    emails = emails.copy()
+    for column in EMAIL_COLUMNS:
+        if column not in emails:
+            emails[column] = None
+    emails = emails[EMAIL_COLUMNS]
+    emails = emails[emails["ExtractedBodyText"].notnull() & emails["folder"].isin(["inbox", "sent"])]
+    emails = emails.drop_duplicates(["folder", "Id"])
+    return clean_date_formatting_for_matching(emails)
+
+
+class LiveIngestor:
+    """
+    Appends new emails to the store, FAISS and ES.
+
+    ingest() runs synchronously. submit() queues emails for a background thread
+    that groups them into batches of up to batch_size emails, waiting at most
+    flush_seconds after the first queued email, so new emails become searchable
+    within seconds.
+    """
+
+    def __init__(self, store: EmailStore, es_client, embedder, batch_size: int = INGEST_BATCH_SIZE,
+                 flush_seconds: float = INGEST_FLUSH_SECONDS):
+        self.store = store
+        self.es_client = es_client
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        # One ingestion at a time, so appended row positions never collide.
+        self.write_lock = threading.Lock()
+        self.pending: "queue.Queue[pd.DataFrame]" = queue.Queue()
+        self.worker = None
+
+    def ingest(self, emails: pd.DataFrame) -> Dict[str, int]:
+        """
+        Returns:
+            Number of emails added per folder (emails whose Id is already in the folder are skipped).
+        """
+        emails = clean_new_emails(emails)
+        return {folder: self.ingest_folder(folder, folder_emails) for folder, folder_emails in emails.groupby("folder")}
+
+    def ingest_folder(self, folder: str, emails: pd.DataFrame) -> int:
+        with self.write_lock:
+            df, index = self.store.get(folder)
+            emails = emails[~emails["Id"].isin(df["SourceId"])].reset_index(drop=True)
+            if emails.empty:
+                return 0
+
+            positions = np.arange(len(df), len(df) + len(emails), dtype="int64")
+            emails["SourceId"] = emails["Id"]
+            emails["Id"] = positions + 1
+
+            texts = prepare_email_for_embedding(emails)
+            embeddings = self.embedder.embed_emails(texts, self.batch_size).float().numpy().astype("float32")
+
+            # Rows first, then vectors, then ES: whatever a search can retrieve is already in its DataFrame.
+            self.store.dfs[folder] = pd.concat([df, emails], ignore_index=True)
+            dates = pd.to_datetime(emails["ExtractedDateSent"], errors="coerce").to_numpy(dtype="datetime64[ns]")
+            index.add(embeddings, positions, emails["SourceId"].to_numpy(), dates)
+            index_emails(self.es_client, emails, folder, refresh="wait_for")
+
+            self.store.ingested[folder] += len(emails)
+            base_version = (self.store.versions.get(folder) or "").split("+")[0]
+            self.store.versions[folder] = f"{base_version}+{self.store.ingested[folder]}"
+            print(f"📥 Ingested {len(emails)} {folder} emails.")
+            return len(emails)
+
+    def submit(self, emails: pd.DataFrame):
+        if self.worker is None:
+            self.worker = threading.Thread(target=self.run, daemon=True)
+            self.worker.start()
+        self.pending.put(emails)
+
+    def run(self):
+        while True:
+            batch: List[pd.DataFrame] = [self.pending.get()]
+            if batch[0] is None:
+                return
+            deadline = time.monotonic() + self.flush_seconds
+            num_emails = len(batch[0])
+            stop = False
+            while num_emails < self.batch_size:
+                try:
+                    emails = self.pending.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if emails is None:
+                    stop = True
+                    break
+                batch.append(emails)
+                num_emails += len(emails)
+            try:
+                self.ingest(pd.concat(batch, ignore_index=True))
+            except Exception as e:
+                print(f"❌ Ingestion failed: {e}")
+            if stop:
+                return
+
+    def close(self):
+        """Ingest whatever is queued, then stop the background thread."""
+        if self.worker is not None:
+            self.pending.put(None)
+            self.worker.join()
+            self.worker = None
@@ -1,33 +1,69 @@
 import os
-import pandas as pd
+import re
+import copy
 import spacy
 import dateparser
-from typing import Dict, List, Any
-
-nlp = spacy.load("en_core_web_sm")
-
-def get_persons_to_aliases_dict():
-    BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data"))
-    RAW_DIR = os.path.join(BASE_DIR, "raw")
-    aliases_path = os.path.join(RAW_DIR, "Aliases.csv")
-    persons_path = os.path.join(RAW_DIR, "Persons.csv")
-
-    if not os.path.exists(aliases_path):
-        raise FileNotFoundError(f"File not found: {aliases_path}")
-    if not os.path.exists(persons_path):
-        raise FileNotFoundError(f"File not found: {persons_path}")
-    aliases = pd.read_csv(aliases_path)
-    persons = pd.read_csv(persons_path)
-
-    aliases['Alias'] = aliases['Alias'].str.lower()
-    persons['Person'] = persons['Name'].str.lower()
-
-    persons_map = persons.merge(aliases, right_on='PersonId', left_on='Id', suffixes=('', '_alias'))
-    persons_to_aliases = persons_map.groupby('Name')['Alias'].apply(list).to_dict()
-    return persons_to_aliases
-
-def parse_query(query: str, persons_to_aliases: Dict[str, List[str]]) -> Dict[str, Any]:
-    doc = nlp(query)
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+from src.preprocessing.aliases import build_persons_to_aliases_dict, load_persons_to_aliases_dict
+from src.config import ALIAS_MAP_PATH
+
+# Only the tagger (for POS of the sender name) and NER (for DATE entities) are used,
+# so the dependency parser and lemmatizer are never loaded.
+nlp = spacy.load("en_core_web_sm", exclude=["parser", "senter", "lemmatizer"])
+
+QUERY_CACHE_SIZE = 1024
+
+# A sender is only looked for after "from"; queries without it skip the components
+# tagging parts of speech. NER always runs: it finds DATE entities (holidays,
+# decades, ...) that no list of cue words covers.
+SENDER_CUE_REGEX = re.compile(r"\bfrom\b", flags=re.IGNORECASE)
+TAGGING_COMPONENTS = ["tagger", "attribute_ruler"]
+
+def get_persons_to_aliases_dict() -> Dict[str, List[str]]:
+    """Load the serialized alias map, falling back to merging the raw CSVs if it was never built."""
+    if os.path.exists(ALIAS_MAP_PATH):
+        return load_persons_to_aliases_dict()
+    return build_persons_to_aliases_dict()
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace so trivially different spellings of a query share cache entries."""
+    return " ".join(query.split())
+
+def has_sender_cue(query: str) -> bool:
+    """Whether the query could name a sender ("from X")."""
+    return SENDER_CUE_REGEX.search(query) is not None
+
+def get_relevant_text(doc, query: str) -> str:
+    relevant_text = " ".join([token.text for token in doc if (token.is_alpha and not token.is_stop)])
+    if not relevant_text.strip():
+        relevant_text = query.lower().strip()
+    return relevant_text
+
+def analyze_query(query: str) -> Tuple[Optional[str], Optional[Tuple[Any, Any]], str]:
+    """
+    Extract the sender name, date range and relevant text from a normalized query.
+
+    Args:
+        query: Normalized query string.
+
+    Returns:
+        Tuple of (sender_name, (start_date, end_date) or None, relevant_text).
+    """
+    return _analyze_query_cached(query, date.today())
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _analyze_query_cached(query: str, today: date) -> Tuple[Optional[str], Optional[Tuple[Any, Any]], str]:
+    """
+    analyze_query, cached per day: dateparser resolves relative dates ("yesterday",
+    "last week") and fills in missing parts of absolute ones from the current date.
+    """
+    if has_sender_cue(query):
+        doc = nlp(query)
+    else:
+        # is_alpha/is_stop and the entities do not depend on the tagging components.
+        doc = nlp(query, disable=TAGGING_COMPONENTS)
 
     sender_name = None
     for i, token in enumerate(doc):
@@ -37,24 +73,29 @@ def parse_query(query: str, persons_to_aliases: Dict[str, List[str]]) -> Dict[st
                 sender_name = next_token.text
                 break
 
-    sender_aliases = None
-    if not(sender_name is None):
-        sender_aliases = persons_to_aliases.get(sender_name)
-
-    dates_in_query = [dateparser.parse(ent.text) for ent in doc.ents if "DATE" in ent.label_]
+    date_ents = [ent.text for ent in doc.ents if "DATE" in ent.label_]
+    relative_base = datetime.combine(today, datetime.min.time())
+    start_date = dateparser.parse(date_ents[0], settings={"RELATIVE_BASE": relative_base}) if date_ents else None
     date_range = None
-    if dates_in_query and dates_in_query[0]:
-        start_date = dates_in_query[0]
+    if start_date:
         try:
             end_date = start_date.replace(month = start_date.month + 1)
         except ValueError:
             end_date = None
-        date_range = {"start_date": start_date, "end_date": end_date}
+        date_range = (start_date, end_date)
 
-    relevant_text = " ".join([token.text for token in doc if (token.is_alpha and not token.is_stop)])
-    
-    if not relevant_text.strip():
-        relevant_text = query.lower().strip()
+    return sender_name, date_range, get_relevant_text(doc, query)
+
+def parse_query(query: str, persons_to_aliases: Dict[str, List[str]]) -> Dict[str, Any]:
+    sender_name, dates, relevant_text = analyze_query(normalize_query(query))
+
+    sender_aliases = None
+    if not(sender_name is None):
+        sender_aliases = persons_to_aliases.get(sender_name)
+
+    date_range = None
+    if dates is not None:
+        date_range = {"start_date": dates[0], "end_date": dates[1]}
 
     query_info = {
         "possible_senders": sender_aliases,
@@ -144,7 +185,32 @@ def build_es_query_from_parsed(parsed_query: Dict[str, Any]) -> Dict[str, Any]:
     return es_query
 
 
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _build_es_query_cached(query: str, sender_aliases: Optional[Tuple[str, ...]], today: date) -> Dict[str, Any]:
+    sender_name, dates, relevant_text = _analyze_query_cached(query, today)
+    parsed = {
+        "possible_senders": list(sender_aliases) if sender_aliases else None,
+        "date_range": {"start_date": dates[0], "end_date": dates[1]} if dates else None,
+        "relevant_text": relevant_text
+    }
+    return build_es_query_from_parsed(parsed)
+
 def build_es_query(query: str, persons_to_aliases: Dict[str, List[str]]) -> Dict[str, Any]:
-    parsed = parse_query(query, persons_to_aliases)
-    es_query = build_es_query_from_parsed(parsed)
-    return es_query
+    """
+    Build the ES DSL for a query, reusing the cached DSL when the same normalized
+    query (with the same sender aliases) was built before.
+
+    Returns:
+        A fresh copy of the DSL, so callers may add to it.
+    """
+    query = normalize_query(query)
+    # One date for both caches, so a search straddling midnight uses a single parse.
+    today = date.today()
+    sender_name = _analyze_query_cached(query, today)[0]
+    sender_aliases = persons_to_aliases.get(sender_name) if sender_name is not None else None
+    es_query = _build_es_query_cached(query, tuple(sender_aliases) if sender_aliases else None, today)
+    return copy.deepcopy(es_query)
+
+def clear_query_caches():
+    _analyze_query_cached.cache_clear()
+    _build_es_query_cached.cache_clear()
@@ -1,8 +1,15 @@
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Tuple
 from elasticsearch import Elasticsearch
 from elasticsearch.helpers import bulk
 from src.keyword_search.build_es_query import build_es_query
+from src.artifacts.manifest import ArtifactManifest
+from src.artifacts.build import CORPUS_FILES
+from src.config import KEYWORD_MAX_DEPTH, KEYWORD_PAGE_SIZE, UNIFIED_INDEX, UNIFIED_ES_INDEX
+from src.resources.search_settings import get_search_settings
+
+# Bump when the index mapping or the indexed document layout changes.
+ES_INDEX_VERSION = 2
 
 def clean_date_formatting_for_matching(emails_df: pd.DataFrame) -> pd.DataFrame:
     emails_df["ExtractedDateSent"] = pd.to_datetime(emails_df["ExtractedDateSent"], errors="coerce")
@@ -31,12 +38,22 @@ def create_emails_index(es_client: Elasticsearch, emails_df: pd.DataFrame, folde
                     "ExtractedTo": {"type": "keyword"},
                     "ExtractedCc": {"type": "keyword"},
                     "ExtractedDateSent": {"type": "date"},
-                    "folder": {"type": "keyword"}
+                    "folder": {"type": "keyword"},
+                    "email_id": {"type": "integer"}
                 }
             }
         }
     )
 
+    index_emails(es_client, emails_df, folder_name)
+
+def index_emails(es_client: Elasticsearch, emails_df: pd.DataFrame, folder_name: str, refresh=False):
+    """
+    Bulk-index emails into an existing folder index (Ids become document ids).
+
+    Args:
+        refresh: ES refresh option of the bulk request (True, False or 'wait_for').
+    """
     actions = [
         {
             "_index": folder_name,
@@ -48,27 +65,102 @@ def create_emails_index(es_client: Elasticsearch, emails_df: pd.DataFrame, folde
                 "recipients": row["ExtractedTo"],
                 "cc": row["ExtractedCc"],
                 "date_sent": row["ExtractedDateSent"],
-                "folder": row["folder"]
+                "folder": row["folder"],
+                "email_id": row["Id"]
             }
         }
         for _, row in emails_df.iterrows()
     ]
 
-    bulk(es_client, actions)
+    bulk(es_client, actions, refresh=refresh)
+
+def create_emails_index_if_stale(es_client: Elasticsearch, emails_df: pd.DataFrame, folder_name: str, manifest: ArtifactManifest,
+                                 inputs: List[str] = None) -> bool:
+    """
+    Recreate the ES index only if it is missing or was built from other processed emails.
+
+    Args:
+        inputs: Files the emails were loaded from (defaults to the configured corpus).
+
+    Returns:
+        True if the index was rebuilt.
+    """
+    artifact_name = f"es_index:{folder_name}"
+    inputs = inputs or CORPUS_FILES
+    params = {"index": folder_name, "version": ES_INDEX_VERSION, "num_docs": len(emails_df)}
+
+    is_current = (
+        es_client.indices.exists(index=folder_name)
+        and not manifest.is_stale(artifact_name, inputs, params=params)
+        and es_client.count(index=folder_name)["count"] == len(emails_df)
+    )
+    if is_current:
+        return False
+
+    print(f"🗂️ Indexing {folder_name} emails into Elasticsearch...")
+    create_emails_index(es_client, emails_df, folder_name)
+    es_client.indices.refresh(index=folder_name)
+    manifest.record(artifact_name, inputs, params=params)
+    return True
 
-def get_keyword_rankings(es_client: Elasticsearch, query: str, folder_name, num_emails_wanted, persons_to_aliases_dict: Dict[str,List[str]]) -> List[Dict[str, Any]]:
+def get_es_target(folder: str) -> Tuple[str, List[Dict]]:
+    """
+    ES index to search for a folder, and the filters restricting it to the folder.
+
+    With UNIFIED_INDEX, every folder lives in one index whose 'folder' field lists
+    the folders of each email, so a folder is a term filter and "all" has none.
+    """
+    if not UNIFIED_INDEX or folder not in {"inbox", "sent", "all"}:
+        # Per-folder indexes, or the ES index of another corpus (see src.corpora.registry).
+        return folder, []
+    if folder == "all":
+        return UNIFIED_ES_INDEX, []
+    return UNIFIED_ES_INDEX, [{"term": {"folder": folder}}]
+
+def get_keyword_depth(num_emails_wanted: int) -> int:
+    """Candidates to retrieve for a result count (-1 for 'all', as in test mode)."""
+    if num_emails_wanted == -1:
+        return KEYWORD_MAX_DEPTH
+    return min(max(num_emails_wanted, get_search_settings().keyword_min_depth), KEYWORD_MAX_DEPTH)
+
+def get_keyword_rankings(es_client: Elasticsearch, query: str, folder_name, num_emails_wanted, persons_to_aliases_dict: Dict[str,List[str]],
+                         depth: int = None) -> List[Tuple[int, float]]:
+    """
+    Retrieve the top keyword candidates of a query.
+
+    Only Ids and scores come back (no _source, no total hit count). Hits are fetched
+    in pages of KEYWORD_PAGE_SIZE with search_after on (score, email_id), so deep
+    lists never need a large from/size window.
+
+    Args:
+        folder_name: Folder to search ('inbox', 'sent', or 'all' with UNIFIED_INDEX).
+        depth: Number of candidates; defaults to get_keyword_depth(num_emails_wanted).
+
+    Returns:
+        (email_id, score) pairs in descending score order. Emails below the depth
+        are left out; fusion gives them the no-match score.
+    """
     print(f"🔍 Conducting keyword search...")
     es_query = build_es_query(query, persons_to_aliases_dict)
+    index_name, folder_filters = get_es_target(folder_name)
+    es_query["query"]["bool"]["filter"].extend(folder_filters)
+    depth = depth or get_keyword_depth(num_emails_wanted)
 
-    num_emails_wanted = max(num_emails_wanted, 500)
-    es_results = es_client.search(index = folder_name, body = es_query, size = num_emails_wanted)
-
-    emails_with_rankings = es_results["hits"]["hits"]
     results = []
-    for email in emails_with_rankings: 
-        email_id = int(email["_id"])
-        score = email["_score"]
-        email_info = (email_id, score)
-        results.append(email_info)
-    results = sorted(results, key=lambda x: x[0]) 
-    return results
\ No newline at end of file
+    search_after = None
+    while len(results) < depth:
+        page_size = min(KEYWORD_PAGE_SIZE, depth - len(results))
+        body = {
+            **es_query,
+            "sort": [{"_score": "desc"}, {"email_id": "asc"}],
+            "_source": False,
+            "track_total_hits": False,
+        }
+        if search_after is not None:
+            body["search_after"] = search_after
+        hits = es_client.search(index=index_name, body=body, size=page_size)["hits"]["hits"]
+        results.extend((int(hit["_id"]), hit["sort"][0]) for hit in hits)
+        if len(hits) < page_size:
+            break
+        search_after = hits[-1]["sort"]
+    return results
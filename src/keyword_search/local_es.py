@@ -0,0 +1,320 @@
+"""
+In-process stand-in for the Elasticsearch client, for offline load tests.
+
+Implements the calls es_search.py makes (indices.exists/create/delete/refresh,
+count, search, msearch, and bulk as driven by elasticsearch.helpers.bulk) over
+in-memory documents, scoring text matches with BM25 like ES's default
+similarity. Only the query DSL built by build_es_query is supported: bool
+queries of multi_match/match/term/range clauses.
+"""
+import re
+import json
+import math
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+TOKEN_REGEX = re.compile(r"\w+", re.UNICODE)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercased word tokens, like the standard analyzer."""
+    if text is None:
+        return []
+    if isinstance(text, (list, tuple)):
+        return [token for item in text for token in tokenize(item)]
+    return TOKEN_REGEX.findall(str(text).lower())
+
+
+class FieldIndex:
+    """Inverted index of one text field, for BM25."""
+
+    def __init__(self, documents: List[Dict[str, Any]], field: str):
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.lengths = []
+        for doc_number, source in enumerate(documents):
+            tokens = tokenize(source.get(field))
+            self.lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                self.postings[token][doc_number] = tf
+        self.num_docs = len(documents)
+        self.avg_length = (sum(self.lengths) / self.num_docs) if self.num_docs else 0.0
+
+    def score(self, text: Any) -> Dict[int, float]:
+        """BM25 score of every matching document for a match query (OR of its terms)."""
+        scores: Dict[int, float] = defaultdict(float)
+        for token in set(tokenize(text)):
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (self.num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_number, tf in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_number] / (self.avg_length or 1))
+                scores[doc_number] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+
+class Snapshot:
+    """Documents of an index at one point in time, with their field indexes built on demand."""
+
+    def __init__(self, sources: Dict[str, Dict[str, Any]]):
+        self.ids = list(sources)
+        self.documents = list(sources.values())
+        self.fields: Dict[str, FieldIndex] = {}
+        self.lock = threading.Lock()
+
+    def field(self, name: str) -> FieldIndex:
+        with self.lock:
+            if name not in self.fields:
+                self.fields[name] = FieldIndex(self.documents, name)
+            return self.fields[name]
+
+
+class LocalIndex:
+    def __init__(self, body: Dict[str, Any] = None):
+        self.body = body or {}
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self._snapshot: Optional[Snapshot] = None
+
+    def put(self, doc_id: str, source: Dict[str, Any]):
+        with self.lock:
+            self.sources[doc_id] = source
+            self._snapshot = None
+
+    def delete(self, doc_id: str) -> bool:
+        with self.lock:
+            self._snapshot = None
+            return self.sources.pop(doc_id, None) is not None
+
+    def snapshot(self) -> Snapshot:
+        """Documents as of the last write; a search uses one snapshot throughout."""
+        with self.lock:
+            if self._snapshot is None:
+                self._snapshot = Snapshot(self.sources)
+            return self._snapshot
+
+
+def matches_filter(clause: Dict[str, Any], source: Dict[str, Any]) -> bool:
+    (kind, spec), = clause.items()
+    if kind == "term":
+        (field, value), = spec.items()
+        value = value["value"] if isinstance(value, dict) else value
+        actual = source.get(field)
+        return value in actual if isinstance(actual, (list, tuple)) else actual == value
+    if kind == "terms":
+        (field, values), = spec.items()
+        actual = source.get(field)
+        actual = actual if isinstance(actual, (list, tuple)) else [actual]
+        return any(value in actual for value in values)
+    if kind == "range":
+        (field, bounds), = spec.items()
+        actual = source.get(field)
+        if actual is None:
+            return False
+        # ISO dates compare correctly as strings.
+        actual = str(actual)
+        return (
+            ("gte" not in bounds or actual >= str(bounds["gte"]))
+            and ("gt" not in bounds or actual > str(bounds["gt"]))
+            and ("lte" not in bounds or actual <= str(bounds["lte"]))
+            and ("lt" not in bounds or actual < str(bounds["lt"]))
+        )
+    raise ValueError(f"Unsupported filter clause: {kind}")
+
+
+class LocalIndicesClient:
+    def __init__(self, client: "LocalElasticsearch"):
+        self.client = client
+
+    def exists(self, index: str, **kwargs) -> bool:
+        return index in self.client.indexes
+
+    def create(self, index: str, body: Dict[str, Any] = None, **kwargs) -> Dict[str, Any]:
+        if index in self.client.indexes:
+            raise ValueError(f"Index already exists: {index}")
+        self.client.indexes[index] = LocalIndex(body)
+        return {"acknowledged": True, "index": index}
+
+    def delete(self, index: str, **kwargs) -> Dict[str, Any]:
+        self.client.indexes.pop(index, None)
+        return {"acknowledged": True}
+
+    def refresh(self, index: str = None, **kwargs) -> Dict[str, Any]:
+        # Writes are visible as soon as they are made.
+        return {"_shards": {"failed": 0}}
+
+
+class LocalResponse(dict):
+    """Dict response that also has the .body of the client's API responses (used by helpers.bulk)."""
+
+    @property
+    def body(self) -> Dict[str, Any]:
+        return self
+
+
+class JSONSerializer:
+    def dumps(self, data: Any) -> str:
+        return data if isinstance(data, str) else json.dumps(data, default=str)
+
+    def loads(self, data: Any) -> Any:
+        return json.loads(data)
+
+
+class LocalSerializers:
+    def get_serializer(self, mimetype: str) -> JSONSerializer:
+        return JSONSerializer()
+
+
+class LocalTransport:
+    def __init__(self):
+        self.serializers = LocalSerializers()
+
+
+class LocalElasticsearch:
+    """
+    Drop-in for the Elasticsearch client used by es_search.py.
+
+    Searches are thread-safe; each index rebuilds its BM25 postings lazily after writes.
+    """
+
+    def __init__(self):
+        self.indexes: Dict[str, LocalIndex] = {}
+        self.indices = LocalIndicesClient(self)
+        self.transport = LocalTransport()
+        self._client_meta = ()
+
+    def options(self, **kwargs) -> "LocalElasticsearch":
+        return self
+
+    def ping(self, **kwargs) -> bool:
+        return True
+
+    def get_index(self, index: str) -> LocalIndex:
+        if index not in self.indexes:
+            raise KeyError(f"no such index [{index}]")
+        return self.indexes[index]
+
+    def count(self, index: str, **kwargs) -> Dict[str, int]:
+        return {"count": len(self.get_index(index).sources)}
+
+    def bulk(self, operations: List[Any] = None, body: List[Any] = None, refresh: Any = None, index: str = None,
+             **kwargs) -> LocalResponse:
+        """
+        Apply a bulk request: action lines, each followed by a source line for
+        index/create operations. Lines may be dicts or serialized JSON.
+        """
+        lines = [json.loads(line) if isinstance(line, (str, bytes)) else line for line in (operations or body or [])]
+        items = []
+        i = 0
+        while i < len(lines):
+            (op_type, meta), = lines[i].items()
+            target = self.indexes.setdefault(meta.get("_index", index), LocalIndex())
+            doc_id = str(meta.get("_id"))
+            if op_type in {"index", "create"}:
+                target.put(doc_id, lines[i + 1])
+                items.append({op_type: {"_index": meta.get("_index", index), "_id": doc_id, "status": 201, "result": "created"}})
+                i += 2
+            elif op_type == "delete":
+                found = target.delete(doc_id)
+                items.append({op_type: {"_index": meta.get("_index", index), "_id": doc_id, "status": 200 if found else 404}})
+                i += 1
+            else:
+                raise ValueError(f"Unsupported bulk operation: {op_type}")
+        return LocalResponse({"took": 0, "errors": False, "items": items})
+
+    def score_query(self, snapshot: Snapshot, query: Dict[str, Any]) -> Dict[int, float]:
+        """Score of every document matching a query, by snapshot position."""
+        (kind, spec), = query.items()
+        if kind == "match_all":
+            return {doc_number: 1.0 for doc_number in range(len(snapshot.documents))}
+        if kind == "multi_match":
+            # best_fields: a document's score is that of its best-matching field.
+            scores: Dict[int, float] = {}
+            for field in spec["fields"]:
+                for doc_number, score in snapshot.field(field).score(spec["query"]).items():
+                    scores[doc_number] = max(scores.get(doc_number, 0.0), score)
+            return scores
+        if kind == "match":
+            (field, params), = spec.items()
+            text, boost = (params["query"], params.get("boost", 1.0)) if isinstance(params, dict) else (params, 1.0)
+            return {doc_number: boost * score for doc_number, score in snapshot.field(field).score(text).items()}
+        if kind in {"term", "terms", "range"}:
+            (field, params), = spec.items()
+            boost = params.get("boost", 1.0) if isinstance(params, dict) else 1.0
+            return {doc_number: boost for doc_number, source in enumerate(snapshot.documents) if matches_filter(query, source)}
+        if kind == "bool":
+            return self.score_bool(snapshot, spec)
+        raise ValueError(f"Unsupported query: {kind}")
+
+    def score_bool(self, snapshot: Snapshot, spec: Dict[str, Any]) -> Dict[int, float]:
+        documents = snapshot.documents
+        must = [self.score_query(snapshot, clause) for clause in spec.get("must", [])]
+        should = [self.score_query(snapshot, clause) for clause in spec.get("should", [])]
+        filters = spec.get("filter", [])
+        filters = filters if isinstance(filters, list) else [filters]
+
+        if must:
+            candidates = set(must[0]).intersection(*must[1:])
+        elif should:
+            candidates = set().union(*should)
+        else:
+            candidates = set(range(len(documents)))
+        candidates = {d for d in candidates if all(matches_filter(clause, documents[d]) for clause in filters)}
+
+        return {
+            d: sum(scores[d] for scores in must) + sum(scores.get(d, 0.0) for scores in should)
+            for d in candidates
+        }
+
+    def search(self, index: str, body: Dict[str, Any] = None, size: int = None, **kwargs) -> LocalResponse:
+        """Search with the body of get_keyword_rankings: query, sort on (_score, a field), search_after, _source."""
+        body = {**(body or {}), **kwargs}
+        size = body.get("size", 10) if size is None else size
+        snapshot = self.get_index(index).snapshot()
+        ids, documents = snapshot.ids, snapshot.documents
+        scores = self.score_query(snapshot, body.get("query", {"match_all": {}}))
+
+        sort_fields = [next(iter(s)) if isinstance(s, dict) else s for s in body.get("sort", ["_score"])]
+
+        def sort_key(doc_number: int) -> tuple:
+            key = []
+            for field in sort_fields:
+                if field == "_score":
+                    key.append(-scores[doc_number])
+                else:
+                    key.append(documents[doc_number].get(field))
+            return tuple(key)
+
+        def sort_values(doc_number: int) -> list:
+            return [scores[doc_number] if field == "_score" else documents[doc_number].get(field) for field in sort_fields]
+
+        ranked = sorted(scores, key=sort_key)
+        if body.get("search_after") is not None:
+            after = tuple(-v if field == "_score" else v for field, v in zip(sort_fields, body["search_after"]))
+            ranked = [d for d in ranked if sort_key(d) > after]
+        hits = []
+        for doc_number in ranked[body.get("from", 0):body.get("from", 0) + size]:
+            hit = {"_index": index, "_id": ids[doc_number], "_score": scores[doc_number], "sort": sort_values(doc_number)}
+            if body.get("_source", True) is not False:
+                hit["_source"] = documents[doc_number]
+            hits.append(hit)
+
+        response = {"took": 0, "timed_out": False, "hits": {"max_score": max(scores.values(), default=None), "hits": hits}}
+        if body.get("track_total_hits", True) is not False:
+            response["hits"]["total"] = {"value": len(scores), "relation": "eq"}
+        return LocalResponse(response)
+
+    def msearch(self, searches: List[Dict[str, Any]] = None, body: List[Dict[str, Any]] = None, index: str = None,
+                **kwargs) -> LocalResponse:
+        """Run header/body pairs of searches, as the client's msearch does."""
+        lines = searches or body or []
+        responses = []
+        for header, search_body in zip(lines[0::2], lines[1::2]):
+            try:
+                responses.append({**self.search(header.get("index", index), dict(search_body)), "status": 200})
+            except (KeyError, ValueError) as e:
+                responses.append({"error": {"reason": str(e)}, "status": 400})
+        return LocalResponse({"took": 0, "responses": responses})
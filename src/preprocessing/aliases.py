@@ -0,0 +1,42 @@
+"""
+Person-to-alias map used to expand sender names in keyword queries.
+"""
+import os
+import json
+from typing import Dict, List
+from src.preprocessing.dataloader import load
+from src.config import RAW_DIR, ALIAS_MAP_PATH
+
+ALIASES_PATH = os.path.join(RAW_DIR, "Aliases.csv")
+PERSONS_PATH = os.path.join(RAW_DIR, "Persons.csv")
+
+
+def build_persons_to_aliases_dict(aliases_path: str = ALIASES_PATH, persons_path: str = PERSONS_PATH) -> Dict[str, List[str]]:
+    """
+    Merge Aliases.csv with Persons.csv into a map from person name to lowercased aliases.
+    """
+    aliases = load(aliases_path)
+    persons = load(persons_path)
+
+    aliases['Alias'] = aliases['Alias'].str.lower()
+    persons['Person'] = persons['Name'].str.lower()
+
+    persons_map = persons.merge(aliases, right_on='PersonId', left_on='Id', suffixes=('', '_alias'))
+    persons_to_aliases = persons_map.groupby('Name')['Alias'].apply(list).to_dict()
+    return persons_to_aliases
+
+
+def save_persons_to_aliases_dict(persons_to_aliases: Dict[str, List[str]], path: str = ALIAS_MAP_PATH) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(persons_to_aliases, f)
+    print(f"Saved alias map at {path}")
+
+
+def load_persons_to_aliases_dict(path: str = ALIAS_MAP_PATH) -> Dict[str, List[str]]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    save_persons_to_aliases_dict(build_persons_to_aliases_dict())
@@ -0,0 +1,199 @@
+"""
+Near-duplicate detection with MinHash signatures and LSH banding.
+
+Emails whose cleaned bodies have an estimated Jaccard similarity of at least the
+threshold (over word shingles) are grouped, and every email is mapped to the
+canonical member of its group (the lowest Id). Only canonical emails need to be
+embedded and indexed; the others can be expanded back at result time.
+
+Run `python -m src.preprocessing.near_duplicates` to write the mapping.
+"""
+import zlib
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from tqdm import tqdm
+from src.config import NEAR_DUPLICATES_PATH, NEAR_DUP_THRESHOLD, NEAR_DUP_NUM_PERM, NEAR_DUP_SHINGLE_SIZE
+
+logger = logging.getLogger(__name__)
+
+MERSENNE_PRIME = (1 << 31) - 1
+
+
+def get_shingles(text: str, shingle_size: int) -> np.ndarray:
+    """CRC32 hashes of the text's word shingles (the whole text if it is shorter)."""
+    words = text.split()
+    if not words:
+        return np.empty(0, dtype="int64")
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype="int64", count=len(shingles)))
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NEAR_DUP_NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype="int64")
+        self.b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype="int64")
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        """MinHash signature under num_perm universal hash functions (a*x + b) mod p."""
+        if len(shingles) == 0:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype="int64")
+        x = shingles % MERSENNE_PRIME
+        # a, x < 2^31, so a * x fits in int64.
+        return ((self.a[:, None] * x[None, :] + self.b[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+
+def choose_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    (bands, rows) with bands * rows == num_perm whose LSH threshold (1/bands)^(1/rows)
+    is closest to the requested similarity threshold.
+    """
+    options = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(options, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def find_canonical_ids(ids: List[int], texts: List[str], threshold: float = NEAR_DUP_THRESHOLD,
+                       num_perm: int = NEAR_DUP_NUM_PERM, shingle_size: int = NEAR_DUP_SHINGLE_SIZE) -> Dict[int, int]:
+    """
+    Group near-duplicate texts and map each Id to the lowest Id in its group.
+
+    Args:
+        ids: Email Ids.
+        texts: Cleaned bodies, aligned with ids.
+        threshold: Minimum estimated Jaccard similarity for two emails to be duplicates.
+        num_perm: MinHash signature length.
+        shingle_size: Words per shingle.
+
+    Returns:
+        Dict from Id to canonical Id.
+    """
+    hasher = MinHasher(num_perm)
+    bands, rows = choose_bands(num_perm, threshold)
+    signatures = np.stack([hasher.signature(get_shingles(t, shingle_size)) for t in tqdm(texts, desc="MinHashing")])
+    has_text = np.array([bool(t.strip()) for t in texts])
+
+    parent = list(range(len(ids)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = defaultdict(list)
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        for i in np.flatnonzero(has_text):
+            buckets[band_values[i].tobytes()].append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            member_signatures = signatures[members]
+            # Every pair is a candidate: members can all share the band yet differ elsewhere, so
+            # two of them may be duplicates while neither is similar enough to the first.
+            for position, first in enumerate(members[:-1]):
+                # Confirm the LSH candidates with the signatures' Jaccard estimates.
+                similar = np.mean(member_signatures[position + 1:] == member_signatures[position], axis=1) >= threshold
+                for other in np.asarray(members[position + 1:])[similar]:
+                    root_a, root_b = find(first), find(other)
+                    if root_a != root_b:
+                        parent[root_b] = root_a
+
+    canonical_by_root = {}
+    for i in range(len(ids)):
+        root = find(i)
+        canonical_by_root[root] = min(canonical_by_root.get(root, ids[i]), ids[i])
+    return {ids[i]: canonical_by_root[find(i)] for i in range(len(ids))}
+
+
+def build_near_duplicate_map(df: pd.DataFrame, threshold: float = NEAR_DUP_THRESHOLD,
+                             num_perm: int = NEAR_DUP_NUM_PERM) -> pd.DataFrame:
+    """
+    Compute the canonical-member mapping of each folder separately.
+
+    Args:
+        df: Processed emails with 'Id', 'ExtractedBodyText' and 'folder' columns.
+
+    Returns:
+        DataFrame with columns folder, Id, CanonicalId.
+    """
+    from src.preprocessing.preprocess import clean_text
+
+    frames = []
+    for folder, folder_df in df.groupby("folder"):
+        bodies = clean_text(folder_df["ExtractedBodyText"], is_body=True).tolist()
+        mapping = find_canonical_ids(folder_df["Id"].astype(int).tolist(), bodies, threshold, num_perm)
+        frames.append(pd.DataFrame({
+            "folder": folder,
+            "Id": list(mapping.keys()),
+            "CanonicalId": list(mapping.values()),
+        }))
+        num_duplicates = sum(1 for i, c in mapping.items() if i != c)
+        logger.info(f"{folder}: {num_duplicates} of {len(mapping)} emails are near-duplicates")
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_near_duplicate_map(path: str = NEAR_DUPLICATES_PATH) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+
+def get_duplicate_rows(mapping: pd.DataFrame, full_df: pd.DataFrame, folder: str) -> Dict[int, List[dict]]:
+    """
+    Rows of the collapsed (non-canonical) emails of a folder, keyed by their canonical Id.
+
+    Args:
+        mapping: Near-duplicate map.
+        full_df: Processed emails of the folder including the collapsed ones.
+        folder: Folder name.
+    """
+    folder_map = mapping[(mapping["folder"] == folder) & (mapping["Id"] != mapping["CanonicalId"])]
+    canonical_by_id = dict(zip(folder_map["Id"], folder_map["CanonicalId"]))
+    duplicates = defaultdict(list)
+    for row in full_df[full_df["Id"].isin(canonical_by_id)].to_dict("records"):
+        duplicates[canonical_by_id[row["Id"]]].append(row)
+    return dict(duplicates)
+
+
+def expand_duplicates(top_emails: List[dict], duplicate_rows: Dict[int, List[dict]]) -> List[dict]:
+    """
+    Insert each result's collapsed duplicates right after it, with the same score.
+
+    A duplicate takes the Id of its canonical email (duplicates are not in the
+    folder's index, so they have no row position) and keeps its processed Id
+    as 'SourceId'.
+
+    Args:
+        top_emails: Materialized results with a 'SourceId' (processed Id) field.
+        duplicate_rows: Output of get_duplicate_rows.
+    """
+    expanded = []
+    for email in top_emails:
+        expanded.append(email)
+        for duplicate in duplicate_rows.get(email["SourceId"], []):
+            expanded.append({
+                **duplicate, "Id": email["Id"], "SourceId": duplicate["Id"], "score": email["score"],
+                "duplicate_of": email["Id"],
+            })
+    return expanded
+
+
+if __name__ == "__main__":
+    from src.utils import load_processed_emails
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Detect near-duplicate emails with MinHash/LSH.")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUP_THRESHOLD, help="Jaccard similarity threshold.")
+    parser.add_argument("--num_perm", type=int, default=NEAR_DUP_NUM_PERM, help="MinHash signature length.")
+    args = parser.parse_args()
+
+    mapping = build_near_duplicate_map(load_processed_emails(canonical_only=False), args.threshold, args.num_perm)
+    mapping.to_parquet(NEAR_DUPLICATES_PATH, index=False)
+    print(f"Saved near-duplicate map at {NEAR_DUPLICATES_PATH}")
@@ -1,14 +1,21 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
 import sys
 import re
 import os
-from typing import Tuple
+import json
+import shutil
+import argparse
+from typing import Dict, List, Tuple
 from src.preprocessing.dataloader import load, save
+from src.artifacts.manifest import compute_file_hash
 from datetime import datetime
 from tqdm import tqdm
 import logging
 from multiprocessing import cpu_count
-from src.config import RAW_DIR, PROCESSED_DIR, INBOX_PATH, SENT_PATH
+from src.config import RAW_DIR, PROCESSED_DIR, INBOX_PATH, SENT_PATH, PARTITIONED_EMAILS_DIR
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -34,6 +41,13 @@ def extract_alias(raw_from: str) -> str:
         return match.group(0).strip()
     return raw_from
 
+def parse_date_sent(date_str):
+    """Parse an ExtractedDateSent value, dropping trailing timezone abbreviations."""
+    return pd.to_datetime(
+        re.sub(r'\bOM\b', 'AM', re.sub(r'\b[A-Z]{1,3}$', '', date_str)) if isinstance(date_str, str) else date_str,
+        errors='coerce'
+    )
+
 def clean_text(texts: pd.Series, is_body: bool) -> pd.Series:
     texts = texts.fillna("").astype(str)
     if is_body:
@@ -80,13 +94,7 @@ def preprocess_emails(
     emails['body'] = clean_text(emails['ExtractedBodyText'], is_body=True)
 
     logger.info("Parsing dates...")
-    emails['date'] = emails['ExtractedDateSent'].progress_apply(
-    lambda date_str: pd.to_datetime(
-        re.sub(r'\bOM\b', 'AM', re.sub(r'\b[A-Z]{1,3}$', '', date_str)) if isinstance(date_str, str) else date_str,
-        errors='coerce'
-    )
-
-    )
+    emails['date'] = emails['ExtractedDateSent'].progress_apply(parse_date_sent)
 
     logger.info("Identifying Hillary aliases and PersonId...")
     hillary_aliases = alias_map[alias_map['Name'].str.contains("hillary", case=False, na=False)]
@@ -146,12 +154,200 @@ def preprocess_emails(
 
     return inbox_df, sent_df
 
+# Columns read from Emails.csv in streaming mode; everything else is never materialized.
+STREAMING_EMAIL_COLUMNS = [
+    "Id",
+    "ExtractedSubject",
+    "ExtractedBodyText",
+    "ExtractedFrom",
+    "ExtractedCc",
+    "ExtractedDateSent"
+]
+
+PARTITION_SCHEMA = pa.schema([
+    ("Id", pa.int64()),
+    ("ExtractedSubject", pa.string()),
+    ("ExtractedBodyText", pa.string()),
+    ("ExtractedFrom", pa.string()),
+    ("ExtractedTo", pa.list_(pa.string())),
+    ("ExtractedCc", pa.string()),
+    ("ExtractedDateSent", pa.string()),
+    ("date", pa.timestamp("ns")),
+])
+
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+PARTITION_SUMMARY_NAME = "_partitions.json"
+
+class PartitionedParquetWriter:
+    """
+    Writes rows into a hive-partitioned folder=<folder>/year=<year> Parquet dataset.
+
+    Rows are buffered per partition and flushed as date-sorted row groups, so the
+    row-group min/max statistics on `date` let readers skip row groups by date.
+    Memory is bounded by row_group_size rows per open partition.
+    """
+    def __init__(self, root_dir: str, schema: pa.Schema, row_group_size: int):
+        self.root_dir = root_dir
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.writers: Dict[Tuple[str, str], pq.ParquetWriter] = {}
+        self.buffers: Dict[Tuple[str, str], List[pd.DataFrame]] = {}
+        self.row_counts: Dict[Tuple[str, str], int] = {}
+        self.paths: Dict[Tuple[str, str], str] = {}
+
+    def write(self, folder: str, year, df: pd.DataFrame):
+        key = (folder, NULL_PARTITION if year is None else str(year))
+        self.buffers.setdefault(key, []).append(df)
+        buffered = sum(len(part) for part in self.buffers[key])
+        if buffered >= self.row_group_size:
+            self._flush(key)
+
+    def _flush(self, key: Tuple[str, str]):
+        parts = self.buffers.pop(key, [])
+        if not parts:
+            return
+        df = pd.concat(parts).sort_values("date", kind="stable")
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+
+        writer = self.writers.get(key)
+        if writer is None:
+            folder, year = key
+            partition_dir = os.path.join(self.root_dir, f"folder={folder}", f"year={year}")
+            os.makedirs(partition_dir, exist_ok=True)
+            self.paths[key] = os.path.join(partition_dir, "part-0.parquet")
+            writer = pq.ParquetWriter(self.paths[key], self.schema, write_statistics=True)
+            self.writers[key] = writer
+        writer.write_table(table, row_group_size=self.row_group_size)
+        self.row_counts[key] = self.row_counts.get(key, 0) + len(df)
+
+    def close(self) -> Dict[str, Dict[str, object]]:
+        """
+        Flush all buffers, close the files and write a summary of each partition's
+        row count and content hash. The summary is the build's tracked output, so
+        it has to change whenever any partition's contents do.
+        """
+        for key in list(self.buffers):
+            self._flush(key)
+        for writer in self.writers.values():
+            writer.close()
+        summary = {
+            f"folder={folder}/year={year}": {"rows": count, "sha256": compute_file_hash(self.paths[(folder, year)])}
+            for (folder, year), count in sorted(self.row_counts.items())
+        }
+        with open(os.path.join(self.root_dir, PARTITION_SUMMARY_NAME), "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+def preprocess_emails_streaming(
+    emails_path: str,
+    receivers_path: str,
+    aliases_path: str,
+    persons_path: str,
+    output_dir: str = PARTITIONED_EMAILS_DIR,
+    block_size_mb: int = 16,
+    row_group_size: int = 10000,
+) -> Dict[str, int]:
+    """
+    Streaming variant of preprocess_emails for dumps that do not fit in memory.
+
+    Emails.csv is read in blocks with pyarrow and joined against the (small) alias,
+    person and receiver tables; each block is written straight into a Parquet
+    dataset partitioned by folder and year.
+
+    Args:
+        emails_path, receivers_path, aliases_path, persons_path: Raw CSV paths.
+        output_dir: Root of the partitioned dataset (replaced if it exists).
+        block_size_mb: Size of the CSV blocks read at a time.
+        row_group_size: Rows per Parquet row group.
+
+    Returns:
+        Number of emails written per folder.
+    """
+    logger.info("Loading alias, person and receiver tables...")
+    receivers = load(receivers_path)
+    aliases = load(aliases_path)
+    persons = load(persons_path)
+
+    alias_map = aliases.merge(persons, left_on='PersonId', right_on='Id', suffixes=('', '_person'))
+    alias_map['Alias'] = alias_map['Alias'].str.lower()
+    hillary_alias_set = set(alias_map[alias_map['Name'].str.contains("hillary", case=False, na=False)]['Alias'])
+    hillary_person_ids = set(
+        persons[persons['Name'].str.contains("hillary", case=False, na=False)]['Id']
+    )
+
+    receivers = receivers.merge(persons, left_on='PersonId', right_on='Id')
+    received_email_ids = set(
+        receivers[receivers['PersonId'].isin(hillary_person_ids)]['EmailId']
+    )
+    email_to_recipients = receivers.groupby('EmailId')['Name'].apply(list).to_dict()
+    del receivers, aliases, alias_map
+
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+    reader = pv.open_csv(
+        emails_path,
+        read_options=pv.ReadOptions(block_size=block_size_mb << 20),
+        parse_options=pv.ParseOptions(newlines_in_values=True),
+        convert_options=pv.ConvertOptions(
+            include_columns=STREAMING_EMAIL_COLUMNS,
+            column_types={col: (pa.int64() if col == "Id" else pa.string()) for col in STREAMING_EMAIL_COLUMNS},
+            strings_can_be_null=True,
+        ),
+    )
+    writer = PartitionedParquetWriter(output_dir, PARTITION_SCHEMA, row_group_size)
+    counts = {"inbox": 0, "sent": 0}
+
+    logger.info(f"Streaming emails from {emails_path}...")
+    for batch in tqdm(reader, desc="Preprocessing email blocks"):
+        chunk = batch.to_pandas()
+        cleaned_alias = chunk['ExtractedFrom'].map(extract_alias)
+        chunk['ExtractedFrom'] = chunk['ExtractedFrom'].fillna(cleaned_alias)
+        chunk['ExtractedTo'] = [email_to_recipients.get(email_id) for email_id in chunk['Id']]
+        chunk['date'] = pd.to_datetime(chunk['ExtractedDateSent'].map(parse_date_sent), errors='coerce', utc=True).dt.tz_localize(None)
+
+        has_body = chunk['ExtractedBodyText'].notnull()
+        folder_masks = [
+            ("inbox", chunk['Id'].isin(received_email_ids) & has_body),
+            ("sent", cleaned_alias.isin(hillary_alias_set) & has_body),
+        ]
+        for folder, mask in folder_masks:
+            folder_chunk = chunk.loc[mask, PARTITION_SCHEMA.names]
+            counts[folder] += len(folder_chunk)
+            for year, group in folder_chunk.groupby(folder_chunk['date'].dt.year, dropna=False):
+                writer.write(folder, None if pd.isna(year) else int(year), group)
+
+    writer.close()
+    logger.info(f"Inbox: {counts['inbox']} emails | Sent: {counts['sent']} emails")
+    logger.info(f"Saved partitioned data at {output_dir}")
+    return counts
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess the raw email CSVs.")
+    parser.add_argument("--streaming", action="store_true", help="Stream Emails.csv in blocks into a partitioned Parquet dataset.")
+    parser.add_argument("--block_size_mb", type=int, default=16, help="CSV block size in streaming mode.")
+    parser.add_argument("--row_group_size", type=int, default=10000, help="Parquet row group size in streaming mode.")
+    args = parser.parse_args()
+
     emails_path = os.path.join(RAW_DIR, "Emails.csv")
     receivers_path = os.path.join(RAW_DIR, "EmailReceivers.csv")
     aliases_path = os.path.join(RAW_DIR, "Aliases.csv")
     persons_path = os.path.join(RAW_DIR, "Persons.csv")
 
+    if args.streaming:
+        counts = preprocess_emails_streaming(
+            emails_path,
+            receivers_path,
+            aliases_path,
+            persons_path,
+            block_size_mb=args.block_size_mb,
+            row_group_size=args.row_group_size,
+        )
+        print(f"\n📥 Nonempty Inbox emails: {counts['inbox']}")
+        print(f"📤 Nonempty Sent emails:  {counts['sent']}")
+        sys.exit(0)
+
     inbox_df, sent_df = preprocess_emails(
         emails_path,
         receivers_path,
@@ -161,4 +357,3 @@ if __name__ == "__main__":
 
     print(f"\n📥 Nonempty Inbox emails: {len(inbox_df)}")
     print(f"📤 Nonempty Sent emails:  {len(sent_df)}")
-
@@ -1,35 +1,122 @@
 from typing import List
 import torch
-from transformers import BartTokenizer, BartForConditionalGeneration
+from transformers import BartTokenizerFast, BartForConditionalGeneration, AutoModelForSeq2SeqLM
+from transformers import LogitsProcessor, LogitsProcessorList
 from src.utils import set_global_seed
+from src.config import PARAPHRASE_DECODING, PARAPHRASE_MODEL_NAME
+from src.resources.model_snapshots import find_snapshot, load_snapshot
+
+class LocalSampler(LogitsProcessor):
+    """
+    Top-k/top-p sampling of each next token with a local torch.Generator.
+
+    generate() only samples from torch's global RNG, so this processor samples
+    itself and leaves only the drawn token's logit finite; greedy decoding then
+    picks that token. The global RNG is neither read nor advanced.
+    """
+
+    def __init__(self, generator: torch.Generator, top_k: int, top_p: float, temperature: float):
+        self.generator = generator
+        self.top_k = top_k
+        self.top_p = top_p
+        self.temperature = temperature
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        scores = scores / self.temperature
+        kth_best = torch.topk(scores, min(self.top_k, scores.size(-1)), dim=-1).values[..., -1:]
+        scores = scores.masked_fill(scores < kth_best, -float("inf"))
+        # Drop the least likely tokens outside the top_p probability mass, keeping at least the best one.
+        sorted_scores, sorted_indices = torch.sort(scores, descending=False)
+        sorted_removed = sorted_scores.softmax(dim=-1).cumsum(dim=-1) <= 1 - self.top_p
+        sorted_removed[..., -1:] = False
+        scores = scores.masked_fill(sorted_removed.scatter(1, sorted_indices, sorted_removed), -float("inf"))
+        next_tokens = torch.multinomial(scores.softmax(dim=-1), num_samples=1, generator=self.generator)
+        return torch.full_like(scores, -float("inf")).scatter(1, next_tokens, 0.0)
+
 
 class QueryExpander:
-    def __init__(self, model_name: str = "eugenesiow/bart-paraphrase", seed: int = None):
+    def __init__(self, model_name: str = PARAPHRASE_MODEL_NAME, seed: int = None, decoding: str = PARAPHRASE_DECODING):
+        """
+        Args:
+            model_name: Hugging Face paraphrase model; its local snapshot is loaded if there is one.
+            seed: Random seed of a generator created for every generate call, so the
+                variants of a batch of queries do not depend on earlier calls or on
+                other users of torch's global RNG.
+            decoding: 'sample' (top-k/top-p sampling) or 'diverse' (greedy diverse beam
+                groups, one beam per group: deterministic and cheaper).
+        """
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.tokenizer = BartTokenizer.from_pretrained(model_name)
-        self.model = BartForConditionalGeneration.from_pretrained(model_name).to(self.device)
+        snapshot_path = find_snapshot(model_name)
+        if snapshot_path is not None:
+            self.model, _ = load_snapshot(snapshot_path, AutoModelForSeq2SeqLM, self.device)
+            self.tokenizer = BartTokenizerFast.from_pretrained(snapshot_path)
+        else:
+            self.tokenizer = BartTokenizerFast.from_pretrained(model_name)
+            self.model = BartForConditionalGeneration.from_pretrained(model_name).to(self.device)
+        self.model.eval()
+        self.seed = seed
+        self.decoding = decoding
         if seed is not None:
             set_global_seed(seed)
+
+    @staticmethod
+    def get_max_length(num_input_tokens: int) -> int:
+        """Paraphrases are about as long as the query; leave room but never exceed 128 tokens."""
+        return min(128, max(16, 2 * num_input_tokens + 8))
+
+    @torch.inference_mode()
+    def expand_batch(self, queries: List[str], num_variants: int = 4) -> List[List[str]]:
+        """
+        Generate paraphrases for several queries in one generate call.
+
+        Returns:
+            For each query, its de-duplicated lowercased variants including the query itself.
+        """
+        encoded = self.tokenizer(queries, return_tensors="pt", truncation=True, padding="longest")
+        encoded = {k: v.to(self.device) for k, v in encoded.items()}
+        max_length = self.get_max_length(int(encoded["attention_mask"].sum(dim=1).max()))
+
+        if self.decoding == "diverse":
+            num_return_sequences = num_variants
+            outputs = self.model.generate(
+                **encoded,
+                max_length=max_length,
+                num_beams=num_variants,
+                num_beam_groups=num_variants,
+                diversity_penalty=1.0,
+                num_return_sequences=num_return_sequences,
+                do_sample=False,
+                no_repeat_ngram_size=3,
+            )
+        else:
+            num_return_sequences = num_variants * 2
+            generator = torch.Generator(device=self.device)
+            if self.seed is not None:
+                generator.manual_seed(self.seed)
+            else:
+                generator.seed()
+            # Greedy decoding returns one sequence per row, so each query is repeated once per sample.
+            outputs = self.model.generate(
+                **{k: v.repeat_interleave(num_return_sequences, dim=0) for k, v in encoded.items()},
+                max_length=max_length,
+                num_beams=1,
+                do_sample=False,
+                logits_processor=LogitsProcessorList([
+                    LocalSampler(generator, top_k=30, top_p=0.9, temperature=0.95),
+                ]),
+                no_repeat_ngram_size=3,
+            )
+        decoded = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+        expansions = []
+        for i, query in enumerate(queries):
+            paraphrases = [p.strip() for p in decoded[i * num_return_sequences:(i + 1) * num_return_sequences]]
+            paraphrases = [p for p in paraphrases if p != query]
+            paraphrases += [query]
+            paraphrases = [p.lower() for p in paraphrases]
+            # dict.fromkeys keeps first-seen order, so the variants are reproducible across runs.
+            expansions.append(list(dict.fromkeys(paraphrases)))
+        return expansions
+
     def expand(self, query: str, num_variants: int = 4) -> List[str]:
-        input_ids = self.tokenizer(query, return_tensors="pt", truncation=True, padding="longest").input_ids.to(self.device)
-
-        outputs = self.model.generate(
-            input_ids,
-            max_length=128,
-            num_beams=1, 
-            num_return_sequences=num_variants * 2,
-            do_sample=True,              
-            top_k=30,                    
-            top_p=0.9,                  
-            temperature=0.95,             
-            no_repeat_ngram_size=3,
-            early_stopping=False
-        )
-        paraphrases = [self.tokenizer.decode(output, skip_special_tokens=True).strip() for output in outputs]
-        paraphrases = [p for p in paraphrases if p != query]
-        paraphrases += [query]
-        paraphrases = [p.lower() for p in paraphrases]
-        paraphrases = list(set(paraphrases)) 
-        return paraphrases
-
-    
\ No newline at end of file
+        return self.expand_batch([query], num_variants=num_variants)[0]
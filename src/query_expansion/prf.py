@@ -0,0 +1,40 @@
+"""
+Embedding-space query expansion with Rocchio-style pseudo-relevance feedback.
+"""
+import numpy as np
+from typing import Sequence
+
+
+def rocchio_expand(query_embedding: np.ndarray, index, feedback_depths: Sequence[int] = (3, 5, 10, 20),
+                   alpha: float = 1.0, beta: float = 0.75) -> np.ndarray:
+    """
+    Build refined query vectors from the stored embeddings of the query's nearest emails.
+
+    Each refined vector is alpha * q + beta * centroid(top-n neighbors of q), L2-normalized,
+    for every n in feedback_depths. Only one FAISS search and a handful of vector
+    reconstructions are needed, no text generation or extra embedding forwards.
+
+    Args:
+        query_embedding: (d,) normalized embedding of the original query.
+        index: FAISS index (or ShardedIndex) supporting search() and reconstruct().
+        feedback_depths: Number of pseudo-relevant emails used for each refined vector.
+        alpha: Weight of the original query.
+        beta: Weight of the feedback centroid.
+
+    Returns:
+        (1 + len(feedback_depths), d) float32 array: the original query followed by the refined queries.
+    """
+    query = query_embedding.reshape(1, -1).astype("float32")
+    depth = min(max(feedback_depths), index.ntotal)
+    _, neighbors = index.search(query, depth)
+    neighbors = [int(i) for i in neighbors[0] if i >= 0]
+    if not neighbors:
+        return query
+
+    feedback = np.stack([index.reconstruct(i) for i in neighbors]).astype("float32")
+    variants = [query[0]]
+    for n in feedback_depths:
+        centroid = feedback[:min(n, len(neighbors))].mean(axis=0)
+        refined = alpha * query[0] + beta * centroid
+        variants.append(refined / np.linalg.norm(refined))
+    return np.stack(variants).astype("float32")
@@ -0,0 +1,169 @@
+"""
+Prepared local snapshots of the embedder and paraphrase models.
+
+A snapshot directory holds the model's config (and remote code), its weights as a
+single model.safetensors in the serving dtype, its non-persistent buffers in
+buffers.safetensors, its tokenizer and a snapshot.json describing it. Loading
+builds the model on the meta device and assigns tensors that are views of a
+memory map of the weight file: nothing is copied or initialized up front, pages
+are read on first use, and every process mapping the same snapshot shares them
+through the page cache.
+
+Run `python -m src.resources.model_snapshots` to write the snapshots.
+"""
+import os
+import json
+import mmap
+import struct
+import argparse
+from typing import Dict, Optional, Tuple
+import torch
+from transformers import AutoConfig, AutoModel, AutoModelForSeq2SeqLM, AutoTokenizer, GenerationConfig
+from src.config import MODEL_SNAPSHOT_DIR, MODEL_SERVING_DTYPE, EMBEDDING_MODEL_NAME, PARAPHRASE_MODEL_NAME
+
+SNAPSHOT_INFO_NAME = "snapshot.json"
+WEIGHTS_NAME = "model.safetensors"
+BUFFERS_NAME = "buffers.safetensors"
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+# (model name, Auto class, trust_remote_code) of each model that can be snapshotted.
+SNAPSHOT_MODELS = {
+    "embedder": (EMBEDDING_MODEL_NAME, AutoModel, True),
+    "expander": (PARAPHRASE_MODEL_NAME, AutoModelForSeq2SeqLM, False),
+}
+
+
+def get_snapshot_dir(model_name: str, snapshot_dir: str = MODEL_SNAPSHOT_DIR) -> str:
+    return os.path.join(snapshot_dir, model_name.replace("/", "--"))
+
+
+def find_snapshot(model_name: str, dtype: str = MODEL_SERVING_DTYPE, snapshot_dir: str = MODEL_SNAPSHOT_DIR) -> Optional[str]:
+    """Snapshot directory of the model in the given dtype, or None if there is none."""
+    path = get_snapshot_dir(model_name, snapshot_dir)
+    info_path = os.path.join(path, SNAPSHOT_INFO_NAME)
+    if not os.path.exists(info_path):
+        return None
+    with open(info_path, "r") as f:
+        info = json.load(f)
+    if info.get("model") != model_name or info.get("dtype") != dtype:
+        return None
+    return path
+
+
+def get_non_persistent_buffers(model: torch.nn.Module) -> Dict[str, torch.Tensor]:
+    """Buffers left out of the state dict (e.g. rotary frequencies), which a meta-device model would lack."""
+    buffers = {}
+    for module_name, module in model.named_modules():
+        for buffer_name in module._non_persistent_buffers_set:
+            buffer = module._buffers.get(buffer_name)
+            if buffer is not None:
+                buffers[f"{module_name}.{buffer_name}" if module_name else buffer_name] = buffer.contiguous()
+    return buffers
+
+
+def save_snapshot(model_name: str, model_class, trust_remote_code: bool, dtype: str = MODEL_SERVING_DTYPE,
+                  snapshot_dir: str = MODEL_SNAPSHOT_DIR) -> str:
+    """
+    Download a Hugging Face model and write its snapshot.
+
+    Returns:
+        The snapshot directory.
+    """
+    from safetensors.torch import save_file
+
+    path = get_snapshot_dir(model_name, snapshot_dir)
+    os.makedirs(path, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=trust_remote_code)
+    model = model_class.from_pretrained(model_name, torch_dtype=getattr(torch, dtype), trust_remote_code=trust_remote_code)
+
+    # One unsharded file, so it can be mapped at once.
+    model.save_pretrained(path, safe_serialization=True, max_shard_size="1000GB")
+    save_file(get_non_persistent_buffers(model), os.path.join(path, BUFFERS_NAME))
+    tokenizer.save_pretrained(path)
+    with open(os.path.join(path, SNAPSHOT_INFO_NAME), "w") as f:
+        json.dump({"model": model_name, "dtype": dtype, "trust_remote_code": trust_remote_code}, f, indent=2)
+    print(f"Saved {model_name} snapshot at {path}")
+    return path
+
+
+def mmap_safetensors(path: str) -> Dict[str, torch.Tensor]:
+    """
+    Tensors of a safetensors file as views of a private, copy-on-write memory map.
+
+    Unmodified pages stay backed by the file, so they are only read when touched
+    and are shared with every other process mapping the same file.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        if os.path.getsize(path) == 8 + header_size:
+            return {}
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    header.pop("__metadata__", None)
+
+    data = torch.frombuffer(mapped, dtype=torch.uint8)
+    data_start = 8 + header_size
+    tensors = {}
+    for name, info in header.items():
+        start, end = info["data_offsets"]
+        tensor = data[data_start + start:data_start + end].view(SAFETENSORS_DTYPES[info["dtype"]])
+        tensors[name] = tensor.reshape(info["shape"])
+    return tensors
+
+
+def load_snapshot(path: str, model_class, device: torch.device = None) -> Tuple[torch.nn.Module, object]:
+    """
+    Load a snapshot without materializing its weights.
+
+    Args:
+        path: Snapshot directory.
+        model_class: Auto class the snapshot was written with.
+        device: Device to move the model to; on CPU the weights stay memory-mapped.
+
+    Returns:
+        (model in eval mode, tokenizer)
+    """
+    with open(os.path.join(path, SNAPSHOT_INFO_NAME), "r") as f:
+        info = json.load(f)
+    trust_remote_code = info["trust_remote_code"]
+
+    config = AutoConfig.from_pretrained(path, trust_remote_code=trust_remote_code)
+    with torch.device("meta"):
+        model = model_class.from_config(config, torch_dtype=getattr(torch, info["dtype"]), trust_remote_code=trust_remote_code)
+
+    model.load_state_dict(mmap_safetensors(os.path.join(path, WEIGHTS_NAME)), strict=False, assign=True)
+    for name, buffer in mmap_safetensors(os.path.join(path, BUFFERS_NAME)).items():
+        module_name, _, buffer_name = name.rpartition(".")
+        model.get_submodule(module_name)._buffers[buffer_name] = buffer
+    # Tied weights (e.g. BART's shared embeddings) are only stored once.
+    model.tie_weights()
+
+    missing = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if missing:
+        raise ValueError(f"Snapshot at {path} is missing tensors: {missing[:5]}")
+
+    if os.path.exists(os.path.join(path, "generation_config.json")):
+        model.generation_config = GenerationConfig.from_pretrained(path)
+    if device is not None:
+        model = model.to(device)
+    model.eval()
+
+    tokenizer = AutoTokenizer.from_pretrained(path, trust_remote_code=trust_remote_code)
+    return model, tokenizer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write mmap-loadable snapshots of the embedder and paraphrase models.")
+    parser.add_argument("--models", nargs="+", default=list(SNAPSHOT_MODELS), choices=list(SNAPSHOT_MODELS),
+                        help="Models to snapshot.")
+    parser.add_argument("--dtype", default=MODEL_SERVING_DTYPE, help="Serving dtype (float32, float16, bfloat16).")
+    args = parser.parse_args()
+    for key in args.models:
+        model_name, model_class, trust_remote_code = SNAPSHOT_MODELS[key]
+        save_snapshot(model_name, model_class, trust_remote_code, args.dtype)
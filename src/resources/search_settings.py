@@ -0,0 +1,88 @@
+"""
+Retrieval and fusion parameters of the search path, tuned by src.scripts.autotune.
+
+The defaults reproduce the hand-set values; a settings file written by the
+autotuner overrides them.
+"""
+import os
+import json
+from typing import Dict, Optional
+from src.config import SEARCH_SETTINGS_PATH, KEYWORD_MIN_DEPTH, TWO_STAGE_CANDIDATES
+
+
+class SearchSettings:
+    """
+    Attributes:
+        num_variants: Paraphrases generated per query.
+        rrf_k: RRF constant fusing the per-variant semantic rankings.
+        keyword_min_depth: Keyword candidates fetched even when fewer results are wanted.
+        faiss_depth: Nearest neighbors retrieved per query variant (0 for every email).
+        two_stage_candidates: Binary-code candidates rescored by a TwoStageIndex.
+        semantic_weight_min: Semantic weight of a one-word query.
+        semantic_weight_max: Plateau of the semantic weight for long queries.
+        semantic_weight_midpoint: Query length at which the weight curve is steepest.
+        semantic_weight_steepness: Slope of the logistic weight curve.
+    """
+
+    FIELDS = [
+        "num_variants", "rrf_k", "keyword_min_depth", "faiss_depth", "two_stage_candidates",
+        "semantic_weight_min", "semantic_weight_max", "semantic_weight_midpoint", "semantic_weight_steepness",
+    ]
+
+    def __init__(self, num_variants: int = 4, rrf_k: int = 60, keyword_min_depth: int = KEYWORD_MIN_DEPTH,
+                 faiss_depth: int = 0, two_stage_candidates: int = TWO_STAGE_CANDIDATES,
+                 semantic_weight_min: float = 0.25, semantic_weight_max: float = 0.75,
+                 semantic_weight_midpoint: float = 4.0, semantic_weight_steepness: float = 0.9):
+        self.num_variants = num_variants
+        self.rrf_k = rrf_k
+        self.keyword_min_depth = keyword_min_depth
+        self.faiss_depth = faiss_depth
+        self.two_stage_candidates = two_stage_candidates
+        self.semantic_weight_min = semantic_weight_min
+        self.semantic_weight_max = semantic_weight_max
+        self.semantic_weight_midpoint = semantic_weight_midpoint
+        self.semantic_weight_steepness = semantic_weight_steepness
+
+    def to_dict(self) -> Dict[str, object]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, object]) -> "SearchSettings":
+        """Settings from a dict; missing fields keep their defaults."""
+        return cls(**{field: values[field] for field in cls.FIELDS if field in values})
+
+    def replace(self, **changes) -> "SearchSettings":
+        return SearchSettings.from_dict({**self.to_dict(), **changes})
+
+    def __repr__(self):
+        return "SearchSettings(" + ", ".join(f"{k}={v}" for k, v in self.to_dict().items()) + ")"
+
+
+def load_search_settings(path: str = SEARCH_SETTINGS_PATH) -> SearchSettings:
+    """Load the tuned settings, or the defaults if none were saved."""
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return SearchSettings.from_dict(json.load(f)["settings"])
+    return SearchSettings()
+
+
+def save_search_settings(settings: SearchSettings, path: str = SEARCH_SETTINGS_PATH, results: Optional[dict] = None) -> None:
+    with open(path, "w") as f:
+        json.dump({"settings": settings.to_dict(), "results": results}, f, indent=2)
+    print(f"Saved search settings at {path}")
+
+
+_current_settings: Optional[SearchSettings] = None
+
+
+def get_search_settings() -> SearchSettings:
+    """Settings used by the search path (loaded from SEARCH_SETTINGS_PATH on first use)."""
+    global _current_settings
+    if _current_settings is None:
+        _current_settings = load_search_settings()
+    return _current_settings
+
+
+def set_search_settings(settings: SearchSettings) -> None:
+    global _current_settings
+    _current_settings = settings
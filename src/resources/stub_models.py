@@ -0,0 +1,118 @@
+"""
+Lightweight stand-ins for the embedder and the paraphrase model, for load tests
+of the full search pipeline without loading (or downloading) the real models.
+
+StubEmbedder returns hashed bag-of-words vectors of the real embedding dimension,
+so FAISS and fusion do the same amount of work as with the real model, and texts
+sharing words get similar vectors. StubExpander derives variants from the query's
+words. Both can simulate model latency.
+"""
+import os
+import json
+import time
+import zlib
+import numpy as np
+import torch
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+from src.config import EMBEDDING_MODEL_NAME
+from src.resources.model_snapshots import find_snapshot
+import src.semantic_search.semantic_search as semantic_components
+
+
+def get_embedding_dimension(index=None) -> int:
+    """
+    Dimension of the real embedder: that of a loaded index, else the hidden size
+    in the model's snapshot or Hugging Face config.
+    """
+    if index is not None:
+        return int(index.d)
+    snapshot_path = find_snapshot(EMBEDDING_MODEL_NAME)
+    if snapshot_path is not None:
+        with open(os.path.join(snapshot_path, "config.json"), "r") as f:
+            return int(json.load(f)["hidden_size"])
+    from transformers import AutoConfig
+    return int(AutoConfig.from_pretrained(EMBEDDING_MODEL_NAME, trust_remote_code=True).hidden_size)
+
+
+class StubEmbedder:
+    """Stand-in for EmailEmbedder with the same embedding methods."""
+
+    def __init__(self, dimension: int, latency_ms: float = 0.0, seed: int = 0):
+        """
+        Args:
+            dimension: Embedding dimension (see get_embedding_dimension).
+            latency_ms: Simulated model time per embedded text.
+            seed: Seed of the per-word random vectors.
+        """
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.seed = seed
+        # Read by code that sizes arrays from the model config.
+        self.model = SimpleNamespace(config=SimpleNamespace(hidden_size=dimension))
+        self.word_vectors: Dict[str, np.ndarray] = {}
+
+    def word_vector(self, word: str) -> np.ndarray:
+        vector = self.word_vectors.get(word)
+        if vector is None:
+            rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")) ^ self.seed)
+            vector = rng.standard_normal(self.dimension).astype("float32")
+            self.word_vectors[word] = vector
+        return vector
+
+    def embed_texts(self, texts: List[str]) -> torch.Tensor:
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(texts) / 1000)
+        embeddings = np.zeros((len(texts), self.dimension), dtype="float32")
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[i] += self.word_vector(word)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return torch.from_numpy(embeddings / np.where(norms > 0, norms, 1.0))
+
+    def embed_emails(self, emails: List[str], batch_size) -> torch.Tensor:
+        return self.embed_texts(emails)
+
+    def embed_query(self, queries: List[str]) -> torch.Tensor:
+        return self.embed_texts(queries)
+
+    def embed_chunks(self, emails: List[str], chunk_tokens: int, batch_size: int) -> Tuple[torch.Tensor, List[int]]:
+        chunks, chunk_to_email = [], []
+        for i, email in enumerate(emails):
+            words = email.split() or [""]
+            for start in range(0, len(words), chunk_tokens):
+                chunks.append(" ".join(words[start:start + chunk_tokens]))
+                chunk_to_email.append(i)
+        return self.embed_texts(chunks), chunk_to_email
+
+
+class StubExpander:
+    """Stand-in for QueryExpander: variants are rotations of the query's words."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        """
+        Args:
+            latency_ms: Simulated generation time per query.
+        """
+        self.latency_ms = latency_ms
+
+    def expand_batch(self, queries: List[str], num_variants: int = 4) -> List[List[str]]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms * len(queries) / 1000)
+        expansions = []
+        for query in queries:
+            words = query.lower().split()
+            variants = [" ".join(words[i:] + words[:i]) for i in range(1, min(num_variants, len(words)) + 1)]
+            expansions.append(list(dict.fromkeys(variants + [query])))
+        return expansions
+
+    def expand(self, query: str, num_variants: int = 4) -> List[str]:
+        return self.expand_batch([query], num_variants=num_variants)[0]
+
+
+def install_stub_models(dimension: int, embed_latency_ms: float = 0.0, expand_latency_ms: float = 0.0,
+                        expansion: str = "paraphrase"):
+    """Use the stub models as the semantic components (instead of init_semantic_components)."""
+    semantic_components.embedder = StubEmbedder(dimension, latency_ms=embed_latency_ms)
+    semantic_components.expander = StubExpander(latency_ms=expand_latency_ms) if expansion == "paraphrase" else None
+    semantic_components.expansion_mode = expansion
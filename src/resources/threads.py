@@ -0,0 +1,138 @@
+"""
+Central CPU thread budget for torch, FAISS, BLAS (spaCy/numpy) and shard search pools.
+
+Only os/json are imported at module level so that configure_thread_env() can run
+before numpy/torch are imported, which is when the BLAS/OpenMP pools are sized.
+"""
+import os
+import json
+import socket
+from typing import Dict, Optional
+from src.config import THREAD_SETTINGS_PATH
+
+BLAS_ENV_VARS = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]
+
+
+def get_host_fingerprint() -> Dict[str, object]:
+    return {"hostname": socket.gethostname(), "cpu_count": os.cpu_count() or 1}
+
+
+class ThreadBudget:
+    """
+    Thread counts per component.
+
+    Attributes:
+        torch_threads: Intra-op threads of torch (embedder and BART), one pool shared by
+            the whole process (set once per process).
+        torch_interop_threads: Inter-op threads of torch (set once per process).
+        faiss_threads: OpenMP threads used by a FAISS search, per searching thread.
+        blas_threads: Threads of the BLAS/OpenMP pools numpy and spaCy use.
+        shard_workers: Threads searching FAISS shards in parallel (sharing faiss_threads).
+    """
+
+    FIELDS = ["torch_threads", "torch_interop_threads", "faiss_threads", "blas_threads", "shard_workers"]
+
+    def __init__(self, torch_threads: int, torch_interop_threads: int, faiss_threads: int, blas_threads: int,
+                 shard_workers: int):
+        self.torch_threads = torch_threads
+        self.torch_interop_threads = torch_interop_threads
+        self.faiss_threads = faiss_threads
+        self.blas_threads = blas_threads
+        self.shard_workers = shard_workers
+
+    @classmethod
+    def default_for_host(cls, cpu_count: int = None) -> "ThreadBudget":
+        """
+        Split the cores of the machine. Searches run one at a time, so the process-wide
+        torch pool gets every core; the semantic leg's FAISS search gets half of them,
+        leaving the rest to the keyword leg running alongside it.
+        """
+        cpu_count = cpu_count or os.cpu_count() or 1
+        return cls(
+            torch_threads=cpu_count,
+            torch_interop_threads=1,
+            faiss_threads=max(1, cpu_count // 2),
+            blas_threads=1,
+            shard_workers=max(1, cpu_count // 4),
+        )
+
+    def to_dict(self) -> Dict[str, int]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, int]) -> "ThreadBudget":
+        return cls(**{field: int(values[field]) for field in cls.FIELDS})
+
+    def __repr__(self):
+        return "ThreadBudget(" + ", ".join(f"{k}={v}" for k, v in self.to_dict().items()) + ")"
+
+
+def load_thread_budget(path: str = THREAD_SETTINGS_PATH) -> ThreadBudget:
+    """
+    Load the tuned budget for this host, or the default split if none was tuned here.
+    """
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("host") == get_host_fingerprint():
+            return ThreadBudget.from_dict(data["budget"])
+    return ThreadBudget.default_for_host()
+
+
+def save_thread_budget(budget: ThreadBudget, path: str = THREAD_SETTINGS_PATH, results: Optional[dict] = None) -> None:
+    with open(path, "w") as f:
+        json.dump({"host": get_host_fingerprint(), "budget": budget.to_dict(), "results": results}, f, indent=2)
+    print(f"Saved thread settings at {path}")
+
+
+def configure_thread_env(budget: ThreadBudget = None) -> ThreadBudget:
+    """Size the BLAS/OpenMP pools through the environment; call before importing numpy/torch."""
+    budget = budget or load_thread_budget()
+    for var in BLAS_ENV_VARS:
+        os.environ.setdefault(var, str(budget.blas_threads))
+    return budget
+
+
+def apply_thread_budget(budget: ThreadBudget) -> None:
+    """Set the torch thread counts of the process and the FAISS thread count of the calling thread."""
+    import torch
+    import faiss
+
+    torch.set_num_threads(budget.torch_threads)
+    try:
+        torch.set_num_interop_threads(budget.torch_interop_threads)
+    except RuntimeError:
+        # Can only be set before the first inter-op parallel work.
+        pass
+    faiss.omp_set_num_threads(budget.faiss_threads)
+
+
+def make_worker_initializer(faiss_threads: int):
+    """
+    Thread-pool initializer giving each worker its share of FAISS OpenMP threads
+    (OpenMP thread counts are per calling thread).
+
+    Torch threads are not set here: torch.set_num_threads resizes the intra-op
+    pool of the whole process, so it is only called by set_thread_budget.
+    """
+    def initializer():
+        import faiss
+        faiss.omp_set_num_threads(faiss_threads)
+    return initializer
+
+
+_current_budget: Optional[ThreadBudget] = None
+
+
+def get_thread_budget() -> ThreadBudget:
+    """Budget applied to this process (the host default if none was applied)."""
+    global _current_budget
+    if _current_budget is None:
+        _current_budget = load_thread_budget()
+    return _current_budget
+
+
+def set_thread_budget(budget: ThreadBudget) -> None:
+    global _current_budget
+    _current_budget = budget
+    apply_thread_budget(budget)
@@ -0,0 +1,183 @@
+"""
+Auto-tune the retrieval and fusion parameters against a latency budget.
+
+Replays a query log under every configuration of a parameter grid, and compares
+each configuration's rankings with those of the exhaustive configuration (every
+paraphrase, full-depth FAISS) by top-k overlap and
+weighted Kendall's W. Among the Pareto-optimal configurations (p95 latency vs.
+both agreement scores), it saves the fastest one that loses at most
+--max_quality_loss agreement and meets the p95 budget to SEARCH_SETTINGS_PATH.
+
+Usage:
+    python -m src.scripts.autotune --queries queries.txt --budget_ms 800 --max_quality_loss 0.05
+"""
+import argparse
+import itertools
+import numpy as np
+from typing import Dict, List
+from elasticsearch import Elasticsearch
+from src.resources.search_settings import SearchSettings, set_search_settings, save_search_settings
+from src.semantic_search.semantic_search import init_semantic_components
+from src.semantic_search.two_stage_index import TwoStageIndex
+from src.hybrid_search.hybrid_search import get_ranking_arrays
+from src.keyword_search.build_es_query import get_persons_to_aliases_dict, clear_query_caches
+from src.keyword_search.es_search import create_emails_index_if_stale
+from src.artifacts.manifest import ArtifactManifest
+from src.evaluation.metrics import weighted_kendalls_w
+from src.scripts.benchmark import DEFAULT_QUERIES_PATH, load_benchmark_queries, timed, summarize_latencies, get_folder_emails
+from src.utils import load_faiss_index, set_global_seed
+
+# Semantic weight curves: the default one, and one leaning on keywords up to longer queries.
+WEIGHT_CURVES = [
+    {"semantic_weight_midpoint": 4.0, "semantic_weight_steepness": 0.9},
+    {"semantic_weight_midpoint": 6.0, "semantic_weight_steepness": 0.6},
+]
+
+PARAMETER_GRID = {
+    "num_variants": [1, 2, 4],
+    "rrf_k": [20, 60],
+    "faiss_depth": [200, 1000, 0],
+}
+TWO_STAGE_CANDIDATE_GRID = [250, 1000, 4000]
+# Depth of the rankings compared by Kendall's W; emails past it in one ranking get this rank.
+AGREEMENT_DEPTH = 100
+
+
+def candidate_settings(two_stage: bool) -> List[SearchSettings]:
+    names = list(PARAMETER_GRID)
+    grids = [PARAMETER_GRID[name] for name in names]
+    candidates = []
+    for values in itertools.product(*grids):
+        for curve in WEIGHT_CURVES:
+            base = SearchSettings(**dict(zip(names, values)), **curve)
+            if two_stage:
+                candidates += [base.replace(two_stage_candidates=n) for n in TWO_STAGE_CANDIDATE_GRID]
+            else:
+                candidates.append(base)
+    return candidates
+
+
+def exhaustive_settings(num_emails: int) -> SearchSettings:
+    return SearchSettings(
+        num_variants=max(PARAMETER_GRID["num_variants"]),
+        faiss_depth=0,
+        two_stage_candidates=num_emails,
+    )
+
+
+def top_k_overlap(ids_a: np.ndarray, ids_b: np.ndarray, k: int) -> float:
+    return len(set(ids_a[:k].tolist()) & set(ids_b[:k].tolist())) / k if k else 1.0
+
+
+def run_queries(settings: SearchSettings, queries: List[str], index, df, es_client, aliases, folder: str, search_mode: str):
+    """Rankings and latencies of the queries under the given settings."""
+    set_search_settings(settings)
+    if isinstance(index, TwoStageIndex):
+        index.num_candidates = settings.two_stage_candidates
+    # Parsed queries are cached; clear them so every configuration pays the same parsing cost.
+    clear_query_caches()
+    rankings, latencies = [], []
+    for query in queries:
+        ranking, elapsed_ms = timed(get_ranking_arrays, query, index, df, es_client, aliases, folder, search_mode)
+        rankings.append(ranking)
+        latencies.append(elapsed_ms)
+    return rankings, latencies
+
+
+def measure_settings(settings: SearchSettings, reference, queries, index, df, es_client, aliases, folder, search_mode,
+                     top_k: int) -> Dict[str, float]:
+    rankings, latencies = run_queries(settings, queries, index, df, es_client, aliases, folder, search_mode)
+    overlaps = [top_k_overlap(ids, ref_ids, top_k) for (ids, _), (ref_ids, _) in zip(rankings, reference)]
+    # Emails in only one top list are ranked just past it, so disjoint top lists disagree.
+    agreements = [
+        weighted_kendalls_w(
+            [(ids[:AGREEMENT_DEPTH], scores[:AGREEMENT_DEPTH]), (ref_ids[:AGREEMENT_DEPTH], ref_scores[:AGREEMENT_DEPTH])],
+            missing_rank=AGREEMENT_DEPTH,
+        )
+        for (ids, scores), (ref_ids, ref_scores) in zip(rankings, reference)
+    ]
+    return {
+        **summarize_latencies(latencies),
+        "overlap": float(np.mean(overlaps)),
+        "kendalls_w": float(np.mean(agreements)),
+    }
+
+
+def pareto_front(results: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    """Results no other result beats on p95 latency, overlap and Kendall's W at once."""
+    def dominates(a, b):
+        no_worse = a["p95_ms"] <= b["p95_ms"] and a["overlap"] >= b["overlap"] and a["kendalls_w"] >= b["kendalls_w"]
+        better = a["p95_ms"] < b["p95_ms"] or a["overlap"] > b["overlap"] or a["kendalls_w"] > b["kendalls_w"]
+        return no_worse and better
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+
+def choose_settings(front: List[Dict[str, object]], budget_ms: float, max_quality_loss: float) -> Dict[str, object]:
+    """
+    Fastest configuration within the quality loss, preferring those that meet the budget.
+    None if no configuration stays within the quality loss.
+    """
+    acceptable = [
+        r for r in front
+        if r["overlap"] >= 1 - max_quality_loss and r["kendalls_w"] >= 1 - max_quality_loss
+    ]
+    if not acceptable:
+        return None
+    within_budget = [r for r in acceptable if r["p95_ms"] <= budget_ms]
+    return min(within_budget or acceptable, key=lambda r: r["p95_ms"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune retrieval and fusion parameters for a latency budget.")
+    parser.add_argument("--queries", type=str, default=DEFAULT_QUERIES_PATH, help="Query log, one query per line.")
+    parser.add_argument("--folder", choices=["inbox", "sent"], default="inbox", help="Folder to search.")
+    parser.add_argument("--search_mode", choices=["hybrid", "semantic", "keyword"], default="hybrid", help="Search mode.")
+    parser.add_argument("--budget_ms", type=float, required=True, help="p95 latency budget in milliseconds.")
+    parser.add_argument("--max_quality_loss", type=float, default=0.05,
+                        help="Largest allowed drop of top-k overlap and Kendall's W from the exhaustive configuration.")
+    parser.add_argument("--top_k", type=int, default=10, help="Depth of the top-k overlap.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed, so paraphrases are comparable across configurations.")
+    args = parser.parse_args()
+
+    set_global_seed(args.seed)
+    init_semantic_components(seed=args.seed)
+    df = get_folder_emails(args.folder)
+    index = load_faiss_index(args.folder, num_emails=len(df))
+    aliases = get_persons_to_aliases_dict()
+    es_client = Elasticsearch("http://localhost:9200")
+    create_emails_index_if_stale(es_client, df, args.folder, ArtifactManifest())
+    queries = load_benchmark_queries(args.queries)
+
+    print("🔥 Computing reference rankings with the exhaustive configuration...")
+    reference_settings = exhaustive_settings(len(df))
+    reference, reference_latencies = run_queries(reference_settings, queries, index, df, es_client, aliases, args.folder, args.search_mode)
+    print(f"Exhaustive configuration: p95 {summarize_latencies(reference_latencies)['p95_ms']:.1f} ms")
+
+    results = []
+    for settings in candidate_settings(isinstance(index, TwoStageIndex)):
+        stats = measure_settings(settings, reference, queries, index, df, es_client, aliases, args.folder,
+                                 args.search_mode, args.top_k)
+        results.append({"settings": settings.to_dict(), **stats})
+        print(f"{settings} -> p95 {stats['p95_ms']:.1f} ms | overlap@{args.top_k} {stats['overlap']:.3f} | W {stats['kendalls_w']:.3f}")
+
+    front = pareto_front(results)
+    best = choose_settings(front, args.budget_ms, args.max_quality_loss)
+    if best is None:
+        print(f"\n⚠️ No configuration stays within a quality loss of {args.max_quality_loss}; keeping the exhaustive one.")
+        best = {"settings": reference_settings.to_dict(), **summarize_latencies(reference_latencies), "overlap": 1.0, "kendalls_w": 1.0}
+    elif best["p95_ms"] > args.budget_ms:
+        print(f"\n⚠️ No acceptable configuration meets the {args.budget_ms:.0f} ms budget; saving the fastest one.")
+
+    print(f"\n🏆 Best settings: {best['settings']} (p95 {best['p95_ms']:.1f} ms, "
+          f"overlap {best['overlap']:.3f}, W {best['kendalls_w']:.3f})")
+    save_search_settings(
+        SearchSettings.from_dict(best["settings"]),
+        results={
+            "folder": args.folder,
+            "search_mode": args.search_mode,
+            "budget_ms": args.budget_ms,
+            "max_quality_loss": args.max_quality_loss,
+            "chosen": best,
+            "pareto_front": front,
+        },
+    )
@@ -0,0 +1,112 @@
+"""
+Benchmark the semantic query expansion modes on a fixed set of queries.
+
+Compares the pseudo-relevance feedback expansion against the BART paraphrase
+expansion: latency of each, and agreement of their rankings (top-k overlap and
+weighted Kendall's W over the top results).
+
+Usage:
+    python -m src.scripts.benchmark --folder inbox --seed 42
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+from typing import Callable, Dict, List, Tuple
+from src.utils import load_processed_emails, load_faiss_index, set_global_seed
+from src.semantic_search.semantic_search import init_semantic_components, semantic_search
+from src.query_expansion.rrf_fusion import reciprocal_rank_fusion
+from src.evaluation.metrics import weighted_kendalls_w
+from src.hybrid_search.hybrid_search import split_folders
+
+DEFAULT_QUERIES_PATH = os.path.join(os.path.dirname(__file__), "benchmark_queries.txt")
+EXPANSION_MODES = ["paraphrase", "prf"]
+
+
+def load_benchmark_queries(path: str = DEFAULT_QUERIES_PATH) -> List[str]:
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def timed(fn: Callable, *args, **kwargs) -> Tuple[object, float]:
+    """Call fn and return (result, elapsed milliseconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, float]:
+    latencies = np.asarray(latencies_ms)
+    return {
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def top_k_overlap(rankings_a: List[Tuple[int, float]], rankings_b: List[Tuple[int, float]], k: int) -> float:
+    """Fraction of the top-k email Ids two rankings share."""
+    top_a = {email_id for email_id, _ in rankings_a[:k]}
+    top_b = {email_id for email_id, _ in rankings_b[:k]}
+    return len(top_a & top_b) / k if k else 1.0
+
+
+def ranking_agreement(rankings_a: List[Tuple[int, float]], rankings_b: List[Tuple[int, float]], depth: int = 100) -> float:
+    """Weighted Kendall's W of two rankings, restricted to their top `depth` results."""
+    score_lists = [
+        (np.asarray([email_id for email_id, _ in rankings[:depth]]), np.asarray([score for _, score in rankings[:depth]]))
+        for rankings in [rankings_a, rankings_b]
+    ]
+    return weighted_kendalls_w(score_lists)
+
+
+def get_folder_emails(folder: str):
+    inbox_df, sent_df = split_folders(load_processed_emails())
+    return inbox_df if folder == "inbox" else sent_df
+
+
+def run_benchmark(queries: List[str], folder: str, top_k: int) -> Dict[str, object]:
+    df = get_folder_emails(folder)
+    index = load_faiss_index(folder, num_emails=len(df))
+
+    latencies = {mode: [] for mode in EXPANSION_MODES}
+    overlaps, agreements = [], []
+    for query in queries:
+        fused = {}
+        for mode in EXPANSION_MODES:
+            variants, elapsed_ms = timed(semantic_search, query, index, df, expansion=mode)
+            fused[mode] = reciprocal_rank_fusion(variants)
+            latencies[mode].append(elapsed_ms)
+        overlaps.append(top_k_overlap(fused["paraphrase"], fused["prf"], top_k))
+        agreements.append(ranking_agreement(fused["paraphrase"], fused["prf"]))
+        print(f"{query[:40]:<40} | " + " | ".join(f"{m}: {latencies[m][-1]:8.1f} ms" for m in EXPANSION_MODES)
+              + f" | overlap@{top_k}: {overlaps[-1]:.2f}")
+
+    return {
+        "folder": folder,
+        "num_queries": len(queries),
+        "latency": {mode: summarize_latencies(latencies[mode]) for mode in EXPANSION_MODES},
+        f"mean_overlap_at_{top_k}": float(np.mean(overlaps)),
+        "mean_kendalls_w": float(np.mean(agreements)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark paraphrase vs. pseudo-relevance feedback expansion.")
+    parser.add_argument("--queries", type=str, default=DEFAULT_QUERIES_PATH, help="File with one query per line.")
+    parser.add_argument("--folder", choices=["inbox", "sent"], default="inbox", help="Folder to search.")
+    parser.add_argument("--top_k", type=int, default=10, help="Depth of the top-k overlap.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducibility")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON file for the summary.")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        set_global_seed(args.seed)
+    init_semantic_components(seed=args.seed, expansion="paraphrase")
+
+    summary = run_benchmark(load_benchmark_queries(args.queries), args.folder, args.top_k)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
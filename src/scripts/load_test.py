@@ -0,0 +1,233 @@
+"""
+Load-test the search entry points with concurrent users.
+
+Replays a query file either closed-loop (--concurrency users, each sending its
+next query when the previous one returns) or open-loop (Poisson arrivals at
+--rate queries per second, latency measured from the scheduled arrival so
+queueing counts). Reports throughput, p50/p95/p99 latency and the error rate.
+
+With --local_es and --stub_models, the whole pipeline runs offline: keyword
+search goes to an in-process Elasticsearch stand-in and the models are replaced
+by stubs of the real embedding dimension (--stub_index also embeds the emails
+with the stub, when no FAISS index was built).
+
+Usage:
+    python -m src.scripts.load_test --concurrency 8 --num_requests 400
+    python -m src.scripts.load_test --rate 20 --num_requests 600 --local_es --stub_models --stub_index
+"""
+import os
+import time
+import json
+import tempfile
+import argparse
+import threading
+import itertools
+import numpy as np
+import faiss
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from elasticsearch import Elasticsearch
+from src.hybrid_search.hybrid_search import get_ranking_arrays, progressive_search
+from src.hybrid_search.result_cache import ResultCache
+from src.hybrid_search.query_planner import QueryPlanner
+from src.keyword_search.build_es_query import get_persons_to_aliases_dict
+from src.keyword_search.es_search import create_emails_index_if_stale
+from src.keyword_search.local_es import LocalElasticsearch
+from src.embeddings.store_in_faiss import prepare_email_for_embedding
+from src.semantic_search.semantic_search import init_semantic_components
+from src.resources.stub_models import get_embedding_dimension, install_stub_models
+import src.semantic_search.semantic_search as semantic_components
+from src.artifacts.manifest import ArtifactManifest
+from src.scripts.benchmark import DEFAULT_QUERIES_PATH, load_benchmark_queries, get_folder_emails
+from src.utils import load_faiss_index, set_global_seed
+
+ENTRY_POINTS = ["progressive", "ranking"]
+
+
+def make_search(entry_point: str, index, df, es_client, aliases, folder: str, search_mode: str, num_results: int,
+                result_cache: ResultCache = None, planner: QueryPlanner = None) -> Callable[[str], object]:
+    """
+    One search through an entry point:
+    'progressive': progressive_search consumed to its final result set (the interactive path).
+    'ranking': get_ranking_arrays, the full ranking of the folder (the evaluation path).
+    """
+    if entry_point == "progressive":
+        def search(query: str):
+            stages = progressive_search(query, index, df, es_client, aliases, folder, search_mode, num_results,
+                                        result_cache, planner=planner)
+            return list(stages)[-1]
+        return search
+    return lambda query: get_ranking_arrays(query, index, df, es_client, aliases, folder, search_mode, result_cache)
+
+
+def run_request(search: Callable[[str], object], query: str, start: float) -> Tuple[float, Optional[str]]:
+    """(latency in ms since start, error type or None)."""
+    try:
+        search(query)
+        error = None
+    except Exception as e:
+        error = type(e).__name__
+    return (time.perf_counter() - start) * 1000, error
+
+
+def run_closed_loop(search: Callable[[str], object], queries: List[str], concurrency: int, num_requests: int = None,
+                    duration_s: float = None) -> Tuple[List[Tuple[float, Optional[str]]], float]:
+    """
+    Each of `concurrency` users sends queries back to back, cycling through the
+    query file, until num_requests were sent or duration_s elapsed.
+
+    Returns:
+        (per-request (latency_ms, error), wall time in seconds)
+    """
+    counter = itertools.count()
+    results, lock = [], threading.Lock()
+    wall_start = time.perf_counter()
+
+    def user():
+        while True:
+            i = next(counter)
+            if num_requests is not None and i >= num_requests:
+                return
+            if duration_s is not None and time.perf_counter() - wall_start >= duration_s:
+                return
+            result = run_request(search, queries[i % len(queries)], time.perf_counter())
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=user) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - wall_start
+
+
+def run_open_loop(search: Callable[[str], object], queries: List[str], rate: float, num_requests: int,
+                  max_workers: int, seed: int = None) -> Tuple[List[Tuple[float, Optional[str]]], float]:
+    """
+    Send num_requests queries at Poisson arrivals of `rate` per second, whether or
+    not earlier ones finished. Latency is measured from each scheduled arrival,
+    so time spent waiting for a free worker counts (no coordinated omission).
+
+    Returns:
+        (per-request (latency_ms, error), wall time in seconds)
+    """
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1.0 / rate, size=num_requests))
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        wall_start = time.perf_counter()
+        for i, arrival in enumerate(arrivals):
+            scheduled = wall_start + arrival
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(run_request, search, queries[i % len(queries)], scheduled))
+        results = [future.result() for future in futures]
+    return results, time.perf_counter() - wall_start
+
+
+def summarize_load(results: List[Tuple[float, Optional[str]]], wall_time_s: float) -> Dict[str, object]:
+    latencies = np.asarray([latency for latency, error in results if error is None])
+    errors = Counter(error for _, error in results if error is not None)
+    summary = {
+        "requests": len(results),
+        "wall_time_s": wall_time_s,
+        "qps": (len(results) - sum(errors.values())) / wall_time_s if wall_time_s > 0 else 0.0,
+        "error_rate": sum(errors.values()) / len(results) if results else 0.0,
+        "errors": dict(errors),
+    }
+    if len(latencies):
+        summary.update({
+            "mean_ms": float(latencies.mean()),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+        })
+    return summary
+
+
+def build_stub_index(df, dimension: int) -> faiss.Index:
+    """Flat index of the emails embedded with the stub embedder."""
+    embeddings = semantic_components.embedder.embed_emails(prepare_email_for_embedding(df), 64).numpy()
+    index = faiss.IndexFlatIP(dimension)
+    index.add(embeddings.astype("float32"))
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load test of the search pipeline.")
+    parser.add_argument("--queries", type=str, default=DEFAULT_QUERIES_PATH, help="Query file, one query per line.")
+    parser.add_argument("--folder", choices=["inbox", "sent"], default="inbox", help="Folder to search.")
+    parser.add_argument("--search_mode", choices=["hybrid", "semantic", "keyword"], default="hybrid", help="Search mode.")
+    parser.add_argument("--entry_point", choices=ENTRY_POINTS, default="progressive", help="Search entry point to load.")
+    parser.add_argument("--num_results", type=int, default=10, help="Results per search ('progressive').")
+    parser.add_argument("--concurrency", type=int, default=4, help="Closed loop: number of concurrent users.")
+    parser.add_argument("--rate", type=float, default=None, help="Open loop: arrivals per second (overrides --concurrency).")
+    parser.add_argument("--max_workers", type=int, default=64, help="Open loop: searches served at once.")
+    parser.add_argument("--num_requests", type=int, default=None, help="Requests to send (default: one pass over the queries).")
+    parser.add_argument("--duration_s", type=float, default=None, help="Closed loop: stop sending after this many seconds.")
+    parser.add_argument("--warmup", type=int, default=3, help="Queries run once before measuring.")
+    parser.add_argument("--result_cache", action="store_true", help="Serve repeated queries from the result cache.")
+    parser.add_argument("--planner", action="store_true", help="Plan each query with the adaptive query planner.")
+    parser.add_argument("--local_es", action="store_true", help="Use the in-process Elasticsearch stand-in.")
+    parser.add_argument("--stub_models", action="store_true", help="Use stub models instead of the real ones.")
+    parser.add_argument("--stub_index", action="store_true", help="Embed the folder with the stub embedder instead of loading its index.")
+    parser.add_argument("--embed_latency_ms", type=float, default=0.0, help="Stub model time per embedded text.")
+    parser.add_argument("--expand_latency_ms", type=float, default=0.0, help="Stub model time per expanded query.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON file for the summary.")
+    args = parser.parse_args()
+
+    set_global_seed(args.seed)
+    queries = load_benchmark_queries(args.queries)
+    df = get_folder_emails(args.folder)
+
+    index = None if args.stub_index else load_faiss_index(args.folder, num_emails=len(df))
+    if args.stub_models or args.stub_index:
+        dimension = get_embedding_dimension(index)
+        install_stub_models(dimension, args.embed_latency_ms, args.expand_latency_ms)
+        if index is None:
+            print("🧱 Embedding the folder with the stub embedder...")
+            index = build_stub_index(df, dimension)
+    else:
+        init_semantic_components(seed=args.seed)
+
+    es_client = LocalElasticsearch() if args.local_es else Elasticsearch("http://localhost:9200")
+    # The stand-in is rebuilt every run, so its index is recorded in a throwaway manifest.
+    manifest = ArtifactManifest(os.path.join(tempfile.mkdtemp(), "manifest.json")) if args.local_es else ArtifactManifest()
+    create_emails_index_if_stale(es_client, df, args.folder, manifest)
+    aliases = get_persons_to_aliases_dict()
+
+    search = make_search(
+        args.entry_point, index, df, es_client, aliases, args.folder, args.search_mode, args.num_results,
+        ResultCache() if args.result_cache else None, QueryPlanner() if args.planner else None,
+    )
+    for query in queries[:args.warmup]:
+        search(query)
+
+    if args.rate:
+        num_requests = args.num_requests or len(queries)
+        print(f"🚦 Open loop: {num_requests} requests at {args.rate} / s...")
+        results, wall_time_s = run_open_loop(search, queries, args.rate, num_requests, args.max_workers, args.seed)
+    else:
+        num_requests = args.num_requests or (None if args.duration_s else len(queries))
+        print(f"🚦 Closed loop: {args.concurrency} concurrent users...")
+        results, wall_time_s = run_closed_loop(search, queries, args.concurrency, num_requests, args.duration_s)
+
+    summary = {
+        "entry_point": args.entry_point,
+        "search_mode": args.search_mode,
+        "folder": args.folder,
+        "concurrency": None if args.rate else args.concurrency,
+        "rate": args.rate,
+        "local_es": args.local_es,
+        "stub_models": args.stub_models,
+        **summarize_load(results, wall_time_s),
+    }
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,77 @@
+"""
+Auto-tune the thread budget for this host.
+
+Replays the benchmark queries through semantic search at each candidate
+allocation of torch threads and FAISS threads, one query at a time as the
+search interface runs them, and saves the one with the lowest p95 latency
+(ties broken by throughput) to THREAD_SETTINGS_PATH.
+
+Usage:
+    python -m src.scripts.tune_threads --folder inbox --rounds 2
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from src.resources.threads import ThreadBudget, save_thread_budget, set_thread_budget, make_worker_initializer
+from src.semantic_search.semantic_search import init_semantic_components, semantic_search
+from src.scripts.benchmark import DEFAULT_QUERIES_PATH, load_benchmark_queries, timed, summarize_latencies, get_folder_emails
+from src.utils import load_faiss_index
+
+
+def candidate_budgets(cpu_count: int) -> List[ThreadBudget]:
+    """Allocations of the machine's cores to the process-wide torch pool and to FAISS."""
+    torch_options = sorted({n for n in [1, 2, 4, 8, 16, 32, 64] if n <= cpu_count} | {cpu_count})
+    faiss_options = sorted({1, max(1, cpu_count // 2), cpu_count})
+    return [
+        ThreadBudget(
+            torch_threads=torch_threads,
+            torch_interop_threads=1,
+            faiss_threads=faiss_threads,
+            blas_threads=1,
+            shard_workers=max(1, cpu_count // 4),
+        )
+        for torch_threads in torch_options
+        for faiss_threads in faiss_options
+    ]
+
+
+def measure_budget(budget: ThreadBudget, queries: List[str], index, df) -> Dict[str, float]:
+    set_thread_budget(budget)
+    initializer = make_worker_initializer(budget.faiss_threads)
+    start = time.perf_counter()
+    # Like progressive_search, the semantic leg runs on a one-thread pool sized by the initializer.
+    with ThreadPoolExecutor(max_workers=1, initializer=initializer) as pool:
+        latencies = [elapsed for _, elapsed in pool.map(lambda q: timed(semantic_search, q, index, df), queries)]
+    wall_time = time.perf_counter() - start
+    stats = summarize_latencies(latencies)
+    stats["qps"] = len(queries) / wall_time
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune thread allocations for this host.")
+    parser.add_argument("--queries", type=str, default=DEFAULT_QUERIES_PATH, help="File with one query per line.")
+    parser.add_argument("--folder", choices=["inbox", "sent"], default="inbox", help="Folder to search.")
+    parser.add_argument("--rounds", type=int, default=2, help="Times each query is replayed per allocation.")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducibility")
+    args = parser.parse_args()
+
+    init_semantic_components(seed=args.seed)
+    df = get_folder_emails(args.folder)
+    index = load_faiss_index(args.folder, num_emails=len(df))
+    queries = load_benchmark_queries(args.queries) * args.rounds
+
+    print("🔥 Warming up...")
+    semantic_search(queries[0], index, df)
+
+    results = []
+    for budget in candidate_budgets(os.cpu_count() or 1):
+        stats = measure_budget(budget, queries, index, df)
+        results.append({"budget": budget.to_dict(), **stats})
+        print(f"{budget} -> p95 {stats['p95_ms']:.1f} ms | p50 {stats['p50_ms']:.1f} ms | {stats['qps']:.2f} QPS")
+
+    best = min(results, key=lambda r: (r["p95_ms"], -r["qps"]))
+    print(f"\n🏆 Best allocation: {best['budget']} (p95 {best['p95_ms']:.1f} ms, {best['qps']:.2f} QPS)")
+    save_thread_budget(ThreadBudget.from_dict(best["budget"]), results=results)
@@ -0,0 +1,88 @@
+"""
+Email-level search over an index of passage chunks.
+"""
+import os
+import numpy as np
+import faiss
+from typing import Tuple
+from src.config import EMBEDDINGS_DIR
+
+
+def get_chunk_paths(folder: str, embeddings_dir: str = EMBEDDINGS_DIR) -> Tuple[str, str]:
+    return (
+        os.path.join(embeddings_dir, f"{folder}_chunks.index"),
+        os.path.join(embeddings_dir, f"{folder}_chunk_map.npy"),
+    )
+
+
+class ChunkIndex:
+    """
+    Search-compatible stand-in for a flat FAISS index whose rows are chunks of emails.
+
+    search() scores every chunk and aggregates them per email, by their maximum
+    (max-sim: the best-matching passage decides) or their sum, and returns the top
+    emails' row positions, so callers see one result per email as with a flat index.
+    """
+
+    def __init__(self, chunk_index: faiss.Index, chunk_to_email: np.ndarray, num_emails: int, aggregation: str = "max"):
+        """
+        Args:
+            chunk_index: FAISS index of chunk embeddings.
+            chunk_to_email: Email row position of each chunk (non-decreasing).
+            num_emails: Number of emails in the folder.
+            aggregation: 'max' or 'sum'.
+        """
+        if aggregation not in {"max", "sum"}:
+            raise ValueError(f"Unknown aggregation: {aggregation}")
+        self.chunk_index = chunk_index
+        self.chunk_to_email = chunk_to_email.astype("int64")
+        self.aggregation = aggregation
+        self.ntotal = num_emails
+        self.d = chunk_index.d
+
+    @classmethod
+    def load(cls, folder: str, num_emails: int, aggregation: str = "max", embeddings_dir: str = EMBEDDINGS_DIR) -> "ChunkIndex":
+        index_path, map_path = get_chunk_paths(folder, embeddings_dir)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"Chunk index not found at: {index_path}")
+        return cls(faiss.read_index(index_path), np.load(map_path), num_emails, aggregation)
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        """Normalized mean of an email's chunk vectors."""
+        start, end = np.searchsorted(self.chunk_to_email, [position, position + 1])
+        vectors = self.chunk_index.reconstruct_n(int(start), int(end - start))
+        mean = vectors.mean(axis=0)
+        return mean / np.linalg.norm(mean)
+
+    def aggregate(self, chunk_scores: np.ndarray, chunk_ids: np.ndarray) -> np.ndarray:
+        """Per-email scores of one query (-inf for emails without a retrieved chunk)."""
+        valid = chunk_ids >= 0
+        emails = self.chunk_to_email[chunk_ids[valid]]
+        scores = chunk_scores[valid]
+        if self.aggregation == "max":
+            email_scores = np.full(self.ntotal, -np.inf, dtype="float32")
+            np.maximum.at(email_scores, emails, scores)
+        else:
+            email_scores = np.zeros(self.ntotal, dtype="float32")
+            np.add.at(email_scores, emails, scores)
+            seen = np.zeros(self.ntotal, dtype=bool)
+            seen[emails] = True
+            email_scores[~seen] = -np.inf
+        return email_scores
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            (scores, email row positions) of shape (nq, k), padded with -inf / -1.
+        """
+        chunk_scores, chunk_ids = self.chunk_index.search(queries, self.chunk_index.ntotal)
+        k = min(k, self.ntotal)
+        scores = np.full((queries.shape[0], k), -np.inf, dtype="float32")
+        ids = np.full((queries.shape[0], k), -1, dtype="int64")
+        for q in range(queries.shape[0]):
+            email_scores = self.aggregate(chunk_scores[q], chunk_ids[q])
+            top = np.argsort(-email_scores, kind="stable")[:k]
+            found = np.isfinite(email_scores[top])
+            scores[q, :found.sum()] = email_scores[top][found]
+            ids[q, :found.sum()] = top[found]
+        return scores, ids
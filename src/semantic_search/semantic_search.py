@@ -1,16 +1,98 @@
+import numpy as np
 from src.embeddings.embeddings import EmailEmbedder
 from src.query_expansion.expander import QueryExpander
-from typing import List, Tuple
+from src.query_expansion.prf import rocchio_expand
+from src.semantic_search.sharded_index import ShardedIndex
+from src.keyword_search.build_es_query import analyze_query, normalize_query
+from src.config import QUERY_EXPANSION, DATE_SHARD_PRUNING
+from src.resources.search_settings import get_search_settings
+from typing import Dict, List, Optional, Tuple
 
 embedder = None
 expander = None
+expansion_mode = QUERY_EXPANSION
 
-def init_semantic_components(seed=None):
-    global embedder, expander
+def init_semantic_components(seed=None, expansion: str = QUERY_EXPANSION):
+    """
+    Load the embedder, and the paraphrase model if the expansion mode needs it.
+
+    Args:
+        seed: Random seed for reproducibility.
+        expansion: 'paraphrase' (BART query variants) or 'prf' (pseudo-relevance feedback in embedding space).
+    """
+    global embedder, expander, expansion_mode
     embedder = EmailEmbedder(seed=seed)
-    expander = QueryExpander(seed=seed)
+    expander = QueryExpander(seed=seed) if expansion == "paraphrase" else None
+    expansion_mode = expansion
 
-def semantic_search(query: str, index, df) -> List[List[Tuple[int, float]]]:
+def get_query_variants(query: str, num_variants: int = None, verbose: bool = True) -> List[str]:
+    """
+    The query's paraphrases, or the query alone when num_variants is 0.
+
+    Args:
+        num_variants: Paraphrases to generate (defaults to the search settings).
+        verbose: Print progress (off for background work during prompts).
+    """
+    num_variants = get_search_settings().num_variants if num_variants is None else num_variants
+    if num_variants == 0:
+        return [query]
+    assert expander is not None, "Paraphrase expansion needs init_semantic_components(expansion='paraphrase')"
+    if verbose:
+        print("💡 Generating query variants...")
+    return expander.expand(query, num_variants=num_variants)
+
+def embed_queries(queries: List[str], verbose: bool = True) -> np.ndarray:
+    """(len(queries), d) float32 array of normalized query embeddings."""
+    if verbose:
+        print("🧠 Embedding queries...")
+    return embedder.embed_query(queries).float().cpu().numpy().astype("float32")
+
+def get_query_embeddings(query: str, index, expansion: str, num_variants: int = None,
+                         query_embeddings: np.ndarray = None) -> np.ndarray:
+    """
+    Embed the query variants for the given expansion mode.
+
+    Args:
+        num_variants: Paraphrases to generate (defaults to the search settings); 0 embeds
+            the query alone without running the paraphrase model.
+        query_embeddings: Embeddings computed ahead of the search (see src.hybrid_search.speculation):
+            the embedded variants, or for 'prf' the embedded query, which is still refined here.
+
+    Returns:
+        (num_variants, d) float32 array of normalized query embeddings.
+    """
+    if expansion == "prf":
+        if query_embeddings is None:
+            print("🧠 Embedding query...")
+            query_embeddings = embed_queries([query], verbose=False)
+        print("💡 Refining query with pseudo-relevance feedback...")
+        return rocchio_expand(query_embeddings[0], index)
+
+    if query_embeddings is not None:
+        return query_embeddings
+    return embed_queries(get_query_variants(query, num_variants))
+
+def get_query_date_range(query: str) -> Optional[Dict[str, object]]:
+    """
+    The query's date range for date-shard pruning, or None when DATE_SHARD_PRUNING
+    is off or the query has no date. The keyword leg only boosts that range, so
+    pruning the semantic leg by it is opt-in.
+    """
+    if not DATE_SHARD_PRUNING:
+        return None
+    _, dates, _ = analyze_query(normalize_query(query))
+    if dates is None:
+        return None
+    return {"start_date": dates[0], "end_date": dates[1]}
+
+def select_date_shards(index, date_range=None) -> Optional[List[int]]:
+    """Shards of a date-sharded index overlapping the date range (None to search them all)."""
+    if date_range and (isinstance(index, ShardedIndex) or isinstance(getattr(index, "index", None), ShardedIndex)):
+        return index.select_shards(date_range.get("start_date"), date_range.get("end_date"))
+    return None
+
+def semantic_search(query: str, index, df, date_range=None, expansion: str = None,
+                    num_variants: int = None, query_embeddings: np.ndarray = None) -> List[List[Tuple[int, float]]]:
     """
     Perform semantic search separately for the query and its variants using FAISS.
 
@@ -18,31 +100,41 @@ def semantic_search(query: str, index, df) -> List[List[Tuple[int, float]]]:
         query: Natural language query.
         index: FAISS index of embeddings.
         df: DataFrame of emails with assigned IDs.
+        date_range: Optional {"start_date", "end_date"}; with a date-sharded index,
+            only the shards overlapping it are searched.
+        expansion: 'paraphrase' or 'prf'; defaults to the mode passed to init_semantic_components.
+        num_variants: Paraphrases to search with (see get_query_embeddings).
+        query_embeddings: Query embeddings computed ahead of the search (see get_query_embeddings).
 
     Returns:
         A list of ranked lists. Each inner list contains (email_id, similarity_score), sorted by similarity score (descending).
     """
     
-    assert embedder is not None and expander is not None
+    assert embedder is not None
     print("🔍 Conducting semantic search...")
-   
-    print("💡 Generating query variants...")
-    queries = expander.expand(query, num_variants=4)
-    # print(f"Query variants: {queries}")
-
-    print("🧠 Embedding queries...")
-    query_embeddings = embedder.embed_query(queries)
+    query_embeddings = get_query_embeddings(query, index, expansion or expansion_mode, num_variants, query_embeddings)
 
     print("🔍 Searching FAISS index...")
 
+    shard_ids = select_date_shards(index, date_range)
+
+    faiss_depth = get_search_settings().faiss_depth
+    depth = min(faiss_depth, index.ntotal) if faiss_depth > 0 else index.ntotal
+
     results_per_variant = []
     for embedding in query_embeddings:
-        query_np = embedding.unsqueeze(0).cpu().numpy().astype("float32")
-        scores, indices = index.search(query_np, index.ntotal)
+        query_np = embedding.reshape(1, -1)
+        if shard_ids is not None:
+            scores, indices = index.search(query_np, depth, shard_ids=shard_ids)
+        else:
+            scores, indices = index.search(query_np, depth)
         scores, indices = scores[0], indices[0]
 
         results = []
         for idx, score in zip(indices, scores):
+            # -1 pads missing results; rows past the DataFrame were ingested after it was taken.
+            if idx < 0 or idx >= len(df):
+                continue
             email_id = int(df.iloc[idx]["Id"])
             results.append((email_id, float(score)))
 
@@ -0,0 +1,199 @@
+"""
+FAISS index split into shard files that are searched in parallel and merged into one top-k.
+"""
+import os
+import json
+import numpy as np
+import faiss
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+SHARD_MANIFEST_NAME = "shards.json"
+
+
+def get_shard_dir(index_dir: str, folder: str) -> str:
+    return os.path.join(index_dir, f"{folder}_shards")
+
+
+class ShardedIndex:
+    """
+    Drop-in replacement for a flat FAISS index made of several IndexIDMap shards.
+
+    Each shard stores the row positions of its emails in the folder's DataFrame as
+    FAISS ids, so search() returns the same (scores, positions) a single index
+    over the whole folder would. FAISS releases the GIL while searching, so the
+    shards are searched on a thread pool.
+    """
+
+    def __init__(self, shards: List[faiss.Index], shard_info: List[Dict[str, Any]], num_threads: int = None,
+                 thread_initializer=None):
+        """
+        Args:
+            shards: One FAISS index per shard, with global row positions as ids.
+            shard_info: Per-shard metadata (min_date/max_date/has_undated for date shards).
+            num_threads: Size of the search thread pool (defaults to the number of shards).
+            thread_initializer: Optional initializer run in each pool thread (e.g. to set FAISS threads).
+        """
+        self.shards = shards
+        self.shard_info = shard_info
+        self.d = shards[0].d
+        self.ntotal = sum(shard.ntotal for shard in shards)
+        self.pool = ThreadPoolExecutor(max_workers=num_threads or len(shards), initializer=thread_initializer)
+
+        # Row position -> (shard, offset inside the shard), for reconstruct().
+        self.position_shard = np.full(self.ntotal, -1, dtype="int64")
+        self.position_offset = np.full(self.ntotal, -1, dtype="int64")
+        for shard_number, shard in enumerate(shards):
+            positions = faiss.vector_to_array(shard.id_map)
+            self.position_shard[positions] = shard_number
+            self.position_offset[positions] = np.arange(len(positions))
+
+    @classmethod
+    def load(cls, shard_dir: str, num_threads: int = None, thread_initializer=None) -> "ShardedIndex":
+        with open(os.path.join(shard_dir, SHARD_MANIFEST_NAME), "r") as f:
+            manifest = json.load(f)
+        shards = [faiss.read_index(os.path.join(shard_dir, info["file"])) for info in manifest["shards"]]
+        return cls(shards, manifest["shards"], num_threads=num_threads, thread_initializer=thread_initializer)
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        """Stored vector of the email at a row position."""
+        shard = self.shards[self.position_shard[position]]
+        return faiss.downcast_index(shard.index).reconstruct(int(self.position_offset[position]))
+
+    def add(self, embeddings: np.ndarray, positions: np.ndarray, email_ids: np.ndarray, dates: np.ndarray = None):
+        """
+        Append new emails to the shards they belong to.
+
+        Hash shards follow assign_shards. Date shards take an email whose date falls
+        in their range, and otherwise the last shard (newest and undated emails),
+        widening its range.
+
+        Args:
+            embeddings: (n, d) float32 embeddings.
+            positions: Row positions of the new emails (appended after the existing ones).
+            email_ids: Processed email Ids, for hash shards.
+            dates: datetime64 send dates (NaT allowed), for date shards.
+        """
+        if self.shard_info and "min_date" in self.shard_info[0]:
+            assignment = np.array([self.select_date_shard(date) for date in dates], dtype="int64")
+        else:
+            assignment = assign_shards(len(positions), len(self.shards), "hash", email_ids=email_ids)
+
+        self.position_shard = np.concatenate([self.position_shard, np.full(len(positions), -1, dtype="int64")])
+        self.position_offset = np.concatenate([self.position_offset, np.full(len(positions), -1, dtype="int64")])
+        for shard_number in np.unique(assignment):
+            rows = np.flatnonzero(assignment == shard_number)
+            shard = self.shards[shard_number]
+            self.position_shard[positions[rows]] = shard_number
+            self.position_offset[positions[rows]] = shard.ntotal + np.arange(len(rows))
+            shard.add_with_ids(embeddings[rows], positions[rows].astype("int64"))
+            self.shard_info[shard_number]["ntotal"] = int(shard.ntotal)
+        self.ntotal = sum(shard.ntotal for shard in self.shards)
+
+    def select_date_shard(self, date: np.datetime64) -> int:
+        """Date shard a new email is added to, widening the last shard's range if needed."""
+        if np.isnat(date):
+            self.shard_info[-1]["has_undated"] = True
+            return len(self.shards) - 1
+        date_str = str(np.datetime64(date, "s"))
+        for i, info in enumerate(self.shard_info):
+            if info.get("min_date") and info.get("max_date") and info["min_date"] <= date_str <= info["max_date"]:
+                return i
+        last = self.shard_info[-1]
+        last["min_date"] = min(filter(None, [last.get("min_date"), date_str]))
+        last["max_date"] = max(filter(None, [last.get("max_date"), date_str]))
+        return len(self.shards) - 1
+
+    def select_shards(self, start_date: datetime = None, end_date: datetime = None) -> List[int]:
+        """
+        Shards that can contain emails sent in [start_date, end_date).
+        Shards without date bounds (hash shards, undated emails) are always selected.
+        """
+        selected = []
+        for i, info in enumerate(self.shard_info):
+            min_date, max_date = info.get("min_date"), info.get("max_date")
+            if info.get("has_undated") or min_date is None or max_date is None:
+                selected.append(i)
+                continue
+            if start_date is not None and datetime.fromisoformat(max_date) < start_date:
+                continue
+            if end_date is not None and datetime.fromisoformat(min_date) >= end_date:
+                continue
+            selected.append(i)
+        return selected
+
+    def search(self, queries: np.ndarray, k: int, shard_ids: Optional[List[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the selected shards in parallel and merge their results into a global top-k.
+
+        Args:
+            queries: (nq, d) float32 query matrix.
+            k: Number of results per query.
+            shard_ids: Shards to search (defaults to all of them).
+
+        Returns:
+            (scores, ids) arrays of shape (nq, k), padded with -inf / -1 like FAISS.
+        """
+        shard_ids = range(len(self.shards)) if shard_ids is None else shard_ids
+        shards = [self.shards[i] for i in shard_ids if self.shards[i].ntotal > 0]
+        nq = queries.shape[0]
+        if not shards:
+            return np.full((nq, k), -np.inf, dtype="float32"), np.full((nq, k), -1, dtype="int64")
+
+        results = list(self.pool.map(lambda shard: shard.search(queries, min(k, shard.ntotal)), shards))
+        scores = np.concatenate([r[0] for r in results], axis=1)
+        ids = np.concatenate([r[1] for r in results], axis=1)
+        scores[ids < 0] = -np.inf
+
+        if scores.shape[1] > k:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, top, axis=1)
+            ids = np.take_along_axis(ids, top, axis=1)
+        order = np.argsort(-scores, axis=1, kind="stable")
+        scores = np.take_along_axis(scores, order, axis=1)
+        ids = np.take_along_axis(ids, order, axis=1)
+
+        if scores.shape[1] < k:
+            pad = k - scores.shape[1]
+            scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+            ids = np.pad(ids, ((0, 0), (0, pad)), constant_values=-1)
+        return scores, ids
+
+
+def assign_shards(num_rows: int, num_shards: int, shard_by: str, email_ids: np.ndarray = None,
+                  dates: np.ndarray = None) -> np.ndarray:
+    """
+    Assign each row of a folder to a shard.
+
+    Args:
+        num_rows: Number of emails in the folder.
+        num_shards: Number of shards.
+        shard_by: 'hash' (by email Id) or 'date' (contiguous date ranges of equal size).
+        email_ids: Email Ids, needed for 'hash'.
+        dates: datetime64 send dates (NaT allowed), needed for 'date'.
+
+    Returns:
+        Array of shard numbers, one per row.
+    """
+    if shard_by == "hash":
+        return (np.asarray(email_ids, dtype="int64") % num_shards).astype("int64")
+    if shard_by == "date":
+        # Undated emails sort last, so only the last shard(s) hold them.
+        order = np.argsort(np.where(np.isnat(dates), np.datetime64("9999-12-31"), dates), kind="stable")
+        assignment = np.empty(num_rows, dtype="int64")
+        for shard, rows in enumerate(np.array_split(order, num_shards)):
+            assignment[rows] = shard
+        return assignment
+    raise ValueError(f"Unknown shard_by: {shard_by}")
+
+
+def describe_shard(rows: np.ndarray, dates: np.ndarray = None) -> Dict[str, Any]:
+    info = {"ntotal": int(len(rows))}
+    if dates is not None:
+        shard_dates = dates[rows]
+        valid = shard_dates[~np.isnat(shard_dates)]
+        info["min_date"] = str(valid.min().astype("datetime64[s]")) if len(valid) else None
+        info["max_date"] = str(valid.max().astype("datetime64[s]")) if len(valid) else None
+        info["has_undated"] = bool(len(valid) < len(shard_dates))
+    return info
@@ -0,0 +1,46 @@
+"""
+"More like this" search: the emails nearest to one email of the folder, answered
+from its stored vector, so no query is expanded or embedded.
+"""
+import numpy as np
+from typing import List, Tuple
+from src.embeddings.knn_graph import KnnGraph
+
+
+def find_similar_emails(email_id: int, index, df, num_results: int, graph: KnnGraph = None) -> List[Tuple[int, float]]:
+    """
+    Args:
+        email_id: Id of the email to pivot from (its row position + 1).
+        index: FAISS index (or wrapper) of the folder.
+        df: DataFrame of the folder's emails.
+        num_results: Number of similar emails wanted.
+        graph: Precomputed kNN graph of the index, if built.
+
+    Returns:
+        (email_id, similarity) pairs, most similar first, without the email itself.
+        They come from the graph when it covers the email and has enough of its
+        neighbors in this folder; else the email's vector is reconstructed and searched.
+    """
+    position = email_id - 1
+    # Rows a unified-index folder view filters out (None for a folder's own index).
+    excluded = getattr(index, "excluded_rows", None)
+    if not 0 <= position < len(df) or (excluded is not None and excluded[position]):
+        raise ValueError(f"No email with Id {email_id} in this folder")
+
+    if graph is not None and position < graph.num_rows:
+        positions, scores = graph.neighbors(position)
+        keep = positions < len(df)
+        if excluded is not None:
+            keep &= ~excluded[positions]
+        # A row with fewer than k neighbors already lists every other email.
+        if np.count_nonzero(keep) >= num_results or len(positions) < graph.k:
+            return [(int(p) + 1, float(s)) for p, s in zip(positions[keep][:num_results], scores[keep][:num_results])]
+
+    print("🔍 Searching FAISS index for similar emails...")
+    vector = np.asarray(index.reconstruct(position), dtype="float32").reshape(1, -1)
+    scores, positions = index.search(vector, min(num_results + 1, index.ntotal))
+    results = [
+        (int(p) + 1, float(s)) for p, s in zip(positions[0], scores[0])
+        if 0 <= p < len(df) and p != position
+    ]
+    return results[:num_results]
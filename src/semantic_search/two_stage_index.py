@@ -0,0 +1,76 @@
+"""
+Two-stage semantic search: Hamming search over binary sign codes for a candidate
+pool, then exact inner products for the candidates from the memory-mapped vectors.
+"""
+import numpy as np
+import faiss
+from typing import Tuple
+from src.embeddings.vector_store import binarize, get_vector_paths, load_vectors
+from src.config import EMBEDDINGS_DIR
+
+
+class TwoStageIndex:
+    """
+    Search-compatible stand-in for a flat FAISS index.
+
+    The binary codes take d/8 bytes per email and are scanned in full; the float16
+    vectors are only read for the candidate rows. search() returns at most
+    num_candidates results per query, so a request for the whole folder yields the
+    exactly rescored candidate pool rather than every email.
+    """
+
+    def __init__(self, binary_index: faiss.IndexBinary, vectors: np.ndarray, num_candidates: int = 1000):
+        """
+        Args:
+            binary_index: FAISS binary index over the vectors' sign bits.
+            vectors: (N, d) float16 vectors (typically memory-mapped) in the same row order.
+            num_candidates: Size of the candidate pool rescored exactly.
+        """
+        self.binary_index = binary_index
+        self.vectors = vectors
+        self.num_candidates = num_candidates
+        self.ntotal = vectors.shape[0]
+        self.d = vectors.shape[1]
+
+    @classmethod
+    def load(cls, folder: str, num_candidates: int = 1000, embeddings_dir: str = EMBEDDINGS_DIR) -> "TwoStageIndex":
+        _, _, binary_path = get_vector_paths(folder, embeddings_dir)
+        vectors, _ = load_vectors(folder, embeddings_dir)
+        return cls(faiss.read_index_binary(binary_path), vectors, num_candidates)
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        return np.asarray(self.vectors[position], dtype="float32")
+
+    def rescore(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact inner products of each query with its candidate rows, keeping the top-k.
+
+        Args:
+            queries: (nq, d) float32 queries.
+            candidates: (nq, c) candidate row positions (-1 for none).
+            k: Results to keep per query.
+        """
+        k = min(k, candidates.shape[1])
+        scores = np.full((queries.shape[0], k), -np.inf, dtype="float32")
+        ids = np.full((queries.shape[0], k), -1, dtype="int64")
+        for q, (query, rows) in enumerate(zip(queries, candidates)):
+            rows = rows[rows >= 0]
+            if len(rows) == 0:
+                continue
+            # Sorted reads are sequential on the memory map.
+            rows = np.sort(rows)
+            exact = np.asarray(self.vectors[rows], dtype="float32") @ query
+            top = np.argsort(-exact, kind="stable")[:k]
+            scores[q, :len(top)] = exact[top]
+            ids[q, :len(top)] = rows[top]
+        return scores, ids
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            (scores, row positions), each of shape (nq, min(k, num_candidates)).
+        """
+        queries = np.asarray(queries, dtype="float32")
+        num_candidates = min(self.num_candidates, self.ntotal)
+        _, candidates = self.binary_index.search(binarize(queries), num_candidates)
+        return self.rescore(queries, candidates.astype("int64"), k)
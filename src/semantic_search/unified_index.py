@@ -0,0 +1,94 @@
+"""
+One FAISS index over the emails of both folders, searched with a folder filter.
+"""
+import os
+import numpy as np
+import faiss
+from typing import Dict, List, Optional, Tuple
+from src.config import EMBEDDINGS_DIR
+
+FOLDERS = ["inbox", "sent"]
+# Folder membership of a row, as a bit mask (an email in both folders has both bits).
+FOLDER_BITS = {"inbox": 1, "sent": 2}
+
+
+def get_unified_paths(embeddings_dir: str = EMBEDDINGS_DIR) -> Tuple[str, str]:
+    return (
+        os.path.join(embeddings_dir, "all_embeddings.index"),
+        os.path.join(embeddings_dir, "all_folder_mask.npy"),
+    )
+
+
+def folder_mask(folders: List[List[str]]) -> np.ndarray:
+    """Bit mask of each row's folders (see FOLDER_BITS)."""
+    return np.asarray([sum(FOLDER_BITS[f] for f in set(row)) for row in folders], dtype="uint8")
+
+
+class FolderView:
+    """
+    Search-compatible view of a UnifiedIndex restricted to one folder (or to every
+    row when rows is None).
+
+    The filter is a FAISS IDSelectorBitmap passed as search parameters, so rows
+    outside the folder are skipped inside the scan instead of being retrieved and
+    dropped. Returned positions are rows of the unified corpus.
+    """
+
+    def __init__(self, index: faiss.Index, rows: Optional[np.ndarray] = None):
+        """
+        Args:
+            index: Flat FAISS index of the unified corpus.
+            rows: Boolean mask of the rows in the folder (None for all rows).
+        """
+        self.index = index
+        self.d = index.d
+        self.rows = rows
+        self.params = None
+        if rows is None:
+            self.ntotal = index.ntotal
+            self.excluded_rows = None
+        else:
+            self.ntotal = int(rows.sum())
+            self.excluded_rows = ~rows
+            # The selector only points at the bitmap, so keep it alive with the view.
+            self.bitmap = np.packbits(rows, bitorder="little")
+            self.selector = faiss.IDSelectorBitmap(len(rows), faiss.swig_ptr(self.bitmap))
+            self.params = faiss.SearchParameters(sel=self.selector)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.params is None:
+            return self.index.search(queries, k)
+        return self.index.search(queries, k, params=self.params)
+
+    def reconstruct(self, position: int) -> np.ndarray:
+        return self.index.reconstruct(int(position))
+
+
+class UnifiedIndex:
+    """
+    Flat index of every distinct email with a per-row folder mask.
+
+    An email stored in both folders has a single row (and vector); views() gives
+    one FolderView per folder plus "all", which all share the same vectors.
+    """
+
+    def __init__(self, index: faiss.Index, masks: np.ndarray):
+        if index.ntotal != len(masks):
+            raise ValueError(f"Unified index has {index.ntotal} vectors but {len(masks)} folder masks")
+        self.index = index
+        self.masks = masks
+
+    @classmethod
+    def load(cls, embeddings_dir: str = EMBEDDINGS_DIR) -> "UnifiedIndex":
+        index_path, mask_path = get_unified_paths(embeddings_dir)
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"Unified FAISS index not found at: {index_path}")
+        return cls(faiss.read_index(index_path), np.load(mask_path))
+
+    def view(self, folder: str) -> FolderView:
+        if folder == "all":
+            return FolderView(self.index)
+        return FolderView(self.index, (self.masks & FOLDER_BITS[folder]) > 0)
+
+    def views(self) -> Dict[str, FolderView]:
+        return {folder: self.view(folder) for folder in FOLDERS + ["all"]}
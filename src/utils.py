@@ -4,42 +4,139 @@ import torch
 import faiss
 import random
 import numpy as np
-from src.config import INBOX_PATH, SENT_PATH, FAISS_INDEX_PATH
+import pyarrow.dataset as ds
+from src.config import (
+    INBOX_PATH, SENT_PATH, FAISS_INDEX_PATH, PARTITIONED_EMAILS_DIR, STREAMING_PREPROCESS, FAISS_NUM_SHARDS,
+    SEMANTIC_INDEX_TYPE, CHUNK_AGGREGATION, DEDUP_NEAR_DUPLICATES, NEAR_DUPLICATES_PATH
+)
+from src.semantic_search.sharded_index import ShardedIndex, SHARD_MANIFEST_NAME, get_shard_dir
+from src.semantic_search.two_stage_index import TwoStageIndex
+from src.semantic_search.chunk_index import ChunkIndex
+from src.resources.threads import get_thread_budget, make_worker_initializer
+from src.resources.search_settings import get_search_settings
 
 
-def load_processed_emails() -> pd.DataFrame:
+def load_partitioned_emails(folder: str = None) -> pd.DataFrame:
     """
-    Load inbox and sent emails, filter out rows with missing body text,
-    drop duplicates by Id, and add a 'folder' column for tracking.
-    
+    Load emails from the folder/year partitioned Parquet dataset written by streaming preprocessing.
+
+    Args:
+        folder: Only load this folder ('inbox' or 'sent'); the other folder's partitions are not read.
+
     Returns:
-        Cleaned and combined DataFrame ready for FAISS search.
+        DataFrame of emails ordered by Id.
     """
-    inbox_df = pd.read_parquet(INBOX_PATH)
-    sent_df = pd.read_parquet(SENT_PATH)
+    dataset = ds.dataset(PARTITIONED_EMAILS_DIR, format="parquet", partitioning="hive")
+    expression = ds.field("folder") == folder if folder is not None else None
+    df = dataset.to_table(filter=expression).to_pandas()
+    return df.drop(columns=["year"]).sort_values("Id", kind="stable").reset_index(drop=True)
+
+
+def load_folder_emails(processed_dir: str = None) -> pd.DataFrame:
+    """
+    Inbox emails followed by sent emails, with a 'folder' column (emails in both folders appear twice).
+
+    Args:
+        processed_dir: Read Inbox.parquet and Sent.parquet from this directory (another
+            corpus, see src.corpora.registry) instead of the configured dataset.
+    """
+    if processed_dir is not None:
+        inbox_df = pd.read_parquet(os.path.join(processed_dir, os.path.basename(INBOX_PATH)))
+        sent_df = pd.read_parquet(os.path.join(processed_dir, os.path.basename(SENT_PATH)))
+    elif STREAMING_PREPROCESS:
+        inbox_df = load_partitioned_emails("inbox").drop(columns=["folder", "date"])
+        sent_df = load_partitioned_emails("sent").drop(columns=["folder", "date"])
+    else:
+        inbox_df = pd.read_parquet(INBOX_PATH)
+        sent_df = pd.read_parquet(SENT_PATH)
 
     inbox_df["folder"] = "inbox"
     sent_df["folder"] = "sent"
+    return pd.concat([inbox_df, sent_df])
+
+
+def load_processed_emails(canonical_only: bool = DEDUP_NEAR_DUPLICATES, processed_dir: str = None) -> pd.DataFrame:
+    """
+    Load inbox and sent emails, filter out rows with missing body text,
+    drop duplicates by Id, and add a 'folder' column for tracking.
+
+    Reads the partitioned dataset instead of Inbox/Sent.parquet when STREAMING_PREPROCESS is set.
 
-    combined_df = pd.concat([inbox_df, sent_df])
+    Args:
+        canonical_only: Drop the emails collapsed into a near-duplicate (see
+            src.preprocessing.near_duplicates), so they are neither embedded nor indexed.
+        processed_dir: Directory of another corpus's Inbox/Sent.parquet (see load_folder_emails).
+    
+    Returns:
+        Cleaned and combined DataFrame ready for FAISS search.
+    """
+    combined_df = load_folder_emails(processed_dir)
     #combined_df["Id"] = combined_df["Id"].astype(int)
     combined_df = combined_df.drop_duplicates("Id")
 
+    if canonical_only:
+        mapping = pd.read_parquet(NEAR_DUPLICATES_PATH)
+        collapsed = mapping[mapping["Id"] != mapping["CanonicalId"]]
+        is_collapsed = pd.MultiIndex.from_frame(combined_df[["folder", "Id"]]).isin(
+            pd.MultiIndex.from_frame(collapsed[["folder", "Id"]])
+        )
+        combined_df = combined_df[~is_collapsed]
+
     return combined_df
 
 
-def load_faiss_index(folder: str = "inbox") -> faiss.IndexFlatIP:
+def load_unified_emails() -> pd.DataFrame:
+    """
+    One row per distinct email Id over both folders, for the unified index.
+
+    Unlike load_processed_emails, an email stored in both folders keeps both:
+    its 'folder' column lists every folder it is in (e.g. ['inbox', 'sent']).
+    Near-duplicates are not collapsed (their mapping is per folder).
+
+    Returns:
+        DataFrame in the row order of the unified FAISS index.
+    """
+    combined_df = load_folder_emails()
+    folders = combined_df.groupby("Id", sort=False)["folder"].agg(list)
+    unified_df = combined_df.drop_duplicates("Id").reset_index(drop=True)
+    unified_df["folder"] = unified_df["Id"].map(folders)
+    return unified_df
+
+
+def load_faiss_index(folder: str = "inbox", index_type: str = SEMANTIC_INDEX_TYPE, num_emails: int = None,
+                     index_dir: str = FAISS_INDEX_PATH) -> faiss.IndexFlatIP:
     """
     Load FAISS index based on the specified folder ('inbox' or 'sent').
+    Loads a ShardedIndex instead when FAISS_NUM_SHARDS > 1.
 
     Args:
         folder: Which folder's index to load ('inbox' or 'sent')
+        index_type: 'flat' for the exact FAISS index, 'two_stage' for a TwoStageIndex,
+            'chunked' for a ChunkIndex
+        num_emails: Number of emails in the folder (needed for 'chunked')
+        index_dir: Directory of the index files (another corpus's embeddings directory)
 
     Returns:
         FAISS index
     """
+    if index_type == "two_stage":
+        return TwoStageIndex.load(folder, num_candidates=get_search_settings().two_stage_candidates, embeddings_dir=index_dir)
+    if index_type == "chunked":
+        return ChunkIndex.load(folder, num_emails, aggregation=CHUNK_AGGREGATION, embeddings_dir=index_dir)
+
+    if FAISS_NUM_SHARDS > 1:
+        shard_dir = get_shard_dir(index_dir, folder)
+        if not os.path.exists(os.path.join(shard_dir, SHARD_MANIFEST_NAME)):
+            raise FileNotFoundError(f"Sharded FAISS index not found at: {shard_dir}")
+        budget = get_thread_budget()
+        return ShardedIndex.load(
+            shard_dir,
+            num_threads=budget.shard_workers,
+            thread_initializer=make_worker_initializer(max(1, budget.faiss_threads // budget.shard_workers)),
+        )
+
     index_filename = f"{folder}_embeddings.index"
-    index_path = os.path.join(FAISS_INDEX_PATH, index_filename)
+    index_path = os.path.join(index_dir, index_filename)
 
     if not os.path.exists(index_path):
         raise FileNotFoundError(f"FAISS index not found at: {index_path}")